@@ -0,0 +1,46 @@
+"""
+Micro-benchmark of the internal base58 codec against the reference 'base58' package, on inputs
+of the sizes found in Duckietown Tokens.
+
+Usage:
+
+    python benchmarks/bench_base58.py [--number N]
+"""
+import argparse
+import os
+import timeit
+
+import base58
+
+from dt_authentication import codec
+
+# name -> number of bytes
+SIZES = {
+    "dt1-payload": 34,
+    "dt2-payload": 60,
+    "dt2-payload-scoped": 180,
+    "signature": 48,
+}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000, help="Number of calls per measurement")
+    args = parser.parse_args(args=args)
+
+    print(f"{'input':<20}{'op':<8}{'base58 (us)':>14}{'codec (us)':>14}{'speedup':>10}")
+    for name, size in SIZES.items():
+        data: bytes = os.urandom(size)
+        encoded: bytes = base58.b58encode(data)
+        for op, ref, new, arg in [
+            ("encode", base58.b58encode, codec.b58encode, data),
+            ("decode", base58.b58decode, codec.b58decode, encoded),
+        ]:
+            t_ref: float = min(timeit.repeat(lambda: ref(arg), number=args.number, repeat=3))
+            t_new: float = min(timeit.repeat(lambda: new(arg), number=args.number, repeat=3))
+            print(f"{name:<20}{op:<8}{t_ref / args.number * 1e6:>14.2f}{t_new / args.number * 1e6:>14.2f}"
+                  f"{t_ref / t_new:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
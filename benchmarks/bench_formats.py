@@ -0,0 +1,71 @@
+"""
+Compares the dt2 (base58 JSON) and dt3 (base64url CBOR) token formats on representative tokens:
+length of the token string, time to decode the payload (transport decoding and parsing, no
+signature verification) and time to decode and verify the token.
+
+Usage:
+
+    python benchmarks/bench_formats.py [--number N]
+"""
+import argparse
+import tempfile
+import timeit
+from typing import Dict, Any
+
+from dt_authentication import DuckietownToken
+from dt_authentication.codec import b58decode, b64url_decode
+from dt_authentication.token import _decode_payload
+from dt_authentication.utils import get_or_create_key_pair
+
+# name -> arguments of DuckietownToken.generate
+TOKENS: Dict[str, Dict[str, Any]] = {
+    "minimal": {"days": 30},
+    "renewable": {"days": 30, "renewable": True, "scope": ["auth"]},
+    "typical": {
+        "days": 30, "renewable": True,
+        "scope": ["auth", "read:duckiebot:db-*", "write:class:55",
+                  {"action": "read", "resource": "challenge", "service": "challenges.duckietown.org"}],
+    },
+    "data": {"days": 30, "data": {"robot": "db42", "groups": ["staff", "students"], "quota": 1.5}},
+    "scope-heavy": {
+        "days": 30, "renewable": True,
+        "scope": [f"{action}:duckiebot:db{i:02d}" for i in range(32) for action in ("read", "write")],
+    },
+}
+
+
+def _decode_only(s: str):
+    # transport decoding and payload parsing, what 'from_string' does besides verifying the signature
+    version, _, body = s.partition("-")
+    if version == "dt3":
+        payload, signature = body.split(".")
+        raw = b64url_decode(payload)
+        b64url_decode(signature)
+    else:
+        payload, signature = body.split("-")
+        raw = b58decode(payload)
+        b58decode(signature)
+    _decode_payload(version, raw)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=2000, help="Number of calls per measurement")
+    args = parser.parse_args(args=args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+
+    print(f"{'token':<14}{'version':<9}{'length':>8}{'decode us':>12}{'verify us':>12}")
+    for name, kwargs in TOKENS.items():
+        for version in ["dt2", "dt3"]:
+            s: str = DuckietownToken.generate(sk, 42, version=version, **kwargs).as_string()
+            decode: float = min(timeit.repeat(lambda: _decode_only(s), number=args.number, repeat=3))
+            verify: float = min(timeit.repeat(lambda: DuckietownToken.from_string(s, vk=vk),
+                                              number=max(1, args.number // 20), repeat=3))
+            print(f"{name:<14}{version:<9}{len(s):>8}{decode / args.number * 1e6:>12.1f}"
+                  f"{verify / max(1, args.number // 20) * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
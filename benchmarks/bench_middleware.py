@@ -0,0 +1,114 @@
+"""
+Load benchmark of the WSGI and ASGI authentication middleware against a local dummy application.
+
+Requests are sent in-process, so the numbers measure the per-request cost of the middleware and
+not that of an HTTP server. Each scenario cycles through a pool of distinct tokens.
+
+Usage:
+
+    python benchmarks/bench_middleware.py [--requests N] [--tokens K] [--concurrency C]
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from typing import List, Callable, Optional
+
+from dt_authentication import DuckietownToken, VerifiedTokenCache
+from dt_authentication.middleware import WSGIAuthMiddleware, ASGIAuthMiddleware
+from dt_authentication.utils import get_or_create_key_pair
+
+ROUTES = {"/data": "read:data", "/admin": "write:admin"}
+
+
+def wsgi_app(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"ok"]
+
+
+async def asgi_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _start_response(status, headers):
+    pass
+
+
+def run_wsgi(app: Callable, path: str, tokens: List[Optional[str]], n: int) -> float:
+    environs = [{"PATH_INFO": path, "HTTP_AUTHORIZATION": f"Token {t}"} if t else {"PATH_INFO": path}
+                for t in tokens]
+    t0: float = time.perf_counter()
+    for i in range(n):
+        app(dict(environs[i % len(environs)]), _start_response)
+    return time.perf_counter() - t0
+
+
+def run_asgi(app: Callable, path: str, tokens: List[Optional[str]], n: int, concurrency: int) -> float:
+    scopes = [{"type": "http", "path": path,
+               "headers": [(b"authorization", f"Token {t}".encode())] if t else []} for t in tokens]
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    async def client(k: int):
+        for i in range(k, n, concurrency):
+            await app(scopes[i % len(scopes)], receive, send)
+
+    async def main() -> float:
+        t0: float = time.perf_counter()
+        await asyncio.gather(*[client(k) for k in range(concurrency)])
+        return time.perf_counter() - t0
+
+    return asyncio.run(main())
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000, help="Number of requests per scenario")
+    parser.add_argument("--tokens", type=int, default=100, help="Number of distinct tokens")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent ASGI clients")
+    args = parser.parse_args(args=args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    tokens = [DuckietownToken.generate(sk, uid, days=1, scope=["read:data"]).as_string()
+              for uid in range(args.tokens)]
+    invalid = [f"{t[:-4]}1111" for t in tokens]
+    n: int = args.requests
+    # cache misses are slow, fewer requests are enough
+    n_miss: int = max(1, n // 50)
+
+    scenarios = [
+        # name, path, tokens, middleware arguments, number of requests
+        ("no middleware", "/data", tokens, None, n),
+        ("valid, cached", "/data", tokens, {}, n),
+        ("valid, uncached", "/data", tokens, {"cache": VerifiedTokenCache(max_entries=1, shards=1)}, n_miss),
+        ("invalid, repeated", "/data", invalid, {}, n),
+        ("forbidden", "/admin", tokens, {}, n),
+        ("missing token", "/data", [None], {}, n),
+    ]
+
+    print(f"{'scenario':<24}{'WSGI req/s':>14}{'us/req':>10}{'ASGI req/s':>14}{'us/req':>10}")
+    for name, path, pool, kwargs, k in scenarios:
+        if kwargs is None:
+            wsgi, asgi = wsgi_app, asgi_app
+        else:
+            wsgi = WSGIAuthMiddleware(wsgi_app, routes=ROUTES, vk=vk, **kwargs)
+            if "cache" in kwargs:
+                kwargs = dict(kwargs, cache=VerifiedTokenCache(max_entries=1, shards=1))
+            asgi = ASGIAuthMiddleware(asgi_app, routes=ROUTES, vk=vk, **kwargs)
+            # warm up the caches
+            run_wsgi(wsgi, path, pool, len(pool))
+            run_asgi(asgi, path, pool, len(pool), args.concurrency)
+        t_wsgi: float = run_wsgi(wsgi, path, pool, k)
+        t_asgi: float = run_asgi(asgi, path, pool, k, args.concurrency)
+        print(f"{name:<24}{k / t_wsgi:>14.0f}{t_wsgi / k * 1e6:>10.1f}"
+              f"{k / t_asgi:>14.0f}{t_asgi / k * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""
+Benchmark suite for the hot paths of the library. Runs offline, the renewal service is replaced
+by a local stand-in server.
+
+Every benchmark reports throughput, latency percentiles and the peak memory allocated by a
+single call. Results can be saved as JSON and compared against a previous run, the comparison
+fails if any benchmark regressed by more than the given threshold.
+
+Usage:
+
+    python benchmarks/run.py [--number N] [--filter REGEX] [--output FILE]
+                             [--compare BASELINE] [--threshold FRACTION]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Any
+
+import dt_authentication
+from dt_authentication import DuckietownToken, InvalidToken, ExpiredToken, InvalidTokenCache, \
+    VerifiedTokenCache, SharedVerifiedTokenCache
+from dt_authentication.backends import get_backend
+from dt_authentication.renew import RenewClient
+from dt_authentication.token import Scope
+from dt_authentication.utils import get_or_create_key_pair
+from dt_authentication_tests.renew_server import RenewServer
+
+SAMPLE_TOKEN_DT1 = "dt1-9Hfd69b5ythetkCiNG12pKDrL987sLJT6KejWP2Eo5QQ" \
+                   "-43dzqWFnWd8KBa1yev1g3UKnzVxZkkTbfWWn6of92V5Bf8qGV24rZHe6r7sueJNtWF"
+SAMPLE_TOKEN_DT2 = "dt2-FifqUXc5FqUotojkAVpYG5JWebZRH6SUHM3DRgk1kRSKdq1uKcL9CFaNT9dRhCVKwFoEnMgm6Hu6v8-" \
+                   "43dzqWFnWd8KBa1yev1g3UKnzVxZkkTbfaF8L9aHLLmc5bPTTmQhQzybqT8rKAADZa"
+
+SMALL_SCOPE = ["auth", "read:data:1", "write:data:2"]
+LARGE_SCOPE = [
+    {"action": "read", "resource": f"resource{i}", "identifier": str(i), "service": f"service{i % 4}"}
+    for i in range(256)
+] + ["write:data:2"]
+MEDIUM_SCOPE = [f"{action}:duckiebot:db{i:02d}" for i in range(32) for action in ("read", "write")]
+WILDCARD_SCOPE = [f"read:resource{i}:db-{i}-*" for i in range(256)] + ["write:data:db-*"]
+
+# metrics compared against a baseline: name -> True if higher is better
+COMPARED_METRICS = {
+    "throughput": True,
+    "p50_us": False,
+}
+
+Operation = Callable[[], Any]
+
+
+class Context(object):
+    """
+    State shared by all the benchmarks (keys, tokens, the renewal server).
+    """
+
+    def __init__(self, tmp: str):
+        self.tmp: str = tmp
+        self.sk, self.vk = get_or_create_key_pair("dt2", tmp)
+        self.token = DuckietownToken.generate(self.sk, 42, days=1, renewable=True, scope=SMALL_SCOPE)
+        self.large_token = DuckietownToken.generate(self.sk, 42, days=1, scope=LARGE_SCOPE)
+        self.wildcard_token = DuckietownToken.generate(self.sk, 42, days=1, scope=WILDCARD_SCOPE,
+                                                       version="dt3")
+        self.token_str: str = self.token.as_string()
+        self._server: Optional[RenewServer] = None
+
+    @property
+    def server(self) -> RenewServer:
+        if self._server is None:
+            self._server = RenewServer(self.sk, self.vk).start()
+        return self._server
+
+    def close(self):
+        if self._server is not None:
+            self._server.stop()
+
+
+# name -> (setup, relative number of calls)
+BENCHMARKS: Dict[str, tuple] = {}
+
+
+def benchmark(name: str, scale: float = 1.0):
+    """
+    Registers a benchmark. The decorated function receives the context and returns the operation
+    to measure.
+    """
+
+    def decorator(setup: Callable[[Context], Operation]):
+        BENCHMARKS[name] = (setup, scale)
+        return setup
+
+    return decorator
+
+
+def _raises(fcn: Callable, exc: type) -> Operation:
+    def op():
+        try:
+            fcn()
+        except exc:
+            return
+        raise AssertionError(f"Expected {exc.__name__}")
+
+    return op
+
+
+@benchmark("from_string.dt1.valid")
+def _(ctx: Context) -> Operation:
+    return lambda: DuckietownToken.from_string(SAMPLE_TOKEN_DT1, allow_expired=True)
+
+
+@benchmark("from_string.dt1.invalid")
+def _(ctx: Context) -> Operation:
+    s: str = SAMPLE_TOKEN_DT1.replace(SAMPLE_TOKEN_DT1[6:8], "XY")
+    return _raises(lambda: DuckietownToken.from_string(s, allow_expired=True), InvalidToken)
+
+
+@benchmark("from_string.dt2.valid")
+def _(ctx: Context) -> Operation:
+    return lambda: DuckietownToken.from_string(ctx.token_str, vk=ctx.vk)
+
+
+@benchmark("from_string.dt2.valid.cache")
+def _(ctx: Context) -> Operation:
+    cache: VerifiedTokenCache = VerifiedTokenCache()
+    return lambda: DuckietownToken.from_string(ctx.token_str, vk=ctx.vk, cache=cache)
+
+
+@benchmark("from_string.dt2.valid.shared_cache")
+def _(ctx: Context) -> Operation:
+    cache: SharedVerifiedTokenCache = SharedVerifiedTokenCache(os.path.join(ctx.tmp, "tokens.db"))
+    return lambda: DuckietownToken.from_string(ctx.token_str, vk=ctx.vk, cache=cache)
+
+
+@benchmark("from_string.dt3.valid")
+def _(ctx: Context) -> Operation:
+    s: str = DuckietownToken.generate(ctx.sk, 42, days=1, renewable=True, scope=SMALL_SCOPE,
+                                      version="dt3").as_string()
+    return lambda: DuckietownToken.from_string(s, vk=ctx.vk)
+
+
+@benchmark("from_string.dt3.large")
+def _(ctx: Context) -> Operation:
+    s: str = DuckietownToken.generate(ctx.sk, 42, days=1, scope=MEDIUM_SCOPE, version="dt3").as_string()
+    return lambda: DuckietownToken.from_string(s, vk=ctx.vk)
+
+
+@benchmark("from_string.dt2.large")
+def _(ctx: Context) -> Operation:
+    s: str = DuckietownToken.generate(ctx.sk, 42, days=1, scope=MEDIUM_SCOPE).as_string()
+    return lambda: DuckietownToken.from_string(s, vk=ctx.vk)
+
+
+@benchmark("from_string.dt2.invalid_signature")
+def _(ctx: Context) -> Operation:
+    payload, signature = ctx.token_str[4:].split("-")
+    s: str = f"dt2-{payload}-{signature[::-1]}"
+    return _raises(lambda: DuckietownToken.from_string(s, vk=ctx.vk), InvalidToken)
+
+
+@benchmark("from_string.dt2.invalid_signature.negative_cache")
+def _(ctx: Context) -> Operation:
+    payload, signature = ctx.token_str[4:].split("-")
+    s: str = f"dt2-{payload}-{signature[::-1]}"
+    cache: InvalidTokenCache = InvalidTokenCache()
+    return _raises(lambda: DuckietownToken.from_string(s, vk=ctx.vk, negative_cache=cache), InvalidToken)
+
+
+@benchmark("from_string.dt2.malformed")
+def _(ctx: Context) -> Operation:
+    s: str = ctx.token_str.replace("-", "", 1)
+    return _raises(lambda: DuckietownToken.from_string(s, vk=ctx.vk), InvalidToken)
+
+
+@benchmark("from_string.dt2.expired")
+def _(ctx: Context) -> Operation:
+    return _raises(lambda: DuckietownToken.from_string(SAMPLE_TOKEN_DT2, allow_expired=False), ExpiredToken)
+
+
+@benchmark("generate")
+def _(ctx: Context) -> Operation:
+    return lambda: DuckietownToken.generate(ctx.sk, 42, days=1, renewable=True, scope=SMALL_SCOPE)
+
+
+@benchmark("generate.dt3")
+def _(ctx: Context) -> Operation:
+    return lambda: DuckietownToken.generate(ctx.sk, 42, days=1, renewable=True, scope=SMALL_SCOPE,
+                                            version="dt3")
+
+
+@benchmark("as_string.decoded")
+def _(ctx: Context) -> Operation:
+    token = DuckietownToken.from_string(ctx.token_str, vk=ctx.vk)
+    return token.as_string
+
+
+@benchmark("as_string.constructed")
+def _(ctx: Context) -> Operation:
+    token = ctx.token
+    return lambda: DuckietownToken(token.version, dict(token.payload), token.signature).as_string()
+
+
+@benchmark("payload_as_json")
+def _(ctx: Context) -> Operation:
+    return ctx.token.payload_as_json
+
+
+@benchmark("scope.parse")
+def _(ctx: Context) -> Operation:
+    return lambda: Scope.parse("read:resource:identifier")
+
+
+@benchmark("scope.compact")
+def _(ctx: Context) -> Operation:
+    scope: Scope = Scope.parse("read:resource:identifier")
+    return scope.compact
+
+
+@benchmark("grants.small")
+def _(ctx: Context) -> Operation:
+    return lambda: ctx.token.grants("write", "data", "2")
+
+
+@benchmark("grants.large")
+def _(ctx: Context) -> Operation:
+    return lambda: ctx.large_token.grants("write", "data", "2")
+
+
+@benchmark("grants.large.miss")
+def _(ctx: Context) -> Operation:
+    return lambda: ctx.large_token.grants("delete", "data", "2")
+
+
+@benchmark("grants.wildcard")
+def _(ctx: Context) -> Operation:
+    return lambda: ctx.wildcard_token.grants("write", "data", "db-duckiebot01")
+
+
+@benchmark("grants.wildcard.miss")
+def _(ctx: Context) -> Operation:
+    return lambda: ctx.wildcard_token.grants("read", "resource1", "db-2-duckiebot01")
+
+
+@benchmark("renew.local_server", scale=0.05)
+def _(ctx: Context) -> Operation:
+    client: RenewClient = RenewClient(base_url=ctx.server.base_url, vk=ctx.vk)
+    return lambda: ctx.token.renew(client=client)
+
+
+def _percentile(samples: List[float], p: float) -> float:
+    # nearest-rank percentile of sorted samples
+    index: int = max(0, min(len(samples) - 1, int(round(p / 100 * len(samples) + 0.5)) - 1))
+    return samples[index]
+
+
+def measure(op: Operation, number: int) -> Dict[str, float]:
+    """
+    Measures the given operation.
+
+    :param op:      The operation to measure.
+    :param number:  Number of timed calls.
+    :return:        Throughput (calls/s), latency percentiles (us) and peak memory (bytes).
+    """
+    # warm up caches and lazy initializations
+    for _ in range(max(1, number // 10)):
+        op()
+    # latency
+    samples: List[float] = []
+    clock = time.perf_counter
+    for _ in range(number):
+        t0 = clock()
+        op()
+        samples.append(clock() - t0)
+    total: float = sum(samples)
+    samples.sort()
+    # memory is measured separately, tracing slows every allocation down
+    tracemalloc.start()
+    try:
+        op()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "number": number,
+        "throughput": number / total if total > 0 else float("inf"),
+        "mean_us": total / number * 1e6,
+        "p50_us": _percentile(samples, 50) * 1e6,
+        "p90_us": _percentile(samples, 90) * 1e6,
+        "p99_us": _percentile(samples, 99) * 1e6,
+        "peak_memory_bytes": peak,
+    }
+
+
+def run(number: int, pattern: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        ctx: Context = Context(tmp)
+        try:
+            for name, (setup, scale) in BENCHMARKS.items():
+                if pattern is not None and not re.search(pattern, name):
+                    continue
+                op: Operation = setup(ctx)
+                results[name] = measure(op, max(10, int(number * scale)))
+                _print_result(name, results[name])
+        finally:
+            ctx.close()
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[str]:
+    """
+    Compares results against a baseline.
+
+    :return: A description of each regression larger than the threshold.
+    """
+    regressions: List[str] = []
+    print(f"\n{'benchmark':<52}{'metric':<12}{'baseline':>14}{'current':>14}{'change':>10}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = baseline[name][metric], result[metric]
+            if old <= 0:
+                continue
+            change: float = (new - old) / old
+            regressed: bool = (-change if higher_is_better else change) > threshold
+            flag: str = "  REGRESSION" if regressed else ""
+            print(f"{name:<52}{metric:<12}{old:>14.2f}{new:>14.2f}{change:>+9.1%}{flag}")
+            if regressed:
+                regressions.append(f"{name}: {metric} {old:.2f} -> {new:.2f} ({change:+.1%})")
+    return regressions
+
+
+def _print_result(name: str, r: Dict[str, float]):
+    print(f"{name:<52}{r['throughput']:>12.0f}{r['p50_us']:>10.1f}{r['p90_us']:>10.1f}"
+          f"{r['p99_us']:>10.1f}{r['peak_memory_bytes'] / 1024:>12.1f}")
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=2000, help="Number of timed calls per benchmark")
+    parser.add_argument("--filter", default=None, help="Run only the benchmarks matching this regex")
+    parser.add_argument("--output", default=None, help="Save the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="Compare against the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative change above which a benchmark is considered a regression")
+    args = parser.parse_args(args=args)
+
+    print(f"{'benchmark':<52}{'ops/s':>12}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'peak KiB':>12}")
+    results = run(args.number, args.filter)
+
+    report = {
+        "meta": {
+            "version": dt_authentication.__version__,
+            "backend": get_backend().name,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.datetime.utcnow().isoformat(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "wt") as fout:
+            json.dump(report, fout, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, "rt") as fin:
+            baseline = json.load(fin)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -45,6 +45,12 @@ install_requires = [
     'requests'
 ]
 tests_require = []
+extras_require = {
+    # OpenSSL-backed signature verification
+    "fast": ["cryptography"],
+    # asyncio API
+    "async": ["aiohttp"],
+}
 
 # compile description
 underline = "=" * (len(package_name) + len(short_description) + 2)
@@ -74,6 +80,7 @@ setup(
     url=library_webpage,
     tests_require=tests_require,
     install_requires=install_requires,
+    extras_require=extras_require,
     package_dir={"": "src"},
     packages=find_packages("./src"),
     long_description=description,
@@ -1,7 +1,31 @@
 __version__ = "2.2.0"
 
 from .exceptions import GenericException, InvalidToken, ExpiredToken, NotARenewableToken
-from .token import DuckietownToken
+from .token import DuckietownToken, TokenSpec
 
+# modules imported on first use, keeps 'import dt_authentication' cheap
+_LAZY = {
+    "VerifiedTokenCache": "cache",
+    "InvalidTokenCache": "cache",
+    "SharedVerifiedTokenCache": "cache",
+}
 
-__all__ = ["DuckietownToken", "GenericException", "InvalidToken", "ExpiredToken", "NotARenewableToken"]
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        import importlib
+        return getattr(importlib.import_module(f".{_LAZY[name]}", __name__), name)
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+__all__ = [
+    "DuckietownToken",
+    "TokenSpec",
+    "VerifiedTokenCache",
+    "InvalidTokenCache",
+    "SharedVerifiedTokenCache",
+    "GenericException",
+    "InvalidToken",
+    "ExpiredToken",
+    "NotARenewableToken",
+]
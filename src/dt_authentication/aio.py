@@ -0,0 +1,117 @@
+import asyncio
+import weakref
+from typing import Optional, Any, Dict, TYPE_CHECKING
+
+from .exceptions import GenericException
+from .token import DuckietownToken, TOKEN_RENEW_ONLINE_PATH, default_renew_base_url
+
+if TYPE_CHECKING:
+    # noinspection PyProtectedMember
+    from ecdsa.keys import VerifyingKey
+
+__all__ = [
+    "AsyncRenewClient",
+    "get_default_client",
+    "close_default_client",
+]
+
+
+class AsyncRenewClient(object):
+    """
+    Non-blocking client of the Duckietown token renewal service.
+
+    All the requests made by a client share the same pool of connections. A client is bound to
+    the event loop it is first used in.
+
+    Args:
+        base_url:           Base URL of the renewal service (default: ``https://<DT_TOKEN_RENEW_HOST>``).
+        vk:                 Optional verification key for the renewed tokens if different from default
+        connect_timeout:    Timeout in seconds to establish a connection.
+        read_timeout:       Timeout in seconds to read a response.
+        max_connections:    Maximum number of connections in the pool.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, vk: Optional['VerifyingKey'] = None,
+                 connect_timeout: float = 5.0, read_timeout: float = 10.0, max_connections: int = 100):
+        self._base_url: str = (base_url or default_renew_base_url()).rstrip("/")
+        self._vk: Optional['VerifyingKey'] = vk
+        self._connect_timeout: float = connect_timeout
+        self._read_timeout: float = read_timeout
+        self._max_connections: int = max_connections
+        self._session = None
+
+    @property
+    def url(self) -> str:
+        """
+        The URL of the renewal endpoint.
+        """
+        return f"{self._base_url}{TOKEN_RENEW_ONLINE_PATH}"
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            try:
+                import aiohttp
+            except ImportError:
+                raise RuntimeError("The package 'aiohttp' is needed to renew tokens asynchronously")
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._max_connections),
+                timeout=aiohttp.ClientTimeout(
+                    total=None, sock_connect=self._connect_timeout, sock_read=self._read_timeout
+                ),
+            )
+        return self._session
+
+    async def renew(self, token: DuckietownToken) -> DuckietownToken:
+        """
+        Asks the renewal service for a new token.
+
+        :param token:   The token to renew.
+        :return:        The new token.
+        """
+        session = self._get_session()
+        headers = {"Authorization": f"Token {token.as_string()}"}
+        async with session.get(self.url, headers=headers) as response:
+            data: Dict[str, Any] = await response.json(content_type=None)
+        if not data["success"]:
+            raise GenericException(data["messages"])
+        return await DuckietownToken.afrom_string(data["result"]["token"], vk=self._vk)
+
+    async def close(self):
+        """
+        Closes all the connections in the pool.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> 'AsyncRenewClient':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+
+# one default client per event loop
+_default_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncRenewClient]' = \
+    weakref.WeakKeyDictionary()
+
+
+def get_default_client() -> AsyncRenewClient:
+    """
+    Returns the client used by :py:meth:`dt_authentication.DuckietownToken.arenew` when no client
+    is given, there is one per event loop.
+    """
+    loop = asyncio.get_running_loop()
+    client: Optional[AsyncRenewClient] = _default_clients.get(loop, None)
+    if client is None:
+        client = _default_clients[loop] = AsyncRenewClient()
+    return client
+
+
+async def close_default_client():
+    """
+    Closes the default client of the running event loop, if any.
+    """
+    client: Optional[AsyncRenewClient] = _default_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
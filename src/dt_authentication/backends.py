@@ -0,0 +1,219 @@
+import os
+import threading
+from typing import Optional, Dict, Callable, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # noinspection PyProtectedMember
+    from ecdsa.keys import VerifyingKey, SigningKey
+
+__all__ = [
+    "SignatureBackend",
+    "EcdsaBackend",
+    "CryptographyBackend",
+    "available_backends",
+    "get_backend",
+    "set_backend",
+]
+
+Entropy = Callable[[int], bytes]
+
+
+class SignatureBackend(object):
+    """
+    Interface of the implementations of the signature scheme used by Duckietown Tokens.
+
+    Signatures are exchanged in the raw ``r || s`` form produced by the ``ecdsa`` package,
+    keys are always instances of the ``ecdsa`` key classes.
+    """
+
+    name: str = None
+
+    def verify(self, vk: 'VerifyingKey', signature: bytes, data: bytes) -> bool:
+        """
+        Verifies a signature.
+
+        :param vk:          The verifying key.
+        :param signature:   The raw signature.
+        :param data:        The signed data.
+        :return:            Whether the signature is valid.
+        """
+        raise NotImplementedError()
+
+    def sign(self, sk: 'SigningKey', data: bytes, entropy: Optional[Entropy] = None) -> bytes:
+        """
+        Signs the given data.
+
+        :param sk:          The signing key.
+        :param data:        The data to sign.
+        :param entropy:     (Optional) Source of randomness. Signatures made with the same key, data
+                            and entropy are identical.
+        :return:            The raw signature.
+        """
+        raise NotImplementedError()
+
+
+class EcdsaBackend(SignatureBackend):
+    """
+    Pure-Python implementation based on the ``ecdsa`` package.
+    """
+
+    name: str = "ecdsa"
+
+    def verify(self, vk: 'VerifyingKey', signature: bytes, data: bytes) -> bool:
+        # noinspection PyProtectedMember
+        from ecdsa.keys import BadSignatureError
+        try:
+            return vk.verify(signature, data)
+        except BadSignatureError:
+            return False
+
+    def sign(self, sk: 'SigningKey', data: bytes, entropy: Optional[Entropy] = None) -> bytes:
+        return sk.sign(data, entropy=entropy)
+
+
+class CryptographyBackend(SignatureBackend):
+    """
+    OpenSSL-backed implementation based on the ``cryptography`` package.
+
+    Keys on curves other than NIST192p, and signatures that must be made with a given entropy,
+    are handed over to the ``ecdsa`` backend.
+    """
+
+    name: str = "cryptography"
+
+    def __init__(self):
+        # noinspection PyProtectedMember
+        from ecdsa.curves import NIST192p
+        # raises ImportError when the package is not installed
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography.hazmat.primitives.asymmetric.utils import (
+            decode_dss_signature,
+            encode_dss_signature,
+        )
+
+        self._ec = ec
+        self._invalid_signature = InvalidSignature
+        self._encode_dss_signature = encode_dss_signature
+        self._decode_dss_signature = decode_dss_signature
+        self._hashes = {
+            "sha1": hashes.SHA1,
+            "sha224": hashes.SHA224,
+            "sha256": hashes.SHA256,
+            "sha384": hashes.SHA384,
+            "sha512": hashes.SHA512,
+        }
+        self._curve = ec.SECP192R1()
+        self._nist192p = NIST192p
+        self._fallback: EcdsaBackend = EcdsaBackend()
+        self._public_keys: Dict[bytes, object] = {}
+        self._private_keys: Dict[bytes, object] = {}
+        # make sure the OpenSSL build supports the curve
+        ec.derive_private_key(1, self._curve)
+
+    def _algorithm(self, hashfunc):
+        return self._ec.ECDSA(self._hashes[hashfunc().name]())
+
+    def _supported(self, key: Union['SigningKey', 'VerifyingKey']) -> bool:
+        return key.curve == self._nist192p and key.default_hashfunc().name in self._hashes
+
+    def verify(self, vk: 'VerifyingKey', signature: bytes, data: bytes) -> bool:
+        if not self._supported(vk):
+            return self._fallback.verify(vk, signature, data)
+        # raw signatures are made of two integers of the size of the curve order
+        baselen: int = vk.curve.baselen
+        if len(signature) != 2 * baselen:
+            return False
+        r: int = int.from_bytes(signature[:baselen], "big")
+        s: int = int.from_bytes(signature[baselen:], "big")
+        if not (0 < r < vk.curve.order and 0 < s < vk.curve.order):
+            return False
+        encoded: bytes = vk.to_string()
+        key = self._public_keys.get(encoded, None)
+        if key is None:
+            key = self._ec.EllipticCurvePublicKey.from_encoded_point(self._curve, b"\x04" + encoded)
+            self._public_keys[encoded] = key
+        try:
+            key.verify(self._encode_dss_signature(r, s), data, self._algorithm(vk.default_hashfunc))
+        except self._invalid_signature:
+            return False
+        return True
+
+    def sign(self, sk: 'SigningKey', data: bytes, entropy: Optional[Entropy] = None) -> bytes:
+        # OpenSSL draws its own nonces, reproducible signatures are made by 'ecdsa'
+        if entropy is not None or not self._supported(sk):
+            return self._fallback.sign(sk, data, entropy=entropy)
+        encoded: bytes = sk.to_string()
+        key = self._private_keys.get(encoded, None)
+        if key is None:
+            key = self._ec.derive_private_key(sk.privkey.secret_multiplier, self._curve)
+            self._private_keys[encoded] = key
+        r, s = self._decode_dss_signature(key.sign(data, self._algorithm(sk.default_hashfunc)))
+        baselen: int = sk.curve.baselen
+        return r.to_bytes(baselen, "big") + s.to_bytes(baselen, "big")
+
+
+_BACKENDS = {
+    EcdsaBackend.name: EcdsaBackend,
+    CryptographyBackend.name: CryptographyBackend,
+}
+
+_lock: threading.Lock = threading.Lock()
+_backend: Optional[SignatureBackend] = None
+
+
+def available_backends() -> Dict[str, SignatureBackend]:
+    """
+    Returns an instance of each signature backend that can be used in this environment.
+    """
+    backends: Dict[str, SignatureBackend] = {}
+    for name, cls in _BACKENDS.items():
+        try:
+            backends[name] = cls()
+        except Exception:
+            pass
+    return backends
+
+
+def set_backend(backend: Union[str, SignatureBackend]):
+    """
+    Sets the signature backend used to sign and verify Duckietown Tokens.
+
+    :param backend:     The name of a backend or an instance of a backend.
+    """
+    global _backend
+    if isinstance(backend, str):
+        if backend not in _BACKENDS:
+            raise ValueError(f"Signature backend '{backend}' not recognized. "
+                             f"Valid choices are {str(list(_BACKENDS))}.")
+        backend = _BACKENDS[backend]()
+    if not isinstance(backend, SignatureBackend):
+        raise ValueError(f"Signature backend of type '{type(backend).__name__}' not supported.")
+    with _lock:
+        _backend = backend
+
+
+def get_backend() -> SignatureBackend:
+    """
+    Returns the signature backend used to sign and verify Duckietown Tokens.
+
+    Unless set explicitly, the backend is taken from the environment variable
+    ``DT_TOKEN_CRYPTO_BACKEND``, or is the fastest backend available.
+    """
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                name: Optional[str] = os.environ.get("DT_TOKEN_CRYPTO_BACKEND", None)
+                if name:
+                    if name not in _BACKENDS:
+                        raise ValueError(f"Signature backend '{name}' not recognized. "
+                                         f"Valid choices are {str(list(_BACKENDS))}.")
+                    _backend = _BACKENDS[name]()
+                else:
+                    try:
+                        _backend = CryptographyBackend()
+                    except Exception:
+                        _backend = EcdsaBackend()
+    return _backend
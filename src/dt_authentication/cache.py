@@ -0,0 +1,566 @@
+import dataclasses
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple, List, Hashable, Union, Any, TYPE_CHECKING
+
+from .keys import key_fingerprint
+from .token import DuckietownToken, _decode_payload, _parse_scopes
+
+if TYPE_CHECKING:
+    # noinspection PyProtectedMember
+    from ecdsa.keys import VerifyingKey
+
+__all__ = [
+    "CacheStats",
+    "VerifiedTokenCache",
+    "InvalidTokenCache",
+    "SharedVerifiedTokenCache",
+    "TokenCache",
+]
+
+# rough per-entry overhead (key tuple, entry tuple, payload dict, ordered dict node) in bytes
+_ENTRY_OVERHEAD: int = 512
+# rough per-entry overhead of the negative cache (digest, entry tuple, ordered dict node) in bytes
+_NEGATIVE_ENTRY_OVERHEAD: int = 256
+# longest error message remembered by the negative cache
+MAX_NEGATIVE_MESSAGE_LENGTH: int = 256
+# seconds a process waits for another one to release the shared cache before giving up
+SHARED_CACHE_TIMEOUT: float = 1.0
+# size in bytes of the secret that authenticates the entries of the shared cache
+SHARED_CACHE_SECRET_SIZE: int = 32
+
+# connections inherited from a parent process, closing them could release the locks of the parent
+_inherited_connections: List[Any] = []
+
+
+@dataclasses.dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total: int = self.hits + self.misses
+        return (self.hits / total) if total else 0.0
+
+
+class _Shard(object):
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int]):
+        self.lock: threading.Lock = threading.Lock()
+        self.entries: OrderedDict = OrderedDict()
+        self.max_entries: int = max_entries
+        self.max_bytes: Optional[int] = max_bytes
+        self.bytes: int = 0
+        self.stats: CacheStats = CacheStats()
+
+
+def _aggregate(shards: List[_Shard]) -> CacheStats:
+    stats: CacheStats = CacheStats()
+    for shard in shards:
+        with shard.lock:
+            stats.hits += shard.stats.hits
+            stats.misses += shard.stats.misses
+            stats.evictions += shard.stats.evictions
+            stats.expirations += shard.stats.expirations
+            stats.entries += len(shard.entries)
+            stats.bytes += shard.bytes
+    return stats
+
+
+class VerifiedTokenCache(object):
+    """
+    A bounded, thread-safe cache of verified Duckietown Tokens.
+
+    Entries are keyed by the token string and the verifying key used to verify it, they expire
+    together with the token they hold and are evicted in LRU order once the cache is full.
+    Pass an instance of this class to :py:meth:`dt_authentication.DuckietownToken.from_string`
+    to skip decoding and signature verification for tokens that were already verified.
+
+    Args:
+        max_entries:    Maximum number of tokens held by the cache.
+        max_bytes:      (Optional) Approximate maximum memory footprint of the cache in bytes.
+        shards:         Number of independently locked partitions of the cache.
+    """
+
+    # lookups and insertions never wait on I/O, they are safe on an event loop
+    blocking: bool = False
+
+    def __init__(self, max_entries: int = 10000, max_bytes: Optional[int] = None, shards: int = 16):
+        if max_entries <= 0:
+            raise ValueError("Argument 'max_entries' must be a positive integer")
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError("Argument 'max_bytes' must be a positive integer")
+        if shards <= 0:
+            raise ValueError("Argument 'shards' must be a positive integer")
+        shards = min(shards, max_entries)
+        shard_entries: int = -(-max_entries // shards)
+        shard_bytes: Optional[int] = (-(-max_bytes // shards)) if max_bytes is not None else None
+        self._shards: List[_Shard] = [_Shard(shard_entries, shard_bytes) for _ in range(shards)]
+
+    @staticmethod
+    def _key(s: str, vk: Optional['VerifyingKey']) -> Tuple[str, Optional[bytes]]:
+        return s, (key_fingerprint(vk) if vk is not None else None)
+
+    def _shard(self, key: Hashable) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def get(self, s: str, vk: Optional['VerifyingKey'] = None) -> Optional[DuckietownToken]:
+        """
+        Returns the verified token for the given token string and verifying key, if cached.
+
+        :param s:   The Duckietown Token string.
+        :param vk:  The verifying key the token was verified with, `None` for the default key.
+        :return:    A new instance of the cached token, `None` on a cache miss.
+        """
+        key = self._key(s, vk)
+        shard: _Shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.get(key, None)
+            if entry is None:
+                shard.stats.misses += 1
+                return None
+            token, deadline, size = entry
+            if deadline is not None and deadline <= time.time():
+                # the token expired while in the cache
+                del shard.entries[key]
+                shard.bytes -= size
+                shard.stats.expirations += 1
+                shard.stats.misses += 1
+                return None
+            shard.entries.move_to_end(key)
+            shard.stats.hits += 1
+        # the cache never hands out the instances it holds
+        return token._clone()
+
+    def put(self, s: str, vk: Optional['VerifyingKey'], token: DuckietownToken):
+        """
+        Adds a verified token to the cache. Tokens that are already expired are not cached.
+
+        :param s:       The Duckietown Token string.
+        :param vk:      The verifying key the token was verified with, `None` for the default key.
+        :param token:   The verified token.
+        """
+        deadline: Optional[int] = token.expiration_timestamp
+        if deadline is not None and deadline <= time.time():
+            return
+        key = self._key(s, vk)
+        size: int = 2 * len(s) + _ENTRY_OVERHEAD
+        shard: _Shard = self._shard(key)
+        with shard.lock:
+            old = shard.entries.pop(key, None)
+            if old is not None:
+                shard.bytes -= old[-1]
+            shard.entries[key] = (token._clone(), deadline, size)
+            shard.bytes += size
+            # evict least recently used entries
+            while len(shard.entries) > shard.max_entries or \
+                    (shard.max_bytes is not None and shard.bytes > shard.max_bytes and
+                     len(shard.entries) > 1):
+                _, evicted = shard.entries.popitem(last=False)
+                shard.bytes -= evicted[-1]
+                shard.stats.evictions += 1
+
+    def clear(self):
+        """
+        Removes all the entries from the cache. Statistics are preserved.
+        """
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.bytes = 0
+
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+
+    @property
+    def stats(self) -> CacheStats:
+        """
+        Hit, miss, eviction and expiration counters aggregated over all the shards.
+        """
+        return _aggregate(self._shards)
+
+
+def _digest(s: str, vk: Optional['VerifyingKey']) -> bytes:
+    # fixed-size key of a token string verified with a given key
+    h = hashlib.blake2b(digest_size=16)
+    if vk is not None:
+        h.update(key_fingerprint(vk))
+    h.update(b"\0")
+    h.update(s.encode("utf-8", "surrogatepass"))
+    return h.digest()
+
+
+class InvalidTokenCache(object):
+    """
+    A bounded, thread-safe cache of recent token verification failures.
+
+    Entries are keyed by a digest of the token string and of the verifying key used to verify it,
+    so the memory used by an entry does not depend on the size of the token. Entries live for
+    ``ttl`` seconds and the oldest ones are evicted once the cache is full.
+    Pass an instance of this class to :py:meth:`dt_authentication.DuckietownToken.from_string`
+    to reject tokens that recently failed verification without decoding and verifying them again.
+
+    Args:
+        max_entries:    Maximum number of failures held by the cache.
+        ttl:            Seconds a failure is remembered for.
+        shards:         Number of independently locked partitions of the cache.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 60.0, shards: int = 16):
+        if max_entries <= 0:
+            raise ValueError("Argument 'max_entries' must be a positive integer")
+        if ttl <= 0:
+            raise ValueError("Argument 'ttl' must be a positive number")
+        if shards <= 0:
+            raise ValueError("Argument 'shards' must be a positive integer")
+        shards = min(shards, max_entries)
+        shard_entries: int = -(-max_entries // shards)
+        self._ttl: float = ttl
+        self._shards: List[_Shard] = [_Shard(shard_entries, None) for _ in range(shards)]
+
+    @staticmethod
+    def _key(s: str, vk: Optional['VerifyingKey']) -> bytes:
+        return _digest(s, vk)
+
+    def _shard(self, key: bytes) -> _Shard:
+        return self._shards[key[0] % len(self._shards)]
+
+    def get(self, s: str, vk: Optional['VerifyingKey'] = None) -> Optional[str]:
+        """
+        Returns the error message of a recent verification failure of the given token string.
+
+        :param s:   The Duckietown Token string.
+        :param vk:  The verifying key the token was verified with, `None` for the default key.
+        :return:    The error message, `None` if the token did not fail recently.
+        """
+        key: bytes = self._key(s, vk)
+        shard: _Shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.get(key, None)
+            if entry is None:
+                shard.stats.misses += 1
+                return None
+            message, deadline, size = entry
+            if deadline <= time.monotonic():
+                del shard.entries[key]
+                shard.bytes -= size
+                shard.stats.expirations += 1
+                shard.stats.misses += 1
+                return None
+            shard.stats.hits += 1
+        return message
+
+    def put(self, s: str, vk: Optional['VerifyingKey'], message: str):
+        """
+        Records a verification failure.
+
+        :param s:       The Duckietown Token string.
+        :param vk:      The verifying key the token was verified with, `None` for the default key.
+        :param message: The error message of the failure.
+        """
+        message = message[:MAX_NEGATIVE_MESSAGE_LENGTH]
+        key: bytes = self._key(s, vk)
+        size: int = len(message) + _NEGATIVE_ENTRY_OVERHEAD
+        shard: _Shard = self._shard(key)
+        with shard.lock:
+            old = shard.entries.pop(key, None)
+            if old is not None:
+                shard.bytes -= old[-1]
+            # the expiration is not refreshed by hits, entries are evicted in insertion order
+            shard.entries[key] = (message, time.monotonic() + self._ttl, size)
+            shard.bytes += size
+            while len(shard.entries) > shard.max_entries:
+                _, evicted = shard.entries.popitem(last=False)
+                shard.bytes -= evicted[-1]
+                shard.stats.evictions += 1
+
+    def clear(self):
+        """
+        Removes all the entries from the cache. Statistics are preserved.
+        """
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.bytes = 0
+
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+
+    @property
+    def stats(self) -> CacheStats:
+        """
+        Hit, miss, eviction and expiration counters aggregated over all the shards.
+        """
+        return _aggregate(self._shards)
+
+
+def _check_private(path: str, st: os.stat_result):
+    # the files of the shared cache must belong to the current user and be private to them
+    if os.name != "posix":
+        return
+    if st.st_uid != os.getuid():
+        raise ValueError(f"The file '{path}' does not belong to the current user")
+    if st.st_mode & 0o077:
+        raise ValueError(f"The file '{path}' is accessible by other users, its mode should be 0600")
+
+
+def _open_private(path: str, flags: int) -> int:
+    fd: int = os.open(path, flags | getattr(os, "O_NOFOLLOW", 0), 0o600)
+    try:
+        _check_private(path, os.fstat(fd))
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+def _load_secret(path: str) -> bytes:
+    # the secret is written to a temporary file and then linked in place, so that processes racing
+    # to create it all end up reading the same, complete secret
+    if not os.path.exists(path):
+        import tempfile
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as fout:
+                fout.write(os.urandom(SHARED_CACHE_SECRET_SIZE))
+            try:
+                os.link(tmp, path)
+            except FileExistsError:
+                pass
+        finally:
+            os.unlink(tmp)
+    with os.fdopen(_open_private(path, os.O_RDONLY), "rb") as fin:
+        secret: bytes = fin.read()
+    if len(secret) != SHARED_CACHE_SECRET_SIZE:
+        raise ValueError(f"The file '{path}' does not contain a valid secret")
+    return secret
+
+
+def _mac(secret: bytes, key: bytes, version: str, raw: bytes, signature: bytes, exp: Optional[int]) -> bytes:
+    # authenticates an entry of the shared cache, fields are length-prefixed to keep them apart
+    h = hashlib.blake2b(key=secret, digest_size=16)
+    for field in (key, version.encode("utf-8"), raw, signature, b"" if exp is None else str(exp).encode()):
+        h.update(len(field).to_bytes(4, "big"))
+        h.update(field)
+    return h.digest()
+
+
+class SharedVerifiedTokenCache(object):
+    """
+    A bounded cache of verified Duckietown Tokens shared by all the processes on a host.
+
+    Entries are stored in an SQLite database in WAL mode, keyed by a digest of the token string
+    and of the verifying key used to verify it. An entry holds the signed payload, the signature
+    and the expiration of the token, so a hit skips both base58 decoding and signature
+    verification. Expired entries are swept periodically and, when the cache is full, the entries
+    closest to their expiration are evicted first.
+    Pass an instance of this class to :py:meth:`dt_authentication.DuckietownToken.from_string`
+    in every worker of a pre-fork server to share verifications among the workers.
+
+    Cached tokens are not verified again, so the cache is trusted as much as the verifying key.
+    The database holds usable tokens and is readable and writable only by the user who created
+    it. Each entry is authenticated with a secret stored in ``<path>.key``, which is also private
+    to that user, and entries that fail authentication are treated as cache misses. Files that
+    belong to another user or that other users can access are rejected. Keep the database in a
+    directory only the server's user can write to, e.g., not directly under ``/tmp``.
+
+    Args:
+        path:           Path to the database file, created if it does not exist.
+        max_entries:    Maximum number of tokens held by the cache.
+        sweep_every:    (Optional) Number of insertions by a process between two sweeps
+                        (default: 1% of ``max_entries``). The cache can exceed ``max_entries``
+                        by this many entries between two sweeps.
+        timeout:        Seconds to wait for another process to release the database.
+    """
+
+    # lookups and insertions hit the database, they can wait up to 'timeout' seconds
+    blocking: bool = True
+
+    def __init__(self, path: str, max_entries: int = 100000, sweep_every: Optional[int] = None,
+                 timeout: float = SHARED_CACHE_TIMEOUT):
+        if max_entries <= 0:
+            raise ValueError("Argument 'max_entries' must be a positive integer")
+        if sweep_every is not None and sweep_every <= 0:
+            raise ValueError("Argument 'sweep_every' must be a positive integer")
+        if timeout < 0:
+            raise ValueError("Argument 'timeout' must be a non-negative number")
+        self._path: str = os.path.abspath(path)
+        self._max_entries: int = max_entries
+        self._sweep_every: int = sweep_every if sweep_every is not None else max(1, max_entries // 100)
+        self._timeout: float = timeout
+        self._lock: threading.Lock = threading.Lock()
+        self._stats: CacheStats = CacheStats()
+        self._puts: int = 0
+        # connections cannot cross a fork nor be shared among threads, each (process, thread) owns one
+        self._local: threading.local = threading.local()
+        # fail early on unusable or untrusted paths
+        os.close(_open_private(self._path, os.O_RDWR | os.O_CREAT))
+        for suffix in ["-wal", "-shm"]:
+            if os.path.exists(self._path + suffix):
+                _check_private(self._path + suffix, os.stat(self._path + suffix))
+        self._secret: bytes = _load_secret(self._path + ".key")
+        self._connection()
+
+    def _connection(self) -> Any:
+        pid: int = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != pid:
+            import sqlite3
+            if conn is not None:
+                _inherited_connections.append(conn)
+            conn = sqlite3.connect(self._path, timeout=self._timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # a crash can lose the last transactions, never corrupt the cache
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS tokens ("
+                         "key BLOB PRIMARY KEY, version TEXT NOT NULL, payload BLOB NOT NULL, "
+                         "signature BLOB NOT NULL, exp INTEGER, deadline INTEGER NOT NULL, mac BLOB NOT NULL"
+                         ") WITHOUT ROWID")
+            conn.execute("CREATE INDEX IF NOT EXISTS tokens_deadline ON tokens (deadline)")
+            self._local.conn = conn
+            self._local.pid = pid
+        return conn
+
+    def get(self, s: str, vk: Optional['VerifyingKey'] = None) -> Optional[DuckietownToken]:
+        """
+        Returns the verified token for the given token string and verifying key, if cached.
+
+        :param s:   The Duckietown Token string.
+        :param vk:  The verifying key the token was verified with, `None` for the default key.
+        :return:    A new instance of the cached token, `None` on a cache miss.
+        """
+        token: Optional[DuckietownToken] = self._get(s, vk)
+        with self._lock:
+            if token is None:
+                self._stats.misses += 1
+            else:
+                self._stats.hits += 1
+        return token
+
+    def _get(self, s: str, vk: Optional['VerifyingKey']) -> Optional[DuckietownToken]:
+        import sqlite3
+        key: bytes = _digest(s, vk)
+        try:
+            row = self._connection().execute(
+                "SELECT version, payload, signature, exp, mac FROM tokens WHERE key = ? AND deadline > ?",
+                (key, int(time.time()))
+            ).fetchone()
+        except sqlite3.Error:
+            # a busy or broken cache is a cache miss
+            return None
+        if row is None:
+            return None
+        version, raw, signature, exp, mac = row
+        raw, signature = bytes(raw), bytes(signature)
+        # so is a tampered or corrupted entry
+        try:
+            if not hmac.compare_digest(_mac(self._secret, key, version, raw, signature, exp), mac):
+                return None
+            payload = _decode_payload(version, raw)
+            if "scope" in payload:
+                payload["scope"] = _parse_scopes(version, payload["scope"])
+        except (ValueError, TypeError, AttributeError):
+            return None
+        return DuckietownToken._build(version, payload, signature, exp, raw, s)
+
+    def put(self, s: str, vk: Optional['VerifyingKey'], token: DuckietownToken):
+        """
+        Adds a verified token to the cache. Tokens that are already expired are not cached.
+
+        :param s:       The Duckietown Token string.
+        :param vk:      The verifying key the token was verified with, `None` for the default key.
+        :param token:   The verified token.
+        """
+        import sqlite3
+        exp: Optional[int] = token.expiration_timestamp
+        if exp is not None and exp <= time.time():
+            return
+        raw: bytes = token._payload_bytes()
+        # tokens that do not expire are evicted last
+        deadline: int = exp if exp is not None else 2 ** 62
+        key: bytes = _digest(s, vk)
+        mac: bytes = _mac(self._secret, key, token.version, raw, token.signature, exp)
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO tokens (key, version, payload, signature, exp, deadline, mac) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, token.version, raw, token.signature, exp, deadline, mac)
+            )
+        except sqlite3.Error:
+            return
+        with self._lock:
+            self._puts += 1
+            sweep: bool = self._puts % self._sweep_every == 0
+        if sweep:
+            self.sweep()
+
+    def sweep(self):
+        """
+        Removes the expired entries, then evicts the entries closest to their expiration until
+        the cache holds at most ``max_entries`` tokens.
+        """
+        import sqlite3
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                expired: int = conn.execute("DELETE FROM tokens WHERE deadline <= ?",
+                                            (int(time.time()),)).rowcount
+                excess: int = conn.execute("SELECT COUNT(*) FROM tokens").fetchone()[0] - self._max_entries
+                if excess > 0:
+                    conn.execute("DELETE FROM tokens WHERE key IN "
+                                 "(SELECT key FROM tokens ORDER BY deadline LIMIT ?)", (excess,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            # another process is sweeping
+            return
+        with self._lock:
+            self._stats.expirations += expired
+            self._stats.evictions += max(0, excess)
+
+    def clear(self):
+        """
+        Removes all the entries from the cache, for all the processes. Statistics are preserved.
+        """
+        self._connection().execute("DELETE FROM tokens")
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM tokens").fetchone()[0]
+
+    @property
+    def stats(self) -> CacheStats:
+        """
+        Hit, miss, eviction and expiration counters of this process, entries and size of the
+        shared database.
+        """
+        conn = self._connection()
+        with self._lock:
+            stats: CacheStats = dataclasses.replace(self._stats)
+        stats.entries = len(self)
+        page_count: int = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size: int = conn.execute("PRAGMA page_size").fetchone()[0]
+        stats.bytes = page_count * page_size
+        return stats
+
+    def __getstate__(self):
+        return self._path, self._max_entries, self._sweep_every, self._timeout
+
+    def __setstate__(self, state):
+        self.__init__(state[0], max_entries=state[1], sweep_every=state[2], timeout=state[3])
+
+
+# any of the caches accepted by :py:meth:`dt_authentication.DuckietownToken.from_string`
+TokenCache = Union[VerifiedTokenCache, SharedVerifiedTokenCache]
@@ -0,0 +1,192 @@
+import struct
+from typing import Any, List, Tuple, Union
+
+__all__ = [
+    "dumps",
+    "loads",
+]
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+# major types
+_UINT: int = 0
+_NEGINT: int = 1
+_BYTES: int = 2
+_TEXT: int = 3
+_ARRAY: int = 4
+_MAP: int = 5
+_SIMPLE: int = 7
+
+_FALSE: bytes = b"\xf4"
+_TRUE: bytes = b"\xf5"
+_NULL: bytes = b"\xf6"
+_FLOAT64: int = 0xfb
+
+# deepest nesting of arrays and maps accepted by the decoder
+MAX_DEPTH: int = 32
+
+_pack_float = struct.Struct(">d").pack
+_unpack_float = struct.Struct(">d").unpack_from
+
+
+def _head(major: int, n: int) -> bytes:
+    # initial byte and argument, always in the shortest form
+    if n < 24:
+        return bytes((major << 5 | n,))
+    if n < 0x100:
+        return bytes((major << 5 | 24, n))
+    if n < 0x10000:
+        return bytes((major << 5 | 25,)) + n.to_bytes(2, "big")
+    if n < 0x100000000:
+        return bytes((major << 5 | 26,)) + n.to_bytes(4, "big")
+    if n < 0x10000000000000000:
+        return bytes((major << 5 | 27,)) + n.to_bytes(8, "big")
+    raise ValueError(f"Integer {n} does not fit in 64 bits")
+
+
+def _encode(obj: Any, out: List[bytes]):
+    # bool is a subclass of int, it must be checked first
+    if obj is None:
+        out.append(_NULL)
+    elif obj is True:
+        out.append(_TRUE)
+    elif obj is False:
+        out.append(_FALSE)
+    elif isinstance(obj, int):
+        out.append(_head(_UINT, obj) if obj >= 0 else _head(_NEGINT, -1 - obj))
+    elif isinstance(obj, str):
+        encoded: bytes = obj.encode("utf-8")
+        out.append(_head(_TEXT, len(encoded)))
+        out.append(encoded)
+    elif isinstance(obj, float):
+        out.append(bytes((_FLOAT64,)) + _pack_float(obj))
+    elif isinstance(obj, (list, tuple)):
+        out.append(_head(_ARRAY, len(obj)))
+        for item in obj:
+            _encode(item, out)
+    elif isinstance(obj, dict):
+        out.append(_head(_MAP, len(obj)))
+        # keys are sorted so that equal maps have equal encodings
+        try:
+            items = sorted(obj.items())
+        except TypeError:
+            raise ValueError("Map keys must be all strings or all integers")
+        for key, value in items:
+            if not isinstance(key, (str, int)) or isinstance(key, bool):
+                raise ValueError(f"Map keys of type '{type(key).__name__}' are not supported")
+            _encode(key, out)
+            _encode(value, out)
+    else:
+        raise ValueError(f"Values of type '{type(obj).__name__}' are not supported")
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Encodes a value as CBOR (RFC 8949).
+
+    Only the subset needed by token payloads, i.e., the JSON data model, is supported: `None`,
+    booleans, integers fitting in 64 bits, floats, strings, lists, tuples and dictionaries with
+    string or integer keys.
+    Integers and lengths always use their shortest form and map keys are sorted, so the same value
+    always has the same encoding.
+
+    :raises ValueError: if the value contains unsupported types.
+    """
+    out: List[bytes] = []
+    _encode(obj, out)
+    return b"".join(out)
+
+
+def _decode(data: bytes, pos: int, depth: int) -> Tuple[Any, int]:
+    # reading past the end of the data raises IndexError, turned into ValueError by the caller
+    initial: int = data[pos]
+    pos += 1
+    major: int = initial >> 5
+    if major == _SIMPLE:
+        if initial == 0xf6:
+            return None, pos
+        if initial == 0xf5:
+            return True, pos
+        if initial == 0xf4:
+            return False, pos
+        if initial == _FLOAT64:
+            if pos + 8 > len(data):
+                raise IndexError
+            return _unpack_float(data, pos)[0], pos + 8
+        raise ValueError(f"Unsupported simple value 0x{initial:02x} at offset {pos - 1}")
+    # argument
+    n: int = initial & 0x1f
+    if n >= 24:
+        if n == 24:
+            n = data[pos]
+            pos += 1
+        elif n <= 27:
+            size: int = 1 << (n - 24)
+            if pos + size > len(data):
+                raise IndexError
+            n = int.from_bytes(data[pos:pos + size], "big")
+            pos += size
+        else:
+            raise ValueError(f"Unsupported additional information {n} at offset {pos - 1}")
+    if major == _UINT:
+        return n, pos
+    if major == _TEXT:
+        end: int = pos + n
+        if end > len(data):
+            raise IndexError
+        return data[pos:end].decode("utf-8"), end
+    if major == _NEGINT:
+        return -1 - n, pos
+    if major == _BYTES:
+        raise ValueError(f"Unsupported byte string at offset {pos}")
+    if depth >= MAX_DEPTH:
+        raise ValueError(f"Values nested deeper than {MAX_DEPTH} levels are not supported")
+    # every item takes at least one byte, longer containers cannot be complete
+    if n > len(data) - pos:
+        raise IndexError
+    depth += 1
+    if major == _ARRAY:
+        items: List[Any] = [None] * n
+        for i in range(n):
+            # small integers and short strings are decoded inline, they make up most arrays
+            initial = data[pos]
+            if initial < 24:
+                items[i] = initial
+                pos += 1
+            elif 0x60 <= initial < 0x78:
+                end = pos + 1 + (initial - 0x60)
+                if end > len(data):
+                    raise IndexError
+                items[i] = data[pos + 1:end].decode("utf-8")
+                pos = end
+            else:
+                items[i], pos = _decode(data, pos, depth)
+        return items, pos
+    if major == _MAP:
+        mapping: dict = {}
+        for _ in range(n):
+            key, pos = _decode(data, pos, depth)
+            if not isinstance(key, (str, int)) or isinstance(key, bool):
+                raise ValueError(f"Map keys of type '{type(key).__name__}' are not supported")
+            mapping[key], pos = _decode(data, pos, depth)
+        return mapping, pos
+    raise ValueError(f"Unsupported tag at offset {pos}")
+
+
+def loads(data: BytesLike) -> Any:
+    """
+    Decodes a CBOR value encoded by :py:func:`dt_authentication.cbor.dumps`.
+
+    Byte strings, indefinite-length items, tags and simple values other than `None`, `True`,
+    `False` and 64-bit floats are rejected.
+
+    :raises ValueError: if the data is malformed, uses unsupported features or has trailing bytes.
+    """
+    data = bytes(data)
+    try:
+        value, pos = _decode(data, 0, 0)
+    except IndexError:
+        raise ValueError("Unexpected end of data")
+    if pos != len(data):
+        raise ValueError(f"Unexpected trailing data at offset {pos}")
+    return value
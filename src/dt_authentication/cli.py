@@ -1,44 +1,79 @@
 import argparse
+import csv
 import datetime
+import itertools
+import json
 import logging
+import os
 import sys
 import tempfile
-from typing import Optional
+from typing import Optional, List, Iterable, Iterator, Tuple, Dict, Any, TextIO, TYPE_CHECKING
 
-# noinspection PyProtectedMember
-from ecdsa import SigningKey, VerifyingKey
-from future import builtins
-
-from dt_authentication import DuckietownToken, InvalidToken
+from dt_authentication import DuckietownToken, InvalidToken, TokenSpec
+from dt_authentication.token import DEFAULT_VERSION, SUPPORTED_VERSIONS
+from dt_authentication.keys import load_signing_key, load_verifying_key
 from dt_authentication.utils import get_or_create_key_pair
 
-logging.basicConfig()
+if TYPE_CHECKING:
+    # noinspection PyProtectedMember
+    from ecdsa import SigningKey, VerifyingKey
+
 logger = logging.getLogger("duckietown-tokens ")
 logger.setLevel(logging.INFO)
 
 __all__ = ["cli_verify", "cli_generate"]
 
 
+def _setup_logging():
+    # logging is configured by the entry points, importing this module has no side effects
+    logging.basicConfig()
+
+
 def cli_verify(args=None):
+    _setup_logging()
     parser = argparse.ArgumentParser()
     parser.add_argument("--vk", type=str, default=None, help="Path to the public key to use")
-    parser.add_argument("token", type=str, nargs="?", default=None, help="The token to verify")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes to use to verify multiple tokens")
+    parser.add_argument("--chunk-size", type=int, default=256,
+                        help="Number of tokens sent to a worker process at a time")
+    parser.add_argument("--input", type=str, default=None,
+                        help="Batch mode: file with one token per line to verify ('-' for stdin)")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Batch mode: file to write the JSON lines to (default: stdout)")
+    parser.add_argument("token", type=str, nargs="*", default=None, help="The token(s) to verify")
     args = parser.parse_args(args=args)
 
     try:
+        # optional verifying key from file
+        vk: Optional['VerifyingKey'] = None
+        if args.vk:
+            vk = load_verifying_key(args.vk)
+
+        # batch mode
+        if args.input is not None:
+            if args.token:
+                raise ValueError("Tokens cannot be given as arguments in batch mode")
+            fin: TextIO = sys.stdin if args.input == "-" else open(args.input, "rt")
+            fout: TextIO = sys.stdout if args.output in [None, "-"] else open(args.output, "wt")
+            try:
+                valid, invalid = _verify_batch(fin, fout, vk, args.workers, args.chunk_size)
+            finally:
+                for f in [fin, fout]:
+                    if f not in [sys.stdin, sys.stdout]:
+                        f.close()
+            sys.stderr.write(f"Verified {valid + invalid} tokens: {valid} valid, {invalid} invalid\n")
+            sys.exit(1 if invalid else 0)
+
+        # multiple tokens are verified in parallel
+        if len(args.token) > 1 or (args.token and args.workers is not None):
+            _verify_parallel(args.token, vk, args.workers, args.chunk_size)
+
         if args.token:
-            token_s = args.token
+            token_s = args.token[0]
         else:
             msg = "Please enter token:\n> "
-            token_s = builtins.input(msg)
-
-        # optional verifying key from file
-        vk: Optional[VerifyingKey] = None
-        if args.vk:
-            with open(args.vk, "rt") as fin:
-                vks = fin.read()
-                vks = "\n".join([line for line in vks.split("\n") if not line.startswith("#")])
-                vk = VerifyingKey.from_pem(vks)
+            token_s = input(msg)
 
         try:
             token = DuckietownToken.from_string(token_s, vk=vk)
@@ -54,7 +89,69 @@ def cli_verify(args=None):
         sys.exit(3)
 
 
+def _verify_parallel(tokens: List[str], vk: Optional['VerifyingKey'], workers: Optional[int],
+                     chunk_size: int):
+    # multiprocessing is needed only here
+    from dt_authentication.parallel import TokenProcessPool
+    invalid: int = 0
+    with TokenProcessPool(workers=workers, chunk_size=chunk_size, vk=vk) as pool:
+        for token_s, result in zip(tokens, pool.verify_many(tokens)):
+            if isinstance(result, DuckietownToken):
+                _print_token_info(result)
+            else:
+                invalid += 1
+                logger.error(f"Invalid token '{token_s}': {result.args[0]}")
+    sys.exit(1 if invalid else 0)
+
+
+def _verify_batch(fin: TextIO, fout: TextIO, vk: Optional['VerifyingKey'], workers: Optional[int],
+                  chunk_size: int) -> Tuple[int, int]:
+    # tokens are read, verified and written as a stream, only a few chunks are in memory at a time
+    lines: Iterator[Tuple[int, str]] = ((i, line.strip()) for i, line in enumerate(fin, start=1))
+    lines = ((i, line) for i, line in lines if line)
+    numbers, copies = itertools.tee(lines)
+    tokens: Iterable[str] = (s for _, s in copies)
+    pool = None
+    if workers is not None:
+        # multiprocessing is needed only here
+        from dt_authentication.parallel import TokenProcessPool
+        pool = TokenProcessPool(workers=workers, chunk_size=chunk_size, vk=vk)
+    valid: int = 0
+    invalid: int = 0
+    try:
+        results = pool.verify_many(tokens) if pool is not None else \
+            DuckietownToken.verify_many(tokens, vk=vk, chunk_size=chunk_size)
+        for (lineno, _), result in zip(numbers, results):
+            record: Dict[str, Any] = {"line": lineno}
+            if isinstance(result, DuckietownToken):
+                valid += 1
+                record.update(_token_record(result))
+                record.update({"valid": True, "error": None})
+            else:
+                invalid += 1
+                error: str = result.args[0] if result.args else type(result).__name__
+                record.update({"uid": None, "version": None, "exp": None, "expired": None, "scopes": None,
+                               "valid": False, "error": error})
+            fout.write(json.dumps(record) + "\n")
+    finally:
+        if pool is not None:
+            pool.close()
+    return valid, invalid
+
+
+def _token_record(token: DuckietownToken) -> Dict[str, Any]:
+    exp: Optional[datetime.datetime] = token.expiration
+    return {
+        "uid": token.uid,
+        "version": token.version,
+        "exp": exp.isoformat() if exp is not None else None,
+        "expired": token.expired,
+        "scopes": [s.compact() for s in token.scope],
+    }
+
+
 def cli_generate(args=None):
+    _setup_logging()
     parser = argparse.ArgumentParser()
     parser.add_argument("--uid", type=int, help="ID to sign")
     parser.add_argument("--key", type=str, help="Path to signing key")
@@ -64,24 +161,56 @@ def cli_generate(args=None):
     parser.add_argument("--renewable", action="store_true", default=False, help="Make a renewable token")
     parser.add_argument("--scope", type=str, default=None, help="Scope as compact comma-separated list")
     parser.add_argument("--version", type=str, default=None, help="Version of the token to generate")
+    parser.add_argument("--spec", type=str, default=None,
+                        help="Bulk mode: CSV or JSONL file of token specifications ('-' for stdin)")
+    parser.add_argument("--format", type=str, default=None, choices=["csv", "jsonl"],
+                        help="Bulk mode: format of the specifications (default: from the file extension)")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Bulk mode: file to write the JSON lines to (default: stdout)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Bulk mode: number of worker processes to sign the tokens with")
+    parser.add_argument("--progress", action="store_true", default=False,
+                        help="Bulk mode: report progress on stderr")
     args = parser.parse_args(args=args)
 
     if args.key is None:
         msg = "Please supply --key "
         raise Exception(msg)
-    if args.uid is None:
-        msg = "Please supply --uid "
-        raise Exception(msg)
 
     # make sure the requested version is supported
-    if args.version not in [None, "dt1", "dt2"]:
+    if args.version is not None and args.version not in SUPPORTED_VERSIONS:
         msg = f"Token version '{args.version}' not recognized."
         raise Exception(msg)
 
     # load private key
-    with open(args.key, "r") as _:
-        pem = _.read()
-    sk = SigningKey.from_pem(pem)
+    sk = load_signing_key(args.key)
+
+    # bulk mode
+    if args.spec is not None:
+        fmt: Optional[str] = args.format
+        if fmt is None:
+            fmt = "csv" if os.path.splitext(args.spec)[1].lower() == ".csv" else "jsonl"
+        try:
+            fin: TextIO = sys.stdin if args.spec == "-" else open(args.spec, "rt", newline="")
+            fout: TextIO = sys.stdout if args.output in [None, "-"] else open(args.output, "wt")
+            try:
+                specs = _read_specs(fin, fmt, args.version or DEFAULT_VERSION)
+                n: int = _generate_bulk(sk, specs, fout, args.workers, args.progress)
+            finally:
+                for f in [fin, fout]:
+                    if f not in [sys.stdin, sys.stdout]:
+                        f.close()
+        except Exception as e:
+            # same exit code as the verification tool
+            logger.error(str(e))
+            sys.exit(3)
+        if args.progress:
+            sys.stderr.write(f"Generated {n} tokens\n")
+        return
+
+    if args.uid is None:
+        msg = "Please supply --uid "
+        raise Exception(msg)
 
     # generate token
     token: DuckietownToken = DuckietownToken.generate(
@@ -92,12 +221,91 @@ def cli_generate(args=None):
         minutes=args.nminutes,
         scope=args.scope.split(",") if args.scope else None,
         renewable=args.renewable,
-        version=args.version
+        version=args.version or DEFAULT_VERSION
     )
     _print_token_info(token)
 
 
+# number of tokens between two progress reports
+PROGRESS_EVERY: int = 1000
+
+TRUE_VALUES = ["1", "true", "yes", "y"]
+
+
+def _parse_spec(row: Dict[str, Any], default_version: str) -> Tuple[str, TokenSpec]:
+    # rows come from JSON objects (typed values) or CSV records (strings, empty means missing)
+    row = {k.strip(): v for k, v in row.items() if k is not None and v not in [None, ""]}
+    if "uid" not in row:
+        raise ValueError("Field 'uid' is required")
+    scope = row.get("scope", None)
+    if isinstance(scope, str):
+        scope = json.loads(scope) if scope.lstrip().startswith("[") else \
+            [s.strip() for s in scope.split(",") if s.strip()]
+    data = row.get("data", None)
+    if isinstance(data, str):
+        data = json.loads(data)
+    renewable = row.get("renewable", False)
+    if isinstance(renewable, str):
+        renewable = renewable.strip().lower() in TRUE_VALUES
+    version: str = row.get("version", default_version)
+    if version not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Token version '{version}' not recognized.")
+    return version, TokenSpec(
+        uid=int(row["uid"]),
+        scope=scope,
+        data=data,
+        duration=int(row.get("duration", 0)),
+        renewable=bool(renewable),
+    )
+
+
+def _read_specs(fin: TextIO, fmt: str, default_version: str) -> Iterator[Tuple[str, TokenSpec]]:
+    if fmt == "csv":
+        reader = csv.DictReader(fin)
+        rows: Iterable[Tuple[int, Any]] = ((reader.line_num, row) for row in reader)
+    else:
+        # lines are decoded one at a time, errors are reported with their line number
+        rows = ((i, line) for i, line in enumerate(fin, start=1) if line.strip())
+    for lineno, row in rows:
+        try:
+            if fmt != "csv":
+                row = json.loads(row)
+                if not isinstance(row, dict):
+                    raise ValueError("Expected a JSON object")
+            yield _parse_spec(row, default_version)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid token specification on line {lineno}: {str(e)}")
+
+
+def _generate_bulk(sk: 'SigningKey', specs: Iterator[Tuple[str, TokenSpec]], fout: TextIO,
+                   workers: Optional[int], progress: bool) -> int:
+    pool = None
+    if workers is not None:
+        # multiprocessing is needed only here
+        from dt_authentication.parallel import TokenProcessPool
+        pool = TokenProcessPool(workers=workers)
+    n: int = 0
+    try:
+        # consecutive specifications of the same version are minted together
+        for version, group in itertools.groupby(specs, key=lambda vs: vs[0]):
+            group: Iterable[TokenSpec] = (spec for _, spec in group)
+            tokens = pool.generate_many(sk, group, version=version) if pool is not None else \
+                DuckietownToken.generate_many(sk, group, version=version)
+            for token in tokens:
+                record: Dict[str, Any] = _token_record(token)
+                record.update({"renewable": token.renewable, "token": token.as_string()})
+                fout.write(json.dumps(record) + "\n")
+                n += 1
+                if progress and n % PROGRESS_EVERY == 0:
+                    sys.stderr.write(f"Generated {n} tokens\n")
+    finally:
+        if pool is not None:
+            pool.close()
+    return n
+
+
 def cli_keygen(args=None):
+    _setup_logging()
     parser = argparse.ArgumentParser()
     parser.add_argument("--version", type=str, default="dt2", help="Version of the token")
     parser.add_argument("--out", type=str, default=None, help="Directory where to write the keys "
@@ -112,7 +320,7 @@ def cli_keygen(args=None):
     _print_keys(sk, vk)
 
 
-def _print_keys(sk: SigningKey, vk: VerifyingKey):
+def _print_keys(sk: 'SigningKey', vk: 'VerifyingKey'):
     print(f"""
 SigningKey:
 ===========
@@ -0,0 +1,109 @@
+import base64
+from typing import Union
+
+__all__ = [
+    "b58encode",
+    "b58decode",
+    "b64url_encode",
+    "b64url_decode",
+]
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+ALPHABET: bytes = b"123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+# big integers are converted in chunks of CHUNK base58 digits, chunks are converted digit by
+# digit using small (machine-sized) integers only
+CHUNK: int = 10
+CHUNK_BASE: int = 58 ** CHUNK
+
+# all pairs of base58 digits, indexed by their value
+_PAIRS = [bytes((ALPHABET[i // 58], ALPHABET[i % 58])) for i in range(58 * 58)]
+
+# maps characters to digit values, invalid characters map to 0xFF
+_DECODE_TABLE: bytes = bytes(ALPHABET.index(c) if c in ALPHABET else 0xFF for c in range(256))
+
+
+def _scrub(v: Union[str, BytesLike]) -> bytes:
+    if isinstance(v, str):
+        return v.encode("ascii")
+    return bytes(v)
+
+
+def b58encode(v: Union[str, BytesLike]) -> bytes:
+    """
+    Encodes the given bytes using the Bitcoin base58 alphabet.
+
+    Drop-in replacement of ``base58.b58encode`` that also accepts ``memoryview`` objects.
+    """
+    v = _scrub(v)
+    stripped: bytes = v.lstrip(b"\0")
+    n: int = int.from_bytes(stripped, "big")
+    chunks = []
+    while n:
+        n, chunk = divmod(n, CHUNK_BASE)
+        # two digits at a time, least significant first
+        for _ in range(CHUNK // 2):
+            chunk, pair = divmod(chunk, 3364)
+            chunks.append(_PAIRS[pair])
+    out: bytes = b"".join(reversed(chunks)).lstrip(b"1")
+    return b"1" * (len(v) - len(stripped)) + out
+
+
+def b58decode(v: Union[str, BytesLike]) -> bytes:
+    """
+    Decodes the given Bitcoin base58 string.
+
+    Drop-in replacement of ``base58.b58decode`` that also accepts ``memoryview`` objects.
+
+    :raises ValueError: if the string contains characters outside the base58 alphabet.
+    """
+    v = _scrub(v.rstrip() if isinstance(v, (str, bytes, bytearray)) else v)
+    stripped: bytes = v.lstrip(b"1")
+    digits: bytes = stripped.translate(_DECODE_TABLE)
+    if b"\xff" in digits:
+        raise ValueError(f"Invalid character {chr(stripped[digits.index(0xFF)])!r}")
+    n: int = 0
+    # the first chunk takes the leftover digits so that all the others are complete
+    head: int = len(digits) % CHUNK
+    chunk: int = 0
+    for d in digits[:head]:
+        chunk = chunk * 58 + d
+    n = chunk
+    for i in range(head, len(digits), CHUNK):
+        chunk = 0
+        for d in digits[i:i + CHUNK]:
+            chunk = chunk * 58 + d
+        n = n * CHUNK_BASE + chunk
+    out: bytes = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    return b"\0" * (len(v) - len(stripped)) + out
+
+
+# maps the URL-safe alphabet onto the standard one, characters of the standard alphabet that are not
+# in the URL-safe one (and padding) are mapped onto an invalid character
+_B64URL_TO_STD: bytes = bytes.maketrans(b"-_+/=", b"+/!!!")
+_B64STD_TO_URL: bytes = bytes.maketrans(b"+/", b"-_")
+
+
+def b64url_encode(v: Union[str, BytesLike]) -> bytes:
+    """
+    Encodes the given bytes using the URL-safe base64 alphabet, without padding.
+    """
+    return base64.b64encode(_scrub(v)).translate(_B64STD_TO_URL).rstrip(b"=")
+
+
+def b64url_decode(v: Union[str, BytesLike]) -> bytes:
+    """
+    Decodes the given unpadded, URL-safe base64 string.
+
+    Only the canonical encoding of a value is accepted, so no two strings decode to the same bytes.
+
+    :raises ValueError: if the string is not the canonical encoding of any value.
+    """
+    v = _scrub(v)
+    # invalid lengths and characters are rejected by the decoder
+    decoded: bytes = base64.b64decode(v.translate(_B64URL_TO_STD) + b"=" * (-len(v) % 4), validate=True)
+    # unused trailing bits must be zero
+    if b64url_encode(decoded) != v:
+        raise ValueError("Non-canonical base64 encoding")
+    return decoded
@@ -26,6 +26,10 @@ class ExpiredToken(GenericException):
         super(ExpiredToken, self).__init__(*args)
         self._expiration: datetime = expiration
 
+    def __reduce__(self):
+        # exceptions are pickled through their 'args', which do not include the expiration
+        return self.__class__, (self._expiration, *self.args)
+
     @property
     def expiration(self) -> datetime:
         return self._expiration
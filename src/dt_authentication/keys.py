@@ -0,0 +1,214 @@
+import os
+import threading
+from typing import Dict, Tuple, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # noinspection PyProtectedMember
+    from ecdsa.keys import VerifyingKey, SigningKey
+
+__all__ = [
+    "PUBLIC_KEYS",
+    "KeyRegistry",
+    "get_verifying_key",
+    "verifying_key_from_pem",
+    "signing_key_from_pem",
+    "load_verifying_key",
+    "load_signing_key",
+    "key_fingerprint",
+]
+
+PUBLIC_KEYS = {
+    # dt1 was introduced in 2017
+    "dt1": """-----BEGIN PUBLIC KEY-----
+MEkwEwYHKoZIzj0CAQYIKoZIzj0DAQEDMgAEQr/8RJmJZT+Bh1YMb1aqc2ao5teE
+ixOeCMGTO79Dbvw5dGmHJLYyNPwnKkWayyJS
+-----END PUBLIC KEY-----""",
+    # dt2 was introduced in May 2023
+    "dt2": """-----BEGIN PUBLIC KEY-----
+MEkwEwYHKoZIzj0CAQYIKoZIzj0DAQEDMgAEHIqMBPGB2tzRgrMKhQSkEiKQ317q
+msEAqq1CS86oV1vjHYVq6FLvtnDsuWzbW2Nz
+-----END PUBLIC KEY-----"""
+}
+# dt3 changes the encoding of the token, not the key
+PUBLIC_KEYS["dt3"] = PUBLIC_KEYS["dt2"]
+
+# a file is reloaded when either its modification time or its size changes
+FileStamp = Tuple[int, int]
+
+# maximum number of verifying keys whose fingerprint is remembered
+MAX_FINGERPRINTS: int = 256
+
+
+def _strip_comments(pem: str) -> str:
+    return "\n".join([line for line in pem.split("\n") if not line.startswith("#")])
+
+
+def _precomputed(vk: 'VerifyingKey') -> 'VerifyingKey':
+    # keys decoded from PEM carry a public point without the curve order, which ecdsa needs in
+    # order to build the precomputation table, so we rebuild the key around a complete point
+    # noinspection PyProtectedMember
+    from ecdsa.ellipticcurve import PointJacobi
+    from ecdsa.keys import VerifyingKey
+    point = vk.pubkey.point
+    point = PointJacobi(point.curve(), point.x(), point.y(), 1, vk.curve.order)
+    vk = VerifyingKey.from_public_point(point, curve=vk.curve, hashfunc=vk.default_hashfunc)
+    vk.precompute()
+    return vk
+
+
+class KeyRegistry(object):
+    """
+    A registry of parsed signing and verifying keys.
+
+    Each key is parsed only once, verifying keys have their point multiplication tables
+    precomputed, and keys backed by a file are reloaded only when the file changes on disk.
+    """
+
+    def __init__(self):
+        self._lock: threading.Lock = threading.Lock()
+        self._verifying_keys: Dict[str, 'VerifyingKey'] = {}
+        self._signing_keys: Dict[str, 'SigningKey'] = {}
+        self._files: Dict[Tuple[str, str], Tuple[FileStamp, Union['SigningKey', 'VerifyingKey']]] = {}
+
+    def verifying_key(self, version: str) -> 'VerifyingKey':
+        """
+        Returns the default verifying key for the given token version.
+
+        :param version:     The token version.
+        :return:            The parsed verifying key.
+        """
+        return self.verifying_key_from_pem(PUBLIC_KEYS[version])
+
+    def verifying_key_from_pem(self, pem: Union[str, bytes]) -> 'VerifyingKey':
+        """
+        Returns the verifying key encoded in the given PEM string.
+
+        :param pem:     The PEM-encoded verifying key.
+        :return:        The parsed verifying key.
+        """
+        pem = pem.decode("utf-8") if isinstance(pem, bytes) else pem
+        vk = self._verifying_keys.get(pem, None)
+        if vk is None:
+            # keys are parsed on first use, 'ecdsa' is not imported until then
+            # noinspection PyProtectedMember
+            from ecdsa.keys import VerifyingKey
+            vk = _precomputed(VerifyingKey.from_pem(_strip_comments(pem)))
+            with self._lock:
+                vk = self._verifying_keys.setdefault(pem, vk)
+        return vk
+
+    def signing_key_from_pem(self, pem: Union[str, bytes]) -> 'SigningKey':
+        """
+        Returns the signing key encoded in the given PEM string.
+
+        :param pem:     The PEM-encoded signing key.
+        :return:        The parsed signing key.
+        """
+        pem = pem.decode("utf-8") if isinstance(pem, bytes) else pem
+        sk = self._signing_keys.get(pem, None)
+        if sk is None:
+            # noinspection PyProtectedMember
+            from ecdsa.keys import SigningKey
+            sk = SigningKey.from_pem(_strip_comments(pem))
+            with self._lock:
+                sk = self._signing_keys.setdefault(pem, sk)
+        return sk
+
+    def load_verifying_key(self, path: str) -> 'VerifyingKey':
+        """
+        Returns the verifying key stored in the given PEM file.
+
+        :param path:    Path to the PEM file.
+        :return:        The parsed verifying key.
+        """
+        return self._load("vk", path)
+
+    def load_signing_key(self, path: str) -> 'SigningKey':
+        """
+        Returns the signing key stored in the given PEM file.
+
+        :param path:    Path to the PEM file.
+        :return:        The parsed signing key.
+        """
+        return self._load("sk", path)
+
+    def clear(self):
+        """
+        Forgets all the keys parsed so far.
+        """
+        with self._lock:
+            self._verifying_keys.clear()
+            self._signing_keys.clear()
+            self._files.clear()
+
+    def _load(self, kind: str, path: str) -> Union['SigningKey', 'VerifyingKey']:
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stamp: FileStamp = (st.st_mtime_ns, st.st_size)
+        cached = self._files.get((kind, path), None)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        # (re)load the key from disk
+        with open(path, "rt") as fin:
+            pem: str = fin.read()
+        key = self.verifying_key_from_pem(pem) if kind == "vk" else self.signing_key_from_pem(pem)
+        with self._lock:
+            self._files[(kind, path)] = (stamp, key)
+        return key
+
+
+_registry: KeyRegistry = KeyRegistry()
+
+
+def get_verifying_key(version: str) -> 'VerifyingKey':
+    """
+    Returns the default verifying key for the given token version from the shared registry.
+    """
+    return _registry.verifying_key(version)
+
+
+def verifying_key_from_pem(pem: Union[str, bytes]) -> 'VerifyingKey':
+    """
+    Returns the verifying key encoded in the given PEM string from the shared registry.
+    """
+    return _registry.verifying_key_from_pem(pem)
+
+
+def signing_key_from_pem(pem: Union[str, bytes]) -> 'SigningKey':
+    """
+    Returns the signing key encoded in the given PEM string from the shared registry.
+    """
+    return _registry.signing_key_from_pem(pem)
+
+
+def load_verifying_key(path: str) -> 'VerifyingKey':
+    """
+    Returns the verifying key stored in the given PEM file from the shared registry.
+    """
+    return _registry.load_verifying_key(path)
+
+
+def load_signing_key(path: str) -> 'SigningKey':
+    """
+    Returns the signing key stored in the given PEM file from the shared registry.
+    """
+    return _registry.load_signing_key(path)
+
+
+# id(key) -> (key, fingerprint), keys are held so that their ids are not reused while in here
+_fingerprints: Dict[int, Tuple['VerifyingKey', bytes]] = {}
+
+
+def key_fingerprint(vk: 'VerifyingKey') -> bytes:
+    """
+    Returns the raw encoding of the given verifying key. Encoding a key is expensive compared to
+    a cache lookup, so the encoding of the most recently used keys is remembered.
+    """
+    entry = _fingerprints.get(id(vk), None)
+    if entry is not None and entry[0] is vk:
+        return entry[1]
+    encoded: bytes = vk.to_string()
+    if len(_fingerprints) >= MAX_FINGERPRINTS:
+        _fingerprints.clear()
+    _fingerprints[id(vk)] = (vk, encoded)
+    return encoded
@@ -0,0 +1,218 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Tuple, Callable, TYPE_CHECKING
+
+from .exceptions import NotARenewableToken
+from .token import DuckietownToken
+
+if TYPE_CHECKING:
+    # noinspection PyProtectedMember
+    from ecdsa.keys import SigningKey
+    from .renew import RenewClient
+
+__all__ = [
+    "ManagedToken",
+    "RenewalManager",
+]
+
+logger = logging.getLogger(__name__)
+
+Subscriber = Callable[["ManagedToken", DuckietownToken], None]
+
+
+class ManagedToken(object):
+    """
+    Handle to a token tracked by a :py:class:`dt_authentication.manager.RenewalManager`.
+
+    The handle always points to the most recent version of the token, reading it never blocks.
+    """
+
+    def __init__(self, token: DuckietownToken):
+        self._token: DuckietownToken = token
+        self._renewals: int = 0
+        self._error: Optional[BaseException] = None
+        self._tracked: bool = True
+
+    @property
+    def token(self) -> DuckietownToken:
+        """
+        The most recent version of the token.
+        """
+        return self._token
+
+    @property
+    def renewals(self) -> int:
+        """
+        Number of times the token was renewed.
+        """
+        return self._renewals
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        """
+        The error raised by the last renewal attempt, `None` if it succeeded.
+        """
+        return self._error
+
+
+class RenewalManager(object):
+    """
+    Renews a collection of renewable tokens in the background, ahead of their expiration.
+
+    Tokens are kept in a heap ordered by renewal time. A background thread collects all the
+    tokens due within ``batch_window`` seconds and renews them on a pool of at most
+    ``max_concurrency`` threads, subscribers are notified of every new token.
+
+    Args:
+        margin:             Seconds before expiration a token is renewed.
+        key:                (Optional) Signing key used to renew tokens locally.
+        client:             (Optional) Client of the renewal service, used when no key is given.
+        max_concurrency:    Maximum number of renewals running at the same time.
+        batch_window:       Tokens due within this many seconds are renewed together.
+        retry_delay:        Seconds to wait before retrying a failed renewal.
+    """
+
+    def __init__(self, margin: float = 300, key: Optional['SigningKey'] = None,
+                 client: Optional['RenewClient'] = None, max_concurrency: int = 4,
+                 batch_window: float = 1.0, retry_delay: float = 30.0):
+        if max_concurrency <= 0:
+            raise ValueError("Argument 'max_concurrency' must be a positive integer")
+        self._margin: float = margin
+        self._key: Optional['SigningKey'] = key
+        self._client: Optional['RenewClient'] = client
+        self._max_concurrency: int = max_concurrency
+        self._batch_window: float = batch_window
+        self._retry_delay: float = retry_delay
+        self._heap: List[Tuple[float, int, ManagedToken]] = []
+        self._counter = itertools.count()
+        self._subscribers: List[Subscriber] = []
+        self._cond: threading.Condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._running: bool = False
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len([e for e in self._heap if e[2]._tracked])
+
+    def track(self, token: DuckietownToken) -> ManagedToken:
+        """
+        Starts tracking a renewable token.
+
+        :param token:   The token to keep renewed.
+        :return:        A handle pointing to the most recent version of the token.
+        """
+        if not token.renewable:
+            raise NotARenewableToken()
+        handle: ManagedToken = ManagedToken(token)
+        self._schedule(handle, self._due(token))
+        return handle
+
+    def untrack(self, handle: ManagedToken):
+        """
+        Stops renewing the token behind the given handle.
+        """
+        with self._cond:
+            handle._tracked = False
+
+    def subscribe(self, callback: Subscriber):
+        """
+        Registers a function called with the handle and the new token after every renewal.
+        """
+        with self._cond:
+            self._subscribers.append(callback)
+
+    def start(self) -> 'RenewalManager':
+        """
+        Starts the background renewal thread.
+        """
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+            self._executor = ThreadPoolExecutor(max_workers=self._max_concurrency)
+            self._thread = threading.Thread(target=self._loop, name="dt-token-renewal", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the background renewal thread and waits for the renewals in progress.
+        """
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> 'RenewalManager':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _due(self, token: DuckietownToken) -> Optional[float]:
+        exp: Optional[int] = token.expiration_timestamp
+        return (exp - self._margin) if exp is not None else None
+
+    def _schedule(self, handle: ManagedToken, due: Optional[float]):
+        if due is None:
+            # tokens that never expire do not need renewals
+            return
+        with self._cond:
+            if not handle._tracked:
+                return
+            heapq.heappush(self._heap, (due, next(self._counter), handle))
+            self._cond.notify_all()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                # wait for the earliest token to be due
+                while self._running:
+                    now: float = time.time()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    timeout: Optional[float] = (self._heap[0][0] - now) if self._heap else None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+                # collect all the tokens due within the batch window
+                horizon: float = time.time() + self._batch_window
+                batch: List[ManagedToken] = []
+                while self._heap and self._heap[0][0] <= horizon:
+                    _, _, handle = heapq.heappop(self._heap)
+                    if handle._tracked:
+                        batch.append(handle)
+            for handle in batch:
+                self._executor.submit(self._renew, handle)
+
+    def _renew(self, handle: ManagedToken):
+        try:
+            new: DuckietownToken = handle._token.renew(key=self._key, client=self._client)
+        except BaseException as e:
+            logger.warning(f"Token renewal failed: {str(e)}")
+            handle._error = e
+            self._schedule(handle, time.time() + self._retry_delay)
+            return
+        handle._token = new
+        handle._renewals += 1
+        handle._error = None
+        with self._cond:
+            subscribers: List[Subscriber] = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(handle, new)
+            except Exception as e:
+                logger.error(f"Token renewal subscriber failed: {str(e)}")
+        due: Optional[float] = self._due(new)
+        if due is not None:
+            # a margin larger than the token duration must not turn into a busy loop
+            due = max(due, time.time() + self._retry_delay)
+        self._schedule(handle, due)
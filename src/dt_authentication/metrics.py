@@ -0,0 +1,272 @@
+import os
+import threading
+import time
+from typing import Optional, Dict, Tuple, List, Callable, NamedTuple
+
+from .exceptions import InvalidToken, ExpiredToken, NotARenewableToken
+
+__all__ = [
+    "Event",
+    "MetricsRegistry",
+    "enable",
+    "disable",
+    "is_enabled",
+    "get_registry",
+    "add_listener",
+    "remove_listener",
+    "export_prometheus",
+]
+
+# upper bounds of the operation duration histogram buckets, in seconds
+DURATION_BUCKETS: Tuple[float, ...] = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0
+)
+
+# version label of operations failing before the token version is known
+UNKNOWN_VERSION: str = "unknown"
+
+# exception -> outcome label
+OUTCOMES: List[Tuple[type, str]] = [
+    (ExpiredToken, "expired"),
+    (InvalidToken, "invalid"),
+    (NotARenewableToken, "not_renewable"),
+]
+
+# instrumented code checks this flag before doing any work, keep it a plain module attribute
+enabled: bool = os.environ.get("DT_TOKEN_METRICS", "0").lower() in ("1", "true", "yes")
+
+
+class Event(NamedTuple):
+    """
+    A single instrumented operation, as passed to the listeners.
+    """
+    operation: str
+    version: str
+    outcome: str
+    # total duration in seconds
+    duration: float
+    # stage -> duration in seconds
+    stages: Dict[str, float]
+
+
+Listener = Callable[[Event], None]
+
+
+class MetricsRegistry(object):
+    """
+    In-process, thread-safe store of the counters and timers of instrumented operations.
+
+    Operations are counted by operation, version and outcome, their durations are collected in a
+    histogram and the time spent in each stage is accumulated by operation, version and stage.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self._lock: threading.Lock = threading.Lock()
+        self._buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        # (operation, version, outcome) -> count
+        self._counts: Dict[Tuple[str, str, str], int] = {}
+        # (operation, version) -> [bucket counts..., sum, count]
+        self._durations: Dict[Tuple[str, str], List[float]] = {}
+        # (operation, version, stage) -> [sum, count]
+        self._stages: Dict[Tuple[str, str, str], List[float]] = {}
+
+    def record(self, event: Event):
+        """
+        Adds an event to the registry.
+        """
+        with self._lock:
+            key = (event.operation, event.version, event.outcome)
+            self._counts[key] = self._counts.get(key, 0) + 1
+            histogram = self._durations.get(key[:2])
+            if histogram is None:
+                histogram = self._durations[key[:2]] = [0] * (len(self._buckets) + 2)
+            for i, bound in enumerate(self._buckets):
+                if event.duration <= bound:
+                    histogram[i] += 1
+            histogram[-2] += event.duration
+            histogram[-1] += 1
+            for stage, duration in event.stages.items():
+                skey = (event.operation, event.version, stage)
+                timer = self._stages.get(skey)
+                if timer is None:
+                    timer = self._stages[skey] = [0.0, 0]
+                timer[0] += duration
+                timer[1] += 1
+
+    def count(self, operation: str, version: Optional[str] = None, outcome: Optional[str] = None) -> int:
+        """
+        Number of recorded operations, optionally restricted to a version and/or an outcome.
+        """
+        with self._lock:
+            return sum(
+                n for (o, v, r), n in self._counts.items()
+                if o == operation and version in (None, v) and outcome in (None, r)
+            )
+
+    def stage_time(self, operation: str, stage: str, version: Optional[str] = None) -> float:
+        """
+        Total time in seconds spent in the given stage of an operation.
+        """
+        with self._lock:
+            return sum(
+                t[0] for (o, v, s), t in self._stages.items()
+                if o == operation and s == stage and version in (None, v)
+            )
+
+    def clear(self):
+        """
+        Resets all the counters and timers.
+        """
+        with self._lock:
+            self._counts.clear()
+            self._durations.clear()
+            self._stages.clear()
+
+    def export_prometheus(self, prefix: str = "dt_token") -> str:
+        """
+        Renders the content of the registry in the Prometheus text exposition format.
+        """
+        lines: List[str] = []
+        with self._lock:
+            # operations
+            name = f"{prefix}_operations_total"
+            lines += [f"# HELP {name} Number of token operations.", f"# TYPE {name} counter"]
+            for (operation, version, outcome), n in sorted(self._counts.items()):
+                labels = _labels(operation=operation, version=version, outcome=outcome)
+                lines.append(f"{name}{{{labels}}} {n}")
+            # durations
+            name = f"{prefix}_operation_duration_seconds"
+            lines += [f"# HELP {name} Duration of token operations.", f"# TYPE {name} histogram"]
+            for (operation, version), histogram in sorted(self._durations.items()):
+                labels = _labels(operation=operation, version=version)
+                for bound, n in zip(self._buckets, histogram):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound!r}"}} {n}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram[-1]}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram[-2]!r}")
+                lines.append(f"{name}_count{{{labels}}} {histogram[-1]}")
+            # stages
+            name = f"{prefix}_stage_duration_seconds"
+            lines += [f"# HELP {name} Time spent in each stage of token operations.",
+                      f"# TYPE {name} summary"]
+            for (operation, version, stage), (total, n) in sorted(self._stages.items()):
+                labels = _labels(operation=operation, version=version, stage=stage)
+                lines.append(f"{name}_sum{{{labels}}} {total!r}")
+                lines.append(f"{name}_count{{{labels}}} {n}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels: str) -> str:
+    def escape(v: str) -> str:
+        return v.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    return ",".join(f'{k}="{escape(str(v))}"' for k, v in labels.items())
+
+
+class Trace(object):
+    """
+    Collects the stage timings of a single operation. Used as a context manager, the outcome is
+    derived from the exception raised by the operation, if any.
+    """
+
+    __slots__ = ("operation", "version", "outcome", "stages", "_start", "_last")
+
+    def __init__(self, operation: str, version: str = UNKNOWN_VERSION):
+        self.operation: str = operation
+        self.version: str = version
+        self.outcome: str = "ok"
+        self.stages: Dict[str, float] = {}
+        self._start: float = time.perf_counter()
+        self._last: float = self._start
+
+    def lap(self, stage: str):
+        """
+        Closes the current stage, the time elapsed since the previous stage is attributed to it.
+        """
+        now: float = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self._last)
+        self._last = now
+
+    def __enter__(self) -> 'Trace':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        duration: float = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.outcome = "error"
+            for cls, outcome in OUTCOMES:
+                if issubclass(exc_type, cls):
+                    self.outcome = outcome
+                    break
+        _emit(Event(self.operation, self.version, self.outcome, duration, self.stages))
+
+
+_lock: threading.Lock = threading.Lock()
+_registry: MetricsRegistry = MetricsRegistry()
+_listeners: Tuple[Listener, ...] = ()
+
+
+def _emit(event: Event):
+    _registry.record(event)
+    for listener in _listeners:
+        try:
+            listener(event)
+        except Exception as e:
+            import logging
+            logging.getLogger(__name__).error(f"Metrics listener failed: {str(e)}")
+
+
+def enable(registry: Optional[MetricsRegistry] = None):
+    """
+    Turns the instrumentation on.
+
+    :param registry:    (Optional) Registry to record the events in, replaces the current one.
+    """
+    global enabled, _registry
+    if registry is not None:
+        _registry = registry
+    enabled = True
+
+
+def disable():
+    """
+    Turns the instrumentation off. Recorded metrics are preserved.
+    """
+    global enabled
+    enabled = False
+
+
+def is_enabled() -> bool:
+    return enabled
+
+
+def get_registry() -> MetricsRegistry:
+    """
+    Returns the registry the events are recorded in.
+    """
+    return _registry
+
+
+def add_listener(listener: Listener):
+    """
+    Registers a function called with every :py:class:`dt_authentication.metrics.Event`.
+    Listeners are called synchronously, they should return quickly.
+    """
+    global _listeners
+    with _lock:
+        _listeners = _listeners + (listener,)
+
+
+def remove_listener(listener: Listener):
+    """
+    Unregisters a listener added with :py:func:`dt_authentication.metrics.add_listener`.
+    """
+    global _listeners
+    with _lock:
+        _listeners = tuple(lst for lst in _listeners if lst is not listener)
+
+
+def export_prometheus(prefix: str = "dt_token") -> str:
+    """
+    Renders the default registry in the Prometheus text exposition format.
+    """
+    return _registry.export_prometheus(prefix)
@@ -0,0 +1,257 @@
+import json
+from typing import Optional, Dict, Union, List, Tuple, Callable, Iterable, Any, TYPE_CHECKING
+
+from .cache import VerifiedTokenCache, InvalidTokenCache, TokenCache
+from .exceptions import GenericException, InvalidToken, ExpiredToken
+from .scope import Scope, ScopeQuery
+from .token import DuckietownToken
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+    # noinspection PyProtectedMember
+    from ecdsa.keys import VerifyingKey
+
+__all__ = [
+    "TOKEN_KEY",
+    "AuthenticationError",
+    "TokenAuthenticator",
+    "WSGIAuthMiddleware",
+    "ASGIAuthMiddleware",
+]
+
+# key of the verified token in the WSGI environ and in the ASGI scope
+TOKEN_KEY: str = "dt_authentication.token"
+
+RouteScope = Optional[Union[str, Dict[str, str], Scope]]
+
+
+class AuthenticationError(GenericException):
+    """
+    A request was rejected by the authentication middleware.
+    """
+
+    def __init__(self, status: int, message: str):
+        super(AuthenticationError, self).__init__(message)
+        self.status: int = status
+
+
+class TokenAuthenticator(object):
+    """
+    Authenticates and authorizes requests carrying a Duckietown Token in the ``Authorization``
+    header, e.g., ``Authorization: Token dt2-...``.
+
+    Verified tokens are cached until they expire and recently rejected tokens are remembered for a
+    short time, so a client presenting the same token over and over pays for signature verification
+    only once. Routes are matched by longest path prefix, on segment boundaries, against the scope
+    they require.
+
+    Args:
+        routes:         (Optional) Map from path prefixes to the scope they require,
+                        e.g., ``{"/data": "read:data"}`` guards ``/data`` and ``/data/...``.
+                        `None` scopes require a token only.
+        vk:             Optional verification key if different from default
+        optional:       Let requests without a token through, unless they match one of the routes.
+        scheme:         Authorization scheme expected in the header.
+        cache:          (Optional) Cache of verified tokens (default: a private cache).
+        negative_cache: (Optional) Cache of rejected tokens (default: a private cache).
+    """
+
+    def __init__(self, routes: Optional[Dict[str, RouteScope]] = None, vk: Optional['VerifyingKey'] = None,
+                 optional: bool = False, scheme: str = "Token", cache: Optional[TokenCache] = None,
+                 negative_cache: Optional[InvalidTokenCache] = None):
+        self._vk: Optional['VerifyingKey'] = vk
+        self._optional: bool = optional
+        self._prefix: str = scheme.lower() + " "
+        self._cache: TokenCache = cache if cache is not None else VerifiedTokenCache()
+        self._negative_cache: InvalidTokenCache = \
+            negative_cache if negative_cache is not None else InvalidTokenCache()
+        # longest prefixes first, each prefix also matches the paths below it, e.g. '/data' matches
+        # '/data/1' but not '/database'
+        self._routes: List[Tuple[str, str, Optional[ScopeQuery]]] = sorted(
+            [(prefix, prefix.rstrip("/") + "/", self._query(scope))
+             for prefix, scope in (routes or {}).items()],
+            key=lambda route: len(route[0]), reverse=True
+        )
+
+    @staticmethod
+    def _query(scope: RouteScope) -> Optional[ScopeQuery]:
+        if scope is None:
+            return None
+        if not isinstance(scope, Scope):
+            scope = Scope.parse(scope)
+        return scope.action, scope.resource, scope.identifier, scope.service
+
+    @property
+    def optional(self) -> bool:
+        return self._optional
+
+    def extract(self, header: Optional[str]) -> Optional[str]:
+        """
+        Extracts the token string from the value of an ``Authorization`` header.
+
+        :param header:  The value of the header, `None` if the header is missing.
+        :return:        The token string, `None` if the header does not carry a token.
+        """
+        if not header or header[:len(self._prefix)].lower() != self._prefix:
+            return None
+        return header[len(self._prefix):].strip() or None
+
+    def route(self, path: str) -> Tuple[bool, Optional[ScopeQuery]]:
+        """
+        Finds the route matching the given path.
+
+        :param path:    The path of the request.
+        :return:        Whether a route matched, and the scope it requires.
+        """
+        for prefix, parent, query in self._routes:
+            if path == prefix or path.startswith(parent):
+                return True, query
+        return False, None
+
+    def authenticate(self, header: Optional[str]) -> Optional[DuckietownToken]:
+        """
+        Verifies the token carried by the given ``Authorization`` header.
+
+        :param header:  The value of the header, `None` if the header is missing.
+        :return:        The verified token, `None` if there is no token and tokens are optional.
+        :raises AuthenticationError: if the token is missing, invalid or expired.
+        """
+        s: Optional[str] = self._missing(header)
+        if s is None:
+            return None
+        try:
+            return DuckietownToken.from_string(s, vk=self._vk, allow_expired=False, cache=self._cache,
+                                               negative_cache=self._negative_cache)
+        except (InvalidToken, ExpiredToken) as e:
+            raise AuthenticationError(401, str(e))
+
+    async def aauthenticate(self, header: Optional[str],
+                            executor: Optional['Executor'] = None) -> Optional[DuckietownToken]:
+        """
+        Asynchronous version of :py:meth:`dt_authentication.middleware.TokenAuthenticator.authenticate`.
+        In-memory caches are checked on the event loop, signatures are verified and caches that can
+        block are used in the given executor.
+        """
+        s: Optional[str] = self._missing(header)
+        if s is None:
+            return None
+        try:
+            return await DuckietownToken.afrom_string(s, vk=self._vk, allow_expired=False, cache=self._cache,
+                                                      negative_cache=self._negative_cache, executor=executor)
+        except (InvalidToken, ExpiredToken) as e:
+            raise AuthenticationError(401, str(e))
+
+    def _missing(self, header: Optional[str]) -> Optional[str]:
+        s: Optional[str] = self.extract(header)
+        if s is None and not self._optional:
+            raise AuthenticationError(401, "Authentication required")
+        return s
+
+    def authorize(self, token: Optional[DuckietownToken], path: str):
+        """
+        Checks that the given token grants the scope required by the route matching the given path.
+
+        :param token:   The verified token, `None` if the request did not carry one.
+        :param path:    The path of the request.
+        :raises AuthenticationError: if the token does not grant the required scope.
+        """
+        matched, query = self.route(path)
+        if not matched:
+            return
+        if token is None:
+            raise AuthenticationError(401, "Authentication required")
+        if query is not None and not token.grants(*query):
+            raise AuthenticationError(403, "The token does not grant the required scope")
+
+
+def _error_body(e: AuthenticationError) -> bytes:
+    return json.dumps({"success": False, "messages": [str(e)]}).encode("utf-8")
+
+
+_REASONS = {401: "Unauthorized", 403: "Forbidden"}
+
+
+class WSGIAuthMiddleware(object):
+    """
+    WSGI middleware authenticating requests with Duckietown Tokens.
+
+    The verified token is stored in the WSGI environment under the key
+    ``"dt_authentication.token"``, rejected requests are answered with a '401 Unauthorized' or a
+    '403 Forbidden' response.
+
+    Args:
+        app:            The WSGI application to protect.
+        authenticator:  (Optional) The authenticator to use, built from the other arguments if not given.
+        **kwargs:       Arguments of :py:class:`dt_authentication.middleware.TokenAuthenticator`.
+    """
+
+    def __init__(self, app: Callable, authenticator: Optional[TokenAuthenticator] = None, **kwargs):
+        self._app: Callable = app
+        self._auth: TokenAuthenticator = authenticator if authenticator is not None else \
+            TokenAuthenticator(**kwargs)
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        try:
+            token: Optional[DuckietownToken] = self._auth.authenticate(environ.get("HTTP_AUTHORIZATION"))
+            self._auth.authorize(token, environ.get("PATH_INFO", ""))
+        except AuthenticationError as e:
+            body: bytes = _error_body(e)
+            headers = [("Content-Type", "application/json"), ("Content-Length", str(len(body)))]
+            if e.status == 401:
+                headers.append(("WWW-Authenticate", "Token"))
+            start_response(f"{e.status} {_REASONS[e.status]}", headers)
+            return [body]
+        environ[TOKEN_KEY] = token
+        return self._app(environ, start_response)
+
+
+class ASGIAuthMiddleware(object):
+    """
+    ASGI middleware authenticating HTTP and WebSocket connections with Duckietown Tokens.
+
+    The verified token is stored in the connection scope under the key
+    ``"dt_authentication.token"``. Rejected HTTP requests are answered with a '401 Unauthorized'
+    or a '403 Forbidden' response, rejected WebSocket connections are closed before being accepted.
+    Signature verification never runs on the event loop.
+
+    Args:
+        app:            The ASGI application to protect.
+        authenticator:  (Optional) The authenticator to use, built from the other arguments if not given.
+        executor:       (Optional) Executor used to verify signatures (default: the loop's default executor).
+        **kwargs:       Arguments of :py:class:`dt_authentication.middleware.TokenAuthenticator`.
+    """
+
+    def __init__(self, app: Callable, authenticator: Optional[TokenAuthenticator] = None,
+                 executor: Optional['Executor'] = None, **kwargs):
+        self._app: Callable = app
+        self._auth: TokenAuthenticator = authenticator if authenticator is not None else \
+            TokenAuthenticator(**kwargs)
+        self._executor: Optional['Executor'] = executor
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] not in ("http", "websocket"):
+            await self._app(scope, receive, send)
+            return
+        header: Optional[str] = None
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                header = value.decode("latin-1")
+                break
+        try:
+            token: Optional[DuckietownToken] = await self._auth.aauthenticate(header, self._executor)
+            self._auth.authorize(token, scope.get("path", ""))
+        except AuthenticationError as e:
+            if scope["type"] == "websocket":
+                await send({"type": "websocket.close", "code": 1008})
+                return
+            body: bytes = _error_body(e)
+            headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+            if e.status == 401:
+                headers.append((b"www-authenticate", b"Token"))
+            await send({"type": "http.response.start", "status": e.status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+        # the scope is copied before being changed, as per the ASGI specification
+        scope = dict(scope)
+        scope[TOKEN_KEY] = token
+        await self._app(scope, receive, send)
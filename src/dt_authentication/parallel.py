@@ -0,0 +1,147 @@
+import collections
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Optional, Iterable, Iterator, Union, List, Deque, TYPE_CHECKING
+
+from .backends import Entropy
+from .exceptions import GenericException
+from .keys import get_verifying_key, verifying_key_from_pem, signing_key_from_pem
+from .token import DuckietownToken, SUPPORTED_VERSIONS, DEFAULT_VERSION, MAX_TOKEN_LENGTH, TokenSpec, \
+    TokenSpecLike
+
+if TYPE_CHECKING:
+    # noinspection PyProtectedMember
+    from ecdsa.keys import VerifyingKey, SigningKey
+
+__all__ = [
+    "TokenProcessPool",
+]
+
+VerificationResult = Union[DuckietownToken, GenericException]
+
+# verifying key used by the current worker process
+_worker_vk: Optional['VerifyingKey'] = None
+
+
+def _init_worker(vk_pem: Optional[bytes]):
+    global _worker_vk
+    # parse all the keys the worker might need before the first chunk arrives
+    for version in SUPPORTED_VERSIONS:
+        get_verifying_key(version)
+    _worker_vk = verifying_key_from_pem(vk_pem) if vk_pem is not None else None
+
+
+def _verify_chunk(chunk: List[str], allow_expired: bool, max_length: int) -> List[VerificationResult]:
+    return list(DuckietownToken.verify_many(chunk, vk=_worker_vk, allow_expired=allow_expired,
+                                            max_length=max_length))
+
+
+def _generate_chunk(chunk: List[TokenSpec], sk_pem: bytes, version: str,
+                    entropy: Optional[Entropy]) -> List[DuckietownToken]:
+    # signing keys are parsed once per worker
+    sk: 'SigningKey' = signing_key_from_pem(sk_pem)
+    return list(DuckietownToken.generate_many(sk, chunk, version=version, entropy=entropy))
+
+
+class TokenProcessPool(object):
+    """
+    A pool of worker processes verifying and generating Duckietown Tokens in parallel.
+
+    Signing and signature verification are CPU-bound and hold the GIL, this pool spreads them over
+    multiple processes instead. Workers have their verifying keys parsed and precomputed at startup,
+    inputs are sent to them in chunks and results are returned in input order.
+
+    Args:
+        workers:        Number of worker processes (default: number of CPUs).
+        chunk_size:     Number of tokens sent to a worker at a time.
+        vk:             Optional verification key if different from default
+    """
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: int = 256,
+                 vk: Optional['VerifyingKey'] = None):
+        if workers is not None and workers <= 0:
+            raise ValueError("Argument 'workers' must be a positive integer")
+        if chunk_size <= 0:
+            raise ValueError("Argument 'chunk_size' must be a positive integer")
+        self._workers: int = workers or os.cpu_count() or 1
+        self._chunk_size: int = chunk_size
+        vk_pem: Optional[bytes] = vk.to_pem() if vk is not None else None
+        self._executor: ProcessPoolExecutor = ProcessPoolExecutor(
+            max_workers=self._workers,
+            initializer=_init_worker,
+            initargs=(vk_pem,),
+        )
+
+    @property
+    def workers(self) -> int:
+        """
+        The number of worker processes in the pool.
+        """
+        return self._workers
+
+    @property
+    def chunk_size(self) -> int:
+        """
+        The number of tokens sent to a worker at a time.
+        """
+        return self._chunk_size
+
+    def verify_many(self, tokens: Iterable[str], allow_expired: bool = True,
+                    max_length: int = MAX_TOKEN_LENGTH) -> Iterator[VerificationResult]:
+        """
+        Decodes and verifies a stream of Duckietown Token strings using all the workers in the pool.
+
+        Only a bounded number of chunks is in flight at any time, so the input can be arbitrarily
+        long. See :py:meth:`dt_authentication.DuckietownToken.verify_many` for the results.
+
+        :param tokens:          An iterable of Duckietown Token strings.
+        :param allow_expired:   Do not report expired tokens as failures
+        :param max_length:      Longest token string accepted
+        :return:                An iterator over tokens and exceptions, in input order.
+        """
+        yield from self._map(_verify_chunk, tokens, allow_expired, max_length)
+
+    def generate_many(self, key: 'SigningKey', specs: Iterable[TokenSpecLike],
+                      version: str = DEFAULT_VERSION, entropy: Optional[Entropy] = None
+                      ) -> Iterator[DuckietownToken]:
+        """
+        Generates a stream of tokens using all the workers in the pool.
+
+        See :py:meth:`dt_authentication.DuckietownToken.generate_many` for the specifications.
+
+        :param key:         The signing key.
+        :param specs:       An iterable of token specifications.
+        :param version:     Version of the tokens to generate.
+        :param entropy:     (Optional) Source of randomness of the signatures, it must be picklable.
+        :return:            An iterator over the new tokens, in input order.
+        """
+        specs = (TokenSpec.of(spec) for spec in specs)
+        yield from self._map(_generate_chunk, specs, key.to_pem(), version, entropy)
+
+    def _map(self, fcn, items: Iterable, *args) -> Iterator:
+        items = iter(items)
+        pending: Deque[Future] = collections.deque()
+        max_pending: int = 2 * self._workers
+        while True:
+            # keep the workers busy
+            while len(pending) < max_pending:
+                chunk: List = list(itertools.islice(items, self._chunk_size))
+                if not chunk:
+                    break
+                pending.append(self._executor.submit(fcn, chunk, *args))
+            if not pending:
+                return
+            yield from pending.popleft().result()
+
+    def close(self):
+        """
+        Shuts the worker processes down.
+        """
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> 'TokenProcessPool':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
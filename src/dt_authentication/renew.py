@@ -0,0 +1,124 @@
+import random
+import threading
+import time
+from typing import Optional, Any, Dict, Tuple, TYPE_CHECKING
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .exceptions import GenericException
+from .token import DuckietownToken, TOKEN_RENEW_ONLINE_PATH, default_renew_base_url
+
+if TYPE_CHECKING:
+    # noinspection PyProtectedMember
+    from ecdsa.keys import VerifyingKey
+
+__all__ = [
+    "RenewClient",
+    "get_default_client",
+]
+
+# responses worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RenewClient(object):
+    """
+    Client of the Duckietown token renewal service.
+
+    Connections are kept alive and pooled per host, requests are bounded by a connect and a read
+    timeout, and failed requests (connection errors, timeouts, 429 and 5xx responses) are retried
+    with exponential backoff and jitter.
+
+    Args:
+        base_url:           Base URL of the renewal service (default: ``https://<DT_TOKEN_RENEW_HOST>``).
+        vk:                 Optional verification key for the renewed tokens if different from default
+        connect_timeout:    Timeout in seconds to establish a connection.
+        read_timeout:       Timeout in seconds to read a response.
+        retries:            Maximum number of times a failed request is retried.
+        backoff:            Base delay in seconds between retries, doubled at every attempt.
+        max_connections:    Maximum number of connections kept alive per host.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, vk: Optional['VerifyingKey'] = None,
+                 connect_timeout: float = 5.0, read_timeout: float = 10.0, retries: int = 3,
+                 backoff: float = 0.2, max_connections: int = 10):
+        if retries < 0:
+            raise ValueError("Argument 'retries' must be a non-negative integer")
+        self._base_url: str = (base_url or default_renew_base_url()).rstrip("/")
+        self._vk: Optional['VerifyingKey'] = vk
+        self._timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self._retries: int = retries
+        self._backoff: float = backoff
+        self._session: requests.Session = requests.Session()
+        adapter: HTTPAdapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    @property
+    def url(self) -> str:
+        """
+        The URL of the renewal endpoint.
+        """
+        return f"{self._base_url}{TOKEN_RENEW_ONLINE_PATH}"
+
+    def _delay(self, attempt: int) -> float:
+        # full jitter, spreads the retries of clients that failed together
+        return random.uniform(0, self._backoff * (2 ** attempt))
+
+    def _get(self, headers: Dict[str, str]) -> requests.Response:
+        attempt: int = 0
+        while True:
+            try:
+                response = self._session.get(self.url, headers=headers, timeout=self._timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self._retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self._retries:
+                    return response
+                response.close()
+            time.sleep(self._delay(attempt))
+            attempt += 1
+
+    def renew(self, token: DuckietownToken) -> DuckietownToken:
+        """
+        Asks the renewal service for a new token.
+
+        :param token:   The token to renew.
+        :return:        The new token.
+        """
+        response = self._get({"Authorization": f"Token {token.as_string()}"})
+        data: Dict[str, Any] = response.json()
+        if not data["success"]:
+            raise GenericException(data["messages"])
+        return DuckietownToken.from_string(data["result"]["token"], vk=self._vk)
+
+    def close(self):
+        """
+        Closes all the connections in the pool.
+        """
+        self._session.close()
+
+    def __enter__(self) -> 'RenewClient':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+_lock: threading.Lock = threading.Lock()
+_default_client: Optional[RenewClient] = None
+
+
+def get_default_client() -> RenewClient:
+    """
+    Returns the client used by :py:meth:`dt_authentication.DuckietownToken.renew` when no client
+    is given.
+    """
+    global _default_client
+    if _default_client is None:
+        with _lock:
+            if _default_client is None:
+                _default_client = RenewClient()
+    return _default_client
@@ -1,17 +1,108 @@
-import dataclasses
+import functools
 import json
-from typing import Dict, Union, Optional, List
+from typing import Dict, Union, Optional, List, Iterable, Set, Tuple, Any
 
+# maximum number of distinct scopes kept in the intern table
+MAX_INTERNED_SCOPES: int = 8192
+# maximum number of distinct scope strings whose parsing is memoized
+MAX_PARSED_SCOPES: int = 4096
+
+SCOPE_FIELDS: Tuple[str, ...] = ("action", "resource", "identifier", "service")
+
+# a resource, identifier or service ending with this character matches any value with the same prefix,
+# where wildcards are enabled
+WILDCARD: str = "*"
+
+
+def _is_pattern(value: Optional[str]) -> bool:
+    return isinstance(value, str) and value.endswith(WILDCARD)
+
+
+def _matches(pattern: Optional[str], value: Optional[str]) -> bool:
+    # an unset field grants any value
+    if pattern is None:
+        return True
+    if _is_pattern(pattern):
+        # only strings have a prefix, e.g., numeric identifiers match exact values only
+        return isinstance(value, str) and value.startswith(pattern[:-1])
+    return pattern == value
+
+
+class _DataclassFields(object):
+    """
+    The fields of :py:class:`dt_authentication.scope.Scope` as described by ``dataclasses``, so that
+    helpers like ``dataclasses.asdict`` and ``dataclasses.replace`` keep working on scopes.
+    ``dataclasses`` is imported the first time the fields are needed, not with the library.
+    """
+
+    def __init__(self):
+        self._fields: Optional[Dict[str, Any]] = None
+
+    def __get__(self, instance, owner) -> Dict[str, Any]:
+        if self._fields is None:
+            import dataclasses
+
+            @dataclasses.dataclass(frozen=True)
+            class _Fields:
+                action: str
+                resource: Optional[str] = None
+                identifier: Optional[str] = None
+                service: Optional[str] = None
+
+            self._fields = getattr(_Fields, "__dataclass_fields__")
+        return self._fields
+
+
+class Scope(object):
+    """
+    A scope granted by a Duckietown Token.
+
+    The resource, identifier and service of a scope can be prefix patterns ending with ``*``,
+    e.g., ``read:duckiebot:db-*`` grants reading any duckiebot whose identifier starts with ``db-``.
+    Patterns are honored only where wildcards are enabled, i.e., by tokens of the versions in
+    :py:data:`dt_authentication.token.WILDCARD_VERSIONS`. Everywhere else, e.g., in dt1 and dt2
+    tokens, a trailing ``*`` is an ordinary character.
+
+    Scopes are immutable and hashable. Identical scopes share a single instance, so equality is
+    cheap and the compact forms of a scope are computed only once. Scopes are no longer
+    dataclasses, but ``dataclasses.asdict`` and ``dataclasses.replace`` still work on them.
+
+    Args:
+        action:     The action granted by the scope, e.g., 'read'.
+        resource:   (Optional) The resource the action is granted on, any resource if not given.
+        identifier: (Optional) The identifier of the resource, any identifier if not given.
+        service:    (Optional) The service the scope applies to, any service if not given.
+    """
+
+    __slots__ = ("action", "resource", "identifier", "service", "_hash", "_compact", "_str")
 
-@dataclasses.dataclass
-class Scope:
     action: str
-    resource: Optional[str] = None
-    identifier: Optional[str] = None
-    service: Optional[str] = None
+    resource: Optional[str]
+    identifier: Optional[str]
+    service: Optional[str]
 
-    def __post_init__(self):
-        self._sanity_check()
+    __dataclass_fields__ = _DataclassFields()
+
+    def __new__(cls, action: str, resource: Optional[str] = None, identifier: Optional[str] = None,
+                service: Optional[str] = None):
+        key = (cls, action, resource, identifier, service)
+        scope = _interned.get(key, None)
+        if scope is not None:
+            return scope
+        scope = super(Scope, cls).__new__(cls)
+        _set = object.__setattr__
+        _set(scope, "action", action)
+        _set(scope, "resource", resource)
+        _set(scope, "identifier", identifier)
+        _set(scope, "service", service)
+        scope._sanity_check()
+        _set(scope, "_hash", hash(key[1:]))
+        _set(scope, "_compact", None)
+        _set(scope, "_str", None)
+        # scopes are interned until the table is full, past that point they are just not shared
+        if len(_interned) < MAX_INTERNED_SCOPES:
+            scope = _interned.setdefault(key, scope)
+        return scope
 
     def _sanity_check(self):
         if self.action is None:
@@ -19,28 +110,50 @@ class Scope:
         if self.identifier is not None and self.resource is None:
             raise ValueError("If you set the field 'identifier' you must also set the field 'resource'")
 
+    def _fields(self) -> Tuple[Optional[str], ...]:
+        return self.action, self.resource, self.identifier, self.service
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"'{type(self).__name__}' objects are immutable")
+
+    def __delattr__(self, key):
+        raise AttributeError(f"'{type(self).__name__}' objects are immutable")
+
+    def __eq__(self, other) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, Scope):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __repr__(self) -> str:
+        return f"Scope(action={self.action!r}, resource={self.resource!r}, " \
+               f"identifier={self.identifier!r}, service={self.service!r})"
+
+    def __reduce__(self):
+        return type(self), self._fields()
+
+    def __copy__(self) -> 'Scope':
+        return self
+
+    def __deepcopy__(self, memo) -> 'Scope':
+        return self
+
     def grants(self, action: str, resource: Optional[str] = None, identifier: Optional[str] = None,
-               service: Optional[str] = None) -> bool:
-        if action != self.action:
-            return False
-        if self.resource is not None and self.resource != resource:
-            return False
-        if self.identifier is not None and self.identifier != identifier:
-            return False
-        if self.service is not None and self.service != service:
-            return False
-        return True
+               service: Optional[str] = None, wildcards: bool = False) -> bool:
+        if not wildcards:
+            return action == self.action and self.resource in (None, resource) and \
+                self.identifier in (None, identifier) and self.service in (None, service)
+        return action == self.action and _matches(self.resource, resource) and \
+            _matches(self.identifier, identifier) and _matches(self.service, service)
 
     @classmethod
     def parse(cls, scope: Union[str, Dict[str, str]]) -> 'Scope':
         if isinstance(scope, str):
-            if scope.startswith("{"):
-                return Scope(**json.loads(scope))
-            scope_parts = scope.split(":")
-            if len(scope_parts) > 3:
-                raise ValueError("Only scopes in the form '<action>[:<resource>[:<resource-id>]]' "
-                                 "are supported.")
-            return Scope(*scope_parts)
+            return _parse_string(scope)
         if isinstance(scope, dict):
             return Scope(**scope)
         else:
@@ -48,7 +161,14 @@ class Scope:
                              f"Expected 'str' or 'dict'.")
 
     def compact(self, exclude: List[str] = None, force_dict: bool = False) -> Union[str, dict]:
-        self._sanity_check()
+        # the default form is computed once, dictionaries are copied as callers might change them
+        if not exclude and not force_dict:
+            if self._compact is None:
+                object.__setattr__(self, "_compact", self._compact_form(None, False))
+            return self._compact if isinstance(self._compact, str) else dict(self._compact)
+        return self._compact_form(exclude, force_dict)
+
+    def _compact_form(self, exclude: Optional[List[str]], force_dict: bool) -> Union[str, dict]:
         # resource is optional
         extras: List[str] = [self.resource] if self.resource is not None else []
         # make sure the exclusion list is valid
@@ -62,7 +182,146 @@ class Scope:
         if (not force_dict) and (self.service is None or "service" in exclude):
             return ":".join(filter(lambda x: x is not None, [self.action] + extras))
         # dict form instead
-        return dataclasses.asdict(self)
+        return dict(zip(SCOPE_FIELDS, self._fields()))
 
     def __str__(self):
-        return json.dumps(self.compact(), sort_keys=True) if self.service is not None else self.compact()
+        if self._str is None:
+            compact: Union[str, dict] = self.compact()
+            s: str = json.dumps(compact, sort_keys=True) if self.service is not None else compact
+            object.__setattr__(self, "_str", s)
+        return self._str
+
+
+# (class, action, resource, identifier, service) -> shared instance
+_interned: Dict[tuple, Scope] = {}
+
+
+@functools.lru_cache(maxsize=MAX_PARSED_SCOPES)
+def _parse_string(scope: str) -> Scope:
+    # scopes are immutable, the same instance can be handed out for the same string
+    if scope.startswith("{"):
+        return Scope(**json.loads(scope))
+    scope_parts = scope.split(":")
+    if len(scope_parts) > 3:
+        raise ValueError("Only scopes in the form '<action>[:<resource>[:<resource-id>]]' "
+                         "are supported.")
+    return Scope(*scope_parts)
+
+
+# (action, resource, identifier, service), trailing fields can be omitted
+ScopeQuery = Tuple[Optional[str], ...]
+
+
+class _PatternNode(object):
+    """
+    One level of a :py:class:`dt_authentication.scope.ScopeIndex`, matches a value against exact
+    values and prefix patterns.
+    """
+
+    __slots__ = ("exact", "prefixes")
+
+    def __init__(self):
+        # value -> next level, `None` holds the scopes leaving the field unset
+        self.exact: Dict[Optional[str], Any] = {}
+        # character trie of the prefix patterns, the next level of a pattern is stored under `None`
+        self.prefixes: Dict[Optional[str], Any] = {}
+
+    def add(self, pattern: Optional[str], child: Any) -> Any:
+        if _is_pattern(pattern):
+            node: Dict[Optional[str], Any] = self.prefixes
+            for c in pattern[:-1]:
+                node = node.setdefault(c, {})
+            return node.setdefault(None, child)
+        return self.exact.setdefault(pattern, child)
+
+    def match(self, value: Optional[str]) -> List[Any]:
+        # the next levels matching the given value
+        found: List[Any] = []
+        child = self.exact.get(None, None)
+        if child is not None:
+            found.append(child)
+        if value is None:
+            return found
+        child = self.exact.get(value, None)
+        if child is not None:
+            found.append(child)
+        # only strings have a prefix, e.g., numeric identifiers match exact values only
+        if self.prefixes and isinstance(value, str):
+            found += self._walk(value)
+        return found
+
+    def _walk(self, value: str) -> List[Any]:
+        # walk down the trie, every pattern met on the way is a prefix of the value
+        found: List[Any] = []
+        node: Optional[Dict[Optional[str], Any]] = self.prefixes
+        for c in value:
+            child = node.get(None, None)
+            if child is not None:
+                found.append(child)
+            node = node.get(c, None)
+            if node is None:
+                return found
+        child = node.get(None, None)
+        if child is not None:
+            found.append(child)
+        return found
+
+
+class ScopeIndex:
+    """
+    A list of scopes compiled into nested dictionaries keyed by action, resource, identifier and
+    service, so that checking whether a scope is granted costs a few dictionary lookups no matter
+    how many scopes are in the list. When wildcards are enabled, scopes with prefix patterns are
+    compiled into one trie per field instead, matching them costs a walk along the queried values.
+
+    Args:
+        scopes:     The scopes to index.
+        wildcards:  Whether a trailing ``*`` in a resource, identifier or service is a prefix pattern.
+    """
+
+    def __init__(self, scopes: Iterable[Scope], wildcards: bool = False):
+        self._index: Dict[str, Dict[Optional[str], Dict[Optional[str], Set[Optional[str]]]]] = {}
+        # action -> trie of the scopes with patterns, most tokens do not have any
+        self._patterns: Optional[Dict[str, _PatternNode]] = None
+        for s in scopes:
+            if wildcards and (_is_pattern(s.resource) or _is_pattern(s.identifier) or _is_pattern(s.service)):
+                if self._patterns is None:
+                    self._patterns = {}
+                node: _PatternNode = self._patterns.setdefault(s.action, _PatternNode())
+                node = node.add(s.resource, _PatternNode())
+                node = node.add(s.identifier, _PatternNode())
+                node.add(s.service, True)
+                continue
+            self._index.setdefault(s.action, {}).setdefault(s.resource, {}) \
+                .setdefault(s.identifier, set()).add(s.service)
+
+    def grants(self, action: str, resource: Optional[str] = None, identifier: Optional[str] = None,
+               service: Optional[str] = None) -> bool:
+        resources = self._index.get(action, None)
+        if resources is not None:
+            # an unset field in a scope grants any value of that field
+            for r in ((resource, None) if resource is not None else (None,)):
+                identifiers = resources.get(r, None)
+                if identifiers is None:
+                    continue
+                for i in ((identifier, None) if identifier is not None else (None,)):
+                    services = identifiers.get(i, None)
+                    if services is not None and (service in services or None in services):
+                        return True
+        if self._patterns is None:
+            return False
+        return self._grants_pattern(action, resource, identifier, service)
+
+    def _grants_pattern(self, action: str, resource: Optional[str], identifier: Optional[str],
+                        service: Optional[str]) -> bool:
+        node: Optional[_PatternNode] = self._patterns.get(action, None)
+        if node is None:
+            return False
+        for identifiers in node.match(resource):
+            for services in identifiers.match(identifier):
+                if services.match(service):
+                    return True
+        return False
+
+    def grants_many(self, queries: Iterable[ScopeQuery]) -> List[bool]:
+        return [self.grants(*q) for q in queries]
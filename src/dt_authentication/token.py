@@ -1,49 +1,282 @@
+import calendar
 import copy
 import datetime
+import functools
+import itertools
 import json
 import os
-from typing import Dict, Union, List, Optional, Any
-
-import requests
-from base58 import b58decode, b58encode
-# noinspection PyProtectedMember
-from ecdsa import NIST192p
-from ecdsa.keys import VerifyingKey, BadSignatureError, SigningKey
+import time
+from typing import Dict, Union, List, Optional, Any, Iterable, Iterator, Mapping, NamedTuple, Tuple, \
+    TYPE_CHECKING
 
+from . import cbor, metrics
+from .backends import Entropy, get_backend
+from .codec import b58decode, b58encode, b64url_decode, b64url_encode
 from .exceptions import InvalidToken, ExpiredToken, GenericException, NotARenewableToken
-from .scope import Scope
-
-PUBLIC_KEYS = {
-    # dt1 was introduced in 2017
-    "dt1": """-----BEGIN PUBLIC KEY-----
-MEkwEwYHKoZIzj0CAQYIKoZIzj0DAQEDMgAEQr/8RJmJZT+Bh1YMb1aqc2ao5teE
-ixOeCMGTO79Dbvw5dGmHJLYyNPwnKkWayyJS
------END PUBLIC KEY-----""",
-    # dt2 was introduced in May 2023
-    "dt2": """-----BEGIN PUBLIC KEY-----
-MEkwEwYHKoZIzj0CAQYIKoZIzj0DAQEDMgAEHIqMBPGB2tzRgrMKhQSkEiKQ317q
-msEAqq1CS86oV1vjHYVq6FLvtnDsuWzbW2Nz
------END PUBLIC KEY-----"""
-}
+from .keys import PUBLIC_KEYS, get_verifying_key
+from .scope import Scope, ScopeIndex, ScopeQuery
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+    # noinspection PyProtectedMember
+    from ecdsa.keys import VerifyingKey, SigningKey
+    from .aio import AsyncRenewClient
+    from .cache import TokenCache, InvalidTokenCache
+    from .metrics import Trace
+    from .renew import RenewClient
+
 DATETIME_FORMAT = {
     "dt1": "%Y-%m-%d",
-    "dt2": "%Y-%m-%d/%H:%M"
+    "dt2": "%Y-%m-%d/%H:%M",
+    # expiration dates are UNIX timestamps
+    "dt3": None,
 }
 
 PAYLOAD_FIELDS = {"uid", "exp"}
-CURVE = NIST192p
-SUPPORTED_VERSIONS = ["dt1", "dt2"]
+SUPPORTED_VERSIONS = ["dt1", "dt2", "dt3"]
 SUPPORTED_FIELDS = {
     "dt1": [],
     "dt2": ["scope", "data", "duration"],
+    "dt3": ["scope", "data", "duration"],
 }
+# versions with a binary (CBOR) payload, encoded as '<version>-<base64url payload>.<base64url signature>'
+BINARY_VERSIONS = {"dt3"}
+# versions whose scopes can use prefix patterns, e.g. 'read:duckiebot:db-*', older versions match
+# scopes exactly so that the tokens already issued keep granting what they granted
+WILDCARD_VERSIONS = {"dt3"}
+# keys of the fields of binary payloads
+BINARY_FIELDS = {"uid": 0, "exp": 1, "scope": 2, "data": 3, "duration": 4}
+# strings often found in scopes, binary payloads replace them with their index in this list.
+# The list is part of the token format, changing it requires a new token version.
+SCOPE_CODEBOOK = (
+    "auth", "read", "write", "create", "delete", "update", "list", "admin", "*",
+    "duckiebot", "autolab", "class", "challenge", "submission", "evaluation", "user", "data", "token",
+    "hub.duckietown.com", "challenges.duckietown.org", "dashboard.duckietown.com",
+)
 DEFAULT_VERSION = "dt2"
+# maximum number of distinct scope lists remembered by generate_many
+MAX_COMPILED_SCOPES = 1024
+# maximum number of distinct encoded scopes remembered by the binary payload decoder
+MAX_BINARY_SCOPES = 4096
+# tokens (or signatures) longer than this are rejected before decoding them, the token limit can be
+# changed through the argument 'max_length' of 'from_string', 'afrom_string' and 'verify_many'
+MAX_TOKEN_LENGTH = 8192
+MAX_SIGNATURE_LENGTH = 256
 
 
 ScopeList = List[Union[Scope, str]]
 
 TOKEN_RENEW_ONLINE_HOST = os.environ.get("DT_TOKEN_RENEW_HOST", "hub.duckietown.com")
-TOKEN_RENEW_ONLINE_URL = f"https://{TOKEN_RENEW_ONLINE_HOST}/api/v1/auth/token/renew"
+TOKEN_RENEW_ONLINE_PATH = "/api/v1/auth/token/renew"
+TOKEN_RENEW_ONLINE_URL = f"https://{TOKEN_RENEW_ONLINE_HOST}{TOKEN_RENEW_ONLINE_PATH}"
+
+
+def default_renew_base_url() -> str:
+    """
+    Base URL of the token renewal service, the host can be changed through the environment
+    variable ``DT_TOKEN_RENEW_HOST``.
+    """
+    return f"https://{os.environ.get('DT_TOKEN_RENEW_HOST', 'hub.duckietown.com')}"
+
+
+def __getattr__(name: str):
+    # 'ecdsa' is imported only when the curve is actually needed
+    if name == "CURVE":
+        # noinspection PyProtectedMember
+        from ecdsa.curves import NIST192p
+        return NIST192p
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _parse_expiration(version: str, exp: Optional[Union[str, int]]) -> Optional[int]:
+    # expiration dates are UTC, we turn them into UNIX timestamps
+    if exp is None:
+        return None
+    fmt: Optional[str] = DATETIME_FORMAT[version]
+    if fmt is None:
+        if not isinstance(exp, int) or isinstance(exp, bool):
+            raise TypeError(f"Expected an integer expiration date, got '{type(exp).__name__}'")
+        return exp
+    return calendar.timegm(time.strptime(exp, fmt))
+
+
+def _as_datetime(timestamp: int) -> datetime.datetime:
+    return _EPOCH + datetime.timedelta(seconds=timestamp)
+
+
+def _entropy(numbytes):
+    e = b"duckietown is a place of relaxed introspection, and hub extends this place a lot"
+    return e[:numbytes]
+
+
+_SCOPE_CODES: Dict[str, int] = {s: i for i, s in enumerate(SCOPE_CODEBOOK)}
+
+
+def _encode_binary_payload(payload: Mapping[str, Any], scopes: Iterable[Scope]) -> bytes:
+    # top level fields are keyed by small integers, the fields of a scope are stored in an array
+    # without trailing unset fields and the strings found in the codebook are replaced by their index
+    encoded: Dict[int, Any] = {}
+    for field, value in payload.items():
+        if field not in BINARY_FIELDS:
+            raise ValueError(f"Field '{field}' is not supported by binary payloads")
+        if field == "scope":
+            value = []
+            for scope in scopes:
+                fields = [scope.action, scope.resource, scope.identifier, scope.service]
+                while fields[-1] is None:
+                    fields.pop()
+                # integers stand for codebook entries, other values would not decode to themselves
+                for f in fields:
+                    if f is not None and not isinstance(f, str):
+                        raise ValueError(f"Scope fields must be strings, got {f!r} in {scope!r}")
+                value.append([_SCOPE_CODES.get(f, f) for f in fields])
+        encoded[BINARY_FIELDS[field]] = value
+    return cbor.dumps(encoded)
+
+
+_BINARY_FIELD_NAMES: Dict[int, str] = {i: f for f, i in BINARY_FIELDS.items()}
+
+
+# encoded scope -> scope, most tokens carry the same few scopes
+_binary_scopes: Dict[tuple, Scope] = {}
+
+
+def _decode_binary_scope(fields: Any) -> tuple:
+    # fields are either strings, codebook indices or unset. Scopes are only checked here, payloads
+    # are decoded before their signature is verified and must not fill the scope caches.
+    if type(fields) is not list or not 1 <= len(fields) <= 4:
+        raise ValueError("Invalid scope")
+    for f in fields:
+        if f is None or type(f) is str:
+            continue
+        if type(f) is not int or not 0 <= f < len(SCOPE_CODEBOOK):
+            raise ValueError("Invalid scope")
+    return tuple(fields)
+
+
+def _binary_scope(key: tuple) -> Scope:
+    # the scope with the given (checked) encoded fields
+    scope: Optional[Scope] = _binary_scopes.get(key, None)
+    if scope is not None:
+        return scope
+    scope = Scope(*(SCOPE_CODEBOOK[f] if type(f) is int else f for f in key))
+    if len(_binary_scopes) >= MAX_BINARY_SCOPES:
+        _binary_scopes.clear()
+    _binary_scopes[key] = scope
+    return scope
+
+
+def _decode_binary_payload(raw: bytes) -> Dict[str, Any]:
+    encoded = cbor.loads(raw)
+    if not isinstance(encoded, dict):
+        raise ValueError("The payload is not a map")
+    payload: Dict[str, Any] = {}
+    for key, value in encoded.items():
+        field: Optional[str] = _BINARY_FIELD_NAMES.get(key, None)
+        if field is None:
+            raise ValueError(f"Unknown payload field {key!r}")
+        if field == "scope":
+            if not isinstance(value, list):
+                raise ValueError("The scope is not a list")
+            value = [_decode_binary_scope(fields) for fields in value]
+        payload[field] = value
+    if not isinstance(payload.get("uid", None), int):
+        raise ValueError("Invalid user ID")
+    return payload
+
+
+def _signed_message(version: str, raw: bytes) -> bytes:
+    # binary payloads are signed together with their version, so that a signature made for a
+    # version can never be valid for another one using the same key. JSON payloads are signed
+    # as they are, as they always were, and cannot be confused with the prefixed messages.
+    if version in BINARY_VERSIONS:
+        return version.encode("ascii") + b"\0" + raw
+    return raw
+
+
+def _decode_payload(version: str, raw: bytes) -> Dict[str, Any]:
+    """
+    Decodes the signed payload of a token. Scopes are left as they are encoded, see
+    :py:func:`dt_authentication.token._parse_scopes`.
+
+    :raises ValueError: if the payload is malformed.
+    """
+    if version in BINARY_VERSIONS:
+        return _decode_binary_payload(raw)
+    # payloads are decoded before their signature is checked, deeply nested JSON must not escape
+    # as anything other than an invalid payload
+    try:
+        return json.loads(raw.decode("utf-8"))
+    except RecursionError:
+        raise ValueError("The payload is nested too deeply")
+
+
+def _parse_scopes(version: str, scopes: Iterable[Any]) -> List[Scope]:
+    """
+    Parses the scopes of a decoded payload, to be called once the payload is trusted since parsed
+    scopes are cached.
+
+    :raises ValueError: if a scope is malformed.
+    """
+    if version in BINARY_VERSIONS:
+        return [_binary_scope(key) for key in scopes]
+    return [Scope.parse(s) for s in scopes]
+
+
+# parsed and compact forms of a scope list
+CompiledScope = Tuple[List[Scope], Tuple[Union[str, dict], ...]]
+
+
+def _compile_scope(scope: Optional[ScopeList]) -> CompiledScope:
+    # sanitize scope
+    if scope is None:
+        scope = []
+    # make sure the scope is valid
+    if not isinstance(scope, (list, tuple)):
+        raise ValueError("Argument 'scope' must be a list")
+    scope_parsed: List[Scope] = []
+    scope_encoded: List[Union[str, dict]] = []
+    for s in scope:
+        if not isinstance(s, Scope):
+            s = Scope.parse(s)
+        scope_parsed.append(s)
+        scope_encoded.append(s.compact())
+    return scope_parsed, tuple(scope_encoded)
+
+
+class TokenSpec(NamedTuple):
+    """
+    Specification of a token to generate, see
+    :py:meth:`dt_authentication.DuckietownToken.generate_many`.
+    """
+    uid: int
+    scope: Optional[ScopeList] = None
+    data: Optional[dict] = None
+    # duration in minutes, tokens with no positive duration never expire
+    duration: int = 0
+    renewable: bool = False
+
+    @classmethod
+    def of(cls, spec: 'TokenSpecLike') -> 'TokenSpec':
+        if isinstance(spec, TokenSpec):
+            return spec
+        if isinstance(spec, dict):
+            return cls(**spec)
+        if isinstance(spec, (tuple, list)):
+            return cls(*spec)
+        raise ValueError(f"Token specification of type '{type(spec).__name__}' not supported. "
+                         f"Expected 'TokenSpec', 'tuple' or 'dict'.")
+
+
+TokenSpecLike = Union[TokenSpec, tuple, dict]
+
+
+def _restore(version: str, payload: Dict[str, Any], signature: bytes, exp: Optional[int],
+             raw: Optional[bytes], encoded: Optional[str]) -> 'DuckietownToken':
+    return DuckietownToken._build(version, payload, signature, exp, raw, encoded)
 
 
 class DuckietownToken(object):
@@ -53,8 +286,13 @@ class DuckietownToken(object):
     Args:
         payload:    The token's payload as a dictionary.
         signature:  The token's signature.
+
+    Instances are immutable, the only way to change a token is to replace its entire content
+    using :py:meth:`dt_authentication.DuckietownToken.copy_from`.
     """
 
+    __slots__ = ("_version", "_payload", "_signature", "_exp", "_scopes", "_scope_index", "_raw", "_encoded")
+
     def __init__(self, version: str, payload: Dict[str, Union[str, int]], signature: Union[str, bytes]):
         """
         Creates a Duckietown Token from a payload and a signature.
@@ -67,9 +305,55 @@ class DuckietownToken(object):
         :param payload:     A dictionary containing the token payload
         :param signature:   A signature, either as a base58 encoded string or as raw bytes
         """
-        self._version: str = version
-        self._payload: Dict[str, Union[str, int, list]] = payload
-        self._signature: bytes = signature if isinstance(signature, (bytes,)) else b58decode(signature)
+        if not isinstance(signature, (bytes,)):
+            signature = b64url_decode(signature) if version in BINARY_VERSIONS else b58decode(signature)
+        self._init(version, payload, signature, _parse_expiration(version, payload["exp"]))
+
+    def _init(self, version: str, payload: Dict[str, Any], signature: bytes, exp: Optional[int],
+              raw: Optional[bytes] = None, encoded: Optional[str] = None):
+        _set = object.__setattr__
+        _set(self, "_version", version)
+        _set(self, "_payload", payload)
+        _set(self, "_signature", signature)
+        # expiration as UNIX timestamp
+        _set(self, "_exp", exp)
+        # parsed scope, compiled lazily
+        _set(self, "_scopes", None)
+        _set(self, "_scope_index", None)
+        # signed payload bytes and token string, kept for tokens that were decoded or generated
+        _set(self, "_raw", raw)
+        _set(self, "_encoded", encoded)
+
+    @classmethod
+    def _build(cls, version: str, payload: Dict[str, Any], signature: bytes, exp: Optional[int],
+               raw: Optional[bytes] = None, encoded: Optional[str] = None) -> 'DuckietownToken':
+        # creates a token from already validated parts
+        token = cls.__new__(cls)
+        token._init(version, payload, signature, exp, raw, encoded)
+        return token
+
+    def _clone(self) -> 'DuckietownToken':
+        # clones share nothing that callers can change, e.g., the 'data' of a token handed out by a
+        # cache, the parsed scope and its index are immutable and can be shared
+        payload: Dict[str, Any] = dict(self._payload)
+        for k, v in payload.items():
+            if k == "scope":
+                payload[k] = [(s if isinstance(s, Scope) else copy.deepcopy(s)) for s in v]
+            elif isinstance(v, (dict, list)):
+                payload[k] = copy.deepcopy(v)
+        token = self._build(self._version, payload, self._signature, self._exp, self._raw, self._encoded)
+        object.__setattr__(token, "_scopes", self._scopes)
+        object.__setattr__(token, "_scope_index", self._scope_index)
+        return token
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"'{type(self).__name__}' objects are immutable")
+
+    def __delattr__(self, key):
+        raise AttributeError(f"'{type(self).__name__}' objects are immutable")
+
+    def __reduce__(self):
+        return _restore, (self._version, self._payload, self._signature, self._exp, self._raw, self._encoded)
 
     @property
     def version(self) -> str:
@@ -81,16 +365,16 @@ class DuckietownToken(object):
     @property
     def payload(self) -> Dict[str, object]:
         """
-        The token's payload.
+        A copy of the token's payload.
         """
-        return copy.copy(self._payload)
+        return dict(self._payload)
 
     @property
     def signature(self) -> bytes:
         """
         The token's signature.
         """
-        return copy.copy(self._signature)
+        return self._signature
 
     @property
     def uid(self) -> int:
@@ -104,8 +388,20 @@ class DuckietownToken(object):
         """
         The scope of this token.
         """
-        scope = self._payload.get("scope", [])
-        return [(s if isinstance(s, Scope) else Scope.parse(s)) for s in scope]
+        return list(self._parsed_scope())
+
+    def _parsed_scope(self) -> List[Scope]:
+        if self._scopes is None:
+            scope = self._payload.get("scope", [])
+            scopes: List[Scope] = [(s if isinstance(s, Scope) else Scope.parse(s)) for s in scope]
+            object.__setattr__(self, "_scopes", scopes)
+        return self._scopes
+
+    def _compiled_scope(self) -> ScopeIndex:
+        if self._scope_index is None:
+            wildcards: bool = self._version in WILDCARD_VERSIONS
+            object.__setattr__(self, "_scope_index", ScopeIndex(self._parsed_scope(), wildcards=wildcards))
+        return self._scope_index
 
     @property
     def data(self) -> Optional[dict]:
@@ -126,35 +422,57 @@ class DuckietownToken(object):
         """
         Whether the token can be renewed.
         """
-        return self.duration is not None
+        return "duration" in self._payload and self._payload["duration"] is not None
 
     @property
     def expiration(self) -> Optional[datetime.datetime]:
         """
         The token's expiration date.
         """
-        if self._payload["exp"] is None:
-            return None
-        return datetime.datetime.strptime(self._payload["exp"], DATETIME_FORMAT[self._version])
+        return _as_datetime(self._exp) if self._exp is not None else None
+
+    @property
+    def expiration_timestamp(self) -> Optional[int]:
+        """
+        The token's expiration date as a UNIX timestamp.
+        """
+        return self._exp
 
     @property
     def expired(self) -> bool:
         """ Whether the token is already expired """
-        exp: Optional[datetime.date] = self.expiration
-        if exp is None:
-            # never-expiring tokens
-            return False
-        # compare now() with token expiration date
-        return exp < datetime.datetime.utcnow()
+        # never-expiring tokens have no expiration date
+        return self._exp is not None and self._exp < time.time()
 
     def as_string(self) -> str:
         """
         Returns the Duckietown Token string.
         """
-        # encode payload into JSON
-        payload_json: str = self.payload_as_json()
+        # decoded tokens already have a string
+        if self._encoded is not None:
+            return self._encoded
+        # generated tokens already have their payload serialized
+        if self._raw is not None:
+            encoded: str = self._encode(self._raw)
+            object.__setattr__(self, "_encoded", encoded)
+            return encoded
+        return self._encode(self._payload_bytes())
+
+    def _payload_bytes(self) -> bytes:
+        # the signed form of the payload
+        if self._raw is not None:
+            return self._raw
+        if self._version in BINARY_VERSIONS:
+            return _encode_binary_payload(self._payload, self._parsed_scope())
+        return self.payload_as_json().encode("utf-8")
+
+    def _encode(self, raw: bytes) -> str:
         # encode payload and signature
-        payload_base58: str = b58encode(payload_json).decode("utf-8")
+        if self._version in BINARY_VERSIONS:
+            payload_base64: str = b64url_encode(raw).decode("ascii")
+            signature_base64: str = b64url_encode(self._signature).decode("ascii")
+            return f"{self._version}-{payload_base64}.{signature_base64}"
+        payload_base58: str = b58encode(raw).decode("utf-8")
         signature_base58: str = b58encode(self._signature).decode("utf-8")
         # compile token
         return f"{self._version}-{payload_base58}-{signature_base58}"
@@ -166,7 +484,7 @@ class DuckietownToken(object):
         # get a copy of the payload dictionary
         payload = copy.deepcopy(self._payload)
         # replace parsed scope
-        scope: List[Union[str, dict]] = [s.compact() for s in self.scope]
+        scope: List[Union[str, dict]] = [s.compact() for s in self._parsed_scope()]
         if "scope" in SUPPORTED_FIELDS[self.version]:
             payload["scope"] = scope
         # encode payload into JSON
@@ -183,13 +501,28 @@ class DuckietownToken(object):
         :param service:     Service of the scope to check for
         :return:            'True' if this token grants this scope, 'False' otherwise.
         """
-        for s in self.scope:
-            if s.grants(action, resource, identifier, service):
-                return True
-        return False
+        if not metrics.enabled:
+            return self._compiled_scope().grants(action, resource, identifier, service)
+        with metrics.Trace("grants", self._version) as trace:
+            index: ScopeIndex = self._compiled_scope()
+            trace.lap("index")
+            granted: bool = index.grants(action, resource, identifier, service)
+            trace.lap("lookup")
+            trace.outcome = "granted" if granted else "denied"
+        return granted
 
-    def renew(self, key: Optional[SigningKey] = None, in_place: bool = False,
-              changes: Dict[str, Any] = None) -> 'DuckietownToken':
+    def grants_many(self, queries: Iterable[ScopeQuery]) -> List[bool]:
+        """
+        Checks whether this token grants each of the given scopes.
+
+        :param queries:     Tuples (action, resource, identifier, service) to check for, trailing
+                            fields can be omitted.
+        :return:            A list with one boolean per query, in the same order.
+        """
+        return self._compiled_scope().grants_many(queries)
+
+    def renew(self, key: Optional['SigningKey'] = None, in_place: bool = False,
+              changes: Dict[str, Any] = None, client: Optional['RenewClient'] = None) -> 'DuckietownToken':
         """
         Renews this token using the given signing key or by reaching out to the remote Duckietown auth
         service if no keys are given.
@@ -197,8 +530,16 @@ class DuckietownToken(object):
         :param key:         (Optional) Signing key to use to sign the new token.
         :param in_place:    Update this very instance with the new token.
         :param changes:     Dictionary of fields to update in the new token. Only valid when 'key' is set.
+        :param client:      (Optional) Client of the renewal service (default: a shared client).
         :return:            A new token with the same scope and duration of the old one.
         """
+        if not metrics.enabled:
+            return self._renew(key, in_place, changes, client, None)
+        with metrics.Trace("renew", self._version) as trace:
+            return self._renew(key, in_place, changes, client, trace)
+
+    def _renew(self, key: Optional['SigningKey'], in_place: bool, changes: Optional[Dict[str, Any]],
+               client: Optional['RenewClient'], trace: Optional['Trace']) -> 'DuckietownToken':
         # make sure the token is renewable
         if not self.renewable:
             raise NotARenewableToken()
@@ -215,27 +556,60 @@ class DuckietownToken(object):
             fields.update(**(changes or {}))
             # generate new token with the given key
             new: DuckietownToken = self.generate(key, self.uid, **fields)
+            if trace is not None:
+                trace.lap("sign")
         else:
             if changes is not None:
                 raise ValueError("You can only specify a list of 'changes' when renewing a token using a "
                                  "provided 'key'")
             # request new token
-            try:
-                response = requests.get(
-                    url=TOKEN_RENEW_ONLINE_URL,
-                    headers={
-                        "Authorization": f"Token {self.as_string()}"
-                    }
-                ).json()
-            except requests.RequestException as e:
-                raise e
-            except requests.JSONDecodeError as e:
-                raise e
-            # ---
-            if not response["success"]:
-                raise GenericException(response["messages"])
-            # parse new token
-            new: DuckietownToken = DuckietownToken.from_string(response["result"]["token"])
+            if client is None:
+                from .renew import get_default_client
+                client = get_default_client()
+            new: DuckietownToken = client.renew(self)
+            if trace is not None:
+                trace.lap("request")
+        # apply in-place edits
+        if in_place:
+            # copy token content
+            self.copy_from(new)
+        # ---
+        return new
+
+    async def arenew(self, key: Optional['SigningKey'] = None, in_place: bool = False,
+                     changes: Dict[str, Any] = None, client: Optional['AsyncRenewClient'] = None,
+                     executor: Optional['Executor'] = None) -> 'DuckietownToken':
+        """
+        Asynchronous version of :py:meth:`dt_authentication.DuckietownToken.renew`.
+
+        Tokens renewed with a key are signed in the given executor, tokens renewed online are
+        requested through a non-blocking client that keeps a pool of connections.
+
+        :param key:         (Optional) Signing key to use to sign the new token.
+        :param in_place:    Update this very instance with the new token.
+        :param changes:     Dictionary of fields to update in the new token. Only valid when 'key' is set.
+        :param client:      (Optional) Client of the renewal service (default: one per event loop).
+        :param executor:    (Optional) Executor used for signing (default: the loop's default executor).
+        :return:            A new token with the same scope and duration of the old one.
+        """
+        # make sure the token is renewable
+        if not self.renewable:
+            raise NotARenewableToken()
+
+        if key is not None:
+            import asyncio
+            loop = asyncio.get_running_loop()
+            new: DuckietownToken = await loop.run_in_executor(
+                executor, functools.partial(self.renew, key, in_place=False, changes=changes)
+            )
+        else:
+            if changes is not None:
+                raise ValueError("You can only specify a list of 'changes' when renewing a token using a "
+                                 "provided 'key'")
+            if client is None:
+                from .aio import get_default_client
+                client = get_default_client()
+            new: DuckietownToken = await client.renew(self)
         # apply in-place edits
         if in_place:
             # copy token content
@@ -249,13 +623,14 @@ class DuckietownToken(object):
 
         :param other:   The token to duplicate.
         """
-        self._version = other._version
-        self._payload = other._payload
-        self._signature = other._signature
+        for field in self.__slots__:
+            object.__setattr__(self, field, getattr(other, field))
 
     @staticmethod
-    def from_string(s: str, vk: Optional[VerifyingKey] = None, allow_expired: bool = True) \
-            -> 'DuckietownToken':
+    def from_string(s: str, vk: Optional['VerifyingKey'] = None, allow_expired: bool = True,
+                    cache: Optional['TokenCache'] = None,
+                    negative_cache: Optional['InvalidTokenCache'] = None,
+                    max_length: int = MAX_TOKEN_LENGTH) -> 'DuckietownToken':
         """
         Decodes a Duckietown Token string into an instance of
         :py:class:`dt_authentication.DuckietownToken`.
@@ -264,70 +639,342 @@ class DuckietownToken(object):
             s:                  The Duckietown Token string.
             vk:                 Optional verification key if different from default
             allow_expired:      Do not throw exception if token expired
+            cache:              Optional cache of verified tokens to look the token up in
+            negative_cache:     Optional cache of recent failures, invalid tokens found in it are
+                                rejected right away
+            max_length:         Longest token string accepted, longer ones are rejected without
+                                being decoded (default: 8192 characters)
 
         Raises:
             InvalidToken:   The given token is not valid.
             ExpiredToken:   The given token is expired.
         """
-        # break token into 3 pieces, dt1-PAYLOAD-SIGNATURE
-        p = s.split("-")
+        if not metrics.enabled:
+            return DuckietownToken._decode(s, vk, allow_expired, cache, negative_cache, max_length, None)
+        with metrics.Trace("from_string") as trace:
+            return DuckietownToken._decode(s, vk, allow_expired, cache, negative_cache, max_length, trace)
+
+    @staticmethod
+    def _decode(s: str, vk: Optional['VerifyingKey'], allow_expired: bool,
+                cache: Optional['TokenCache'], negative_cache: Optional['InvalidTokenCache'],
+                max_length: int, trace: Optional['Trace']) -> 'DuckietownToken':
+        # the size comes first, oversized tokens are neither decoded nor remembered as failures
+        if len(s) > max_length:
+            raise InvalidToken(f"The token is longer than {max_length} characters")
+        # cached tokens were already verified and are not expired
+        if cache is not None:
+            token = cache.get(s, vk)
+            if trace is not None:
+                trace.lap("cache")
+            if token is not None:
+                if trace is not None:
+                    trace.version = token.version
+                return token
+        if negative_cache is None:
+            token = DuckietownToken._verify(s, vk, allow_expired, trace)
+        else:
+            # tokens that failed recently fail again, without being decoded and verified
+            message: Optional[str] = negative_cache.get(s, vk)
+            if trace is not None:
+                trace.lap("negative_cache")
+            if message is not None:
+                raise InvalidToken(message)
+            try:
+                token = DuckietownToken._verify(s, vk, allow_expired, trace)
+            except InvalidToken as e:
+                negative_cache.put(s, vk, str(e))
+                raise
+        # remember the verified token
+        if cache is not None:
+            cache.put(s, vk, token)
+        # ---
+        return token
+
+    @staticmethod
+    def _verify(s: str, vk: Optional['VerifyingKey'], allow_expired: bool,
+                trace: Optional['Trace']) -> 'DuckietownToken':
+        # cheap checks come first, the signature is verified only for well-formed, unexpired tokens
+        # break token into 3 pieces, dt1-PAYLOAD-SIGNATURE or dt3-PAYLOAD.SIGNATURE
+        version, _, body = s.partition("-")
+        binary: bool = version in BINARY_VERSIONS
+        p = body.split(".") if binary else s.split("-")[1:]
         # check number of components
-        if len(p) != 3:
+        if len(p) != 2:
+            if binary:
+                raise InvalidToken("The token should be comprised of a version, a payload and a signature")
             raise InvalidToken("The token should be comprised of three (dash-separated) parts")
         # unpack components
-        version, payload_base58, signature_base58 = p
+        payload_encoded, signature_encoded = p
         # check token version
         if version not in SUPPORTED_VERSIONS:
             raise InvalidToken("Duckietown Token version '%s' not supported" % version)
-        # decode payload and signature
-        payload_json = b58decode(payload_base58)
-        signature = b58decode(signature_base58)
+        if trace is not None:
+            trace.version = version
+        if len(signature_encoded) > MAX_SIGNATURE_LENGTH:
+            raise InvalidToken(f"The token signature is longer than {MAX_SIGNATURE_LENGTH} characters")
+        # - encoding
+        try:
+            if binary:
+                payload_raw = b64url_decode(payload_encoded)
+                signature = b64url_decode(signature_encoded)
+            else:
+                payload_raw = b58decode(payload_encoded)
+                signature = b58decode(signature_encoded)
+        except ValueError:
+            raise InvalidToken(f"Duckietown Token is not {'base64' if binary else 'base58'}-encoded")
+        if trace is not None:
+            trace.lap("decode")
+        # - payload
+        try:
+            payload = _decode_payload(version, payload_raw)
+        except ValueError:
+            raise InvalidToken("Duckietown Token has an invalid payload")
+        if not isinstance(payload, dict) or \
+                len(set(payload.keys()).intersection(PAYLOAD_FIELDS)) != len(PAYLOAD_FIELDS):
+            raise InvalidToken("Duckietown Token has an invalid payload")
+        # - expiration
+        try:
+            exp: Optional[int] = _parse_expiration(version, payload["exp"])
+        except (TypeError, ValueError):
+            raise InvalidToken("Duckietown Token has an invalid expiration date")
+        if not allow_expired and exp is not None and exp < time.time():
+            expiration: datetime.datetime = _as_datetime(exp)
+            raise ExpiredToken(
+                expiration,
+                f"This token is expired on '{str(expiration)}'. Obtain a new one"
+            )
+        if trace is not None:
+            trace.lap("parse")
         # verify token
         if not vk:
-            vk = VerifyingKey.from_pem(PUBLIC_KEYS[version])
-        is_valid = False
-        try:
-            is_valid = vk.verify(signature, payload_json)
-        except BadSignatureError:
-            pass
+            vk = get_verifying_key(version)
+        is_valid = get_backend().verify(vk, signature, _signed_message(version, payload_raw))
+        if trace is not None:
+            trace.lap("verify")
         # raise exception if the token is not valid
         if not is_valid:
             raise InvalidToken("Duckietown Token not valid")
-        # unpack payload
-        payload = json.loads(payload_json.decode("utf-8"))
-        if not isinstance(payload, dict) or \
-                len(set(payload.keys()).intersection(PAYLOAD_FIELDS)) != len(PAYLOAD_FIELDS):
-            raise InvalidToken("Duckietown Token has an invalid payload")
         # parse scope
         if "scope" in payload:
-            payload["scope"] = [Scope.parse(s) for s in payload["scope"]]
+            payload["scope"] = _parse_scopes(version, payload["scope"])
+            if trace is not None:
+                trace.lap("scope")
         # create token object
-        token = DuckietownToken(version, payload, signature)
-        # make sure the token is not expired
-        if not allow_expired and token.expired:
-            raise ExpiredToken(
-                token.expiration,
-                f"This token is expired on '{str(token.expiration)}'. Obtain a new one"
+        return DuckietownToken._build(version, payload, signature, exp, payload_raw, s)
+
+    @staticmethod
+    async def afrom_string(s: str, vk: Optional['VerifyingKey'] = None, allow_expired: bool = True,
+                           cache: Optional['TokenCache'] = None,
+                           negative_cache: Optional['InvalidTokenCache'] = None,
+                           executor: Optional['Executor'] = None,
+                           max_length: int = MAX_TOKEN_LENGTH) -> 'DuckietownToken':
+        """
+        Asynchronous version of :py:meth:`dt_authentication.DuckietownToken.from_string`.
+
+        Tokens found in an in-memory cache are returned right away, everything else is decoded and
+        verified in the given executor so that the event loop is never blocked by signature
+        verification. Caches that can block, e.g.,
+        :py:class:`dt_authentication.cache.SharedVerifiedTokenCache`, are used from the executor too.
+
+        Args:
+            s:                  The Duckietown Token string.
+            vk:                 Optional verification key if different from default
+            allow_expired:      Do not throw exception if token expired
+            cache:              Optional cache of verified tokens to look the token up in
+            negative_cache:     Optional cache of recent failures, invalid tokens found in it are
+                                rejected right away
+            executor:           Optional executor (default: the loop's default executor)
+            max_length:         Longest token string accepted (default: 8192 characters)
+
+        Raises:
+            InvalidToken:   The given token is not valid.
+            ExpiredToken:   The given token is expired.
+        """
+        if len(s) > max_length:
+            raise InvalidToken(f"The token is longer than {max_length} characters")
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if cache is not None and cache.blocking:
+            # lookups and insertions happen in the executor as well
+            return await loop.run_in_executor(
+                executor, functools.partial(DuckietownToken.from_string, s, vk=vk,
+                                            allow_expired=allow_expired, cache=cache,
+                                            negative_cache=negative_cache, max_length=max_length)
             )
-        # ---
+        if cache is not None:
+            token = cache.get(s, vk)
+            if token is not None:
+                return token
+        if negative_cache is not None:
+            message: Optional[str] = negative_cache.get(s, vk)
+            if message is not None:
+                raise InvalidToken(message)
+        try:
+            token = await loop.run_in_executor(
+                executor, functools.partial(DuckietownToken.from_string, s, vk=vk,
+                                            allow_expired=allow_expired, max_length=max_length)
+            )
+        except InvalidToken as e:
+            if negative_cache is not None:
+                negative_cache.put(s, vk, str(e))
+            raise
+        if cache is not None:
+            cache.put(s, vk, token)
         return token
 
+    @staticmethod
+    def verify_many(tokens: Iterable[str], vk: Optional['VerifyingKey'] = None, allow_expired: bool = True,
+                    chunk_size: int = 1024, max_length: int = MAX_TOKEN_LENGTH
+                    ) -> Iterator[Union['DuckietownToken', GenericException]]:
+        """
+        Decodes and verifies a stream of Duckietown Token strings.
+
+        Tokens are consumed in chunks of ``chunk_size`` strings, identical strings within a chunk
+        are verified only once and verifying keys are resolved once per token version. Results are
+        yielded in the same order as the input tokens, failures are yielded instead of raised.
+
+        Args:
+            tokens:             An iterable of Duckietown Token strings.
+            vk:                 Optional verification key if different from default
+            allow_expired:      Do not report expired tokens as failures
+            chunk_size:         Number of token strings consumed from the input at a time
+            max_length:         Longest token string accepted (default: 8192 characters)
+
+        Returns:
+            An iterator over instances of :py:class:`dt_authentication.DuckietownToken`,
+            :py:class:`dt_authentication.InvalidToken` or :py:class:`dt_authentication.ExpiredToken`.
+        """
+        if chunk_size <= 0:
+            raise ValueError("Argument 'chunk_size' must be a positive integer")
+        keys: Dict[str, 'VerifyingKey'] = {}
+        tokens = iter(tokens)
+        while True:
+            chunk: List[str] = list(itertools.islice(tokens, chunk_size))
+            if not chunk:
+                return
+            # group unique token strings by version
+            groups: Dict[str, List[str]] = {}
+            for s in dict.fromkeys(chunk):
+                version: str = s.split("-", 1)[0] if isinstance(s, str) else ""
+                groups.setdefault(version, []).append(s)
+            # verify each group with its own key
+            results: Dict[str, Union[DuckietownToken, GenericException]] = {}
+            for version, group in groups.items():
+                group_vk: Optional['VerifyingKey'] = vk
+                if group_vk is None and version in SUPPORTED_VERSIONS:
+                    if version not in keys:
+                        keys[version] = get_verifying_key(version)
+                    group_vk = keys[version]
+                for s in group:
+                    try:
+                        results[s] = DuckietownToken.from_string(s, vk=group_vk, allow_expired=allow_expired,
+                                                                 max_length=max_length)
+                    except (InvalidToken, ExpiredToken) as e:
+                        results[s] = e
+                    except (ValueError, TypeError, AttributeError) as e:
+                        results[s] = InvalidToken(f"Duckietown Token could not be decoded: {e}")
+            # yield results in input order, duplicates get their own token instance
+            yielded = set()
+            for s in chunk:
+                result = results[s]
+                if isinstance(result, DuckietownToken):
+                    if s in yielded:
+                        result = result._clone()
+                    yielded.add(s)
+                yield result
+
     @classmethod
-    def generate(cls, key: SigningKey, user_id: int, *,
+    def generate(cls, key: 'SigningKey', user_id: int, *,
                  # duration
                  days: int = 0, hours: int = 0, minutes: int = 0,
                  # payload
                  renewable: bool = False, data: Optional[dict] = None, scope: ScopeList = None,
                  # metadata
-                 version: str = DEFAULT_VERSION) -> 'DuckietownToken':
+                 version: str = DEFAULT_VERSION,
+                 # signature, the default entropy makes tokens reproducible
+                 entropy: Optional[Entropy] = _entropy) -> 'DuckietownToken':
+        # compile scope
+        compiled: Optional[CompiledScope] = None
+        if "scope" in SUPPORTED_FIELDS[version]:
+            compiled = _compile_scope(scope)
+        # a token expires only if the sum of its duration components is positive
+        expires: bool = (days + hours + minutes) > 0
+        duration: int = days * 1440 + hours * 60 + minutes
+        return cls._mint(key, version, user_id, expires, duration, renewable, data, compiled, entropy)
+
+    @classmethod
+    def generate_many(cls, key: 'SigningKey', specs: Iterable[TokenSpecLike], *,
+                      version: str = DEFAULT_VERSION, workers: Optional[int] = None,
+                      chunk_size: int = 256, entropy: Optional[Entropy] = None
+                      ) -> Iterator['DuckietownToken']:
+        """
+        Generates a stream of tokens, one for each of the given specifications.
+
+        Scope lists shared by multiple specifications are validated and compacted only once.
+        Tokens are yielded in the same order as the specifications.
+
+        Args:
+            key:            The signing key.
+            specs:          An iterable of :py:class:`dt_authentication.token.TokenSpec`, or of
+                            tuples/dictionaries with the same fields.
+            version:        Version of the tokens to generate.
+            workers:        (Optional) Number of worker processes to sign the tokens with.
+            chunk_size:     Number of specifications sent to a worker process at a time.
+            entropy:        (Optional) Source of randomness of the signatures, tokens are
+                            reproducible only if given. Without it, tokens are signed by the
+                            fastest signature backend.
+        """
+        if workers is not None:
+            from .parallel import TokenProcessPool
+            with TokenProcessPool(workers=workers, chunk_size=chunk_size) as pool:
+                yield from pool.generate_many(key, specs, version=version, entropy=entropy)
+            return
+        use_scope: bool = "scope" in SUPPORTED_FIELDS[version]
+        compiled_scopes: Dict[tuple, CompiledScope] = {}
+        for spec in specs:
+            spec = TokenSpec.of(spec)
+            compiled: Optional[CompiledScope] = None
+            if use_scope:
+                try:
+                    scope_key: Optional[tuple] = tuple(spec.scope or [])
+                    compiled = compiled_scopes.get(scope_key, None)
+                except TypeError:
+                    # unhashable scopes are compiled every time
+                    scope_key = None
+                if compiled is None:
+                    compiled = _compile_scope(spec.scope)
+                    if scope_key is not None:
+                        if len(compiled_scopes) >= MAX_COMPILED_SCOPES:
+                            compiled_scopes.clear()
+                        compiled_scopes[scope_key] = compiled
+            yield cls._mint(key, version, spec.uid, spec.duration > 0, spec.duration, spec.renewable,
+                            spec.data, compiled, entropy)
+
+    @classmethod
+    def _mint(cls, key: 'SigningKey', version: str, user_id: int, expires: bool, duration: int,
+              renewable: bool, data: Optional[dict], compiled: Optional[CompiledScope],
+              entropy: Optional[Entropy]) -> 'DuckietownToken':
+        if not metrics.enabled:
+            return cls._sign(key, version, user_id, expires, duration, renewable, data, compiled, entropy,
+                             None)
+        with metrics.Trace("generate", version) as trace:
+            return cls._sign(key, version, user_id, expires, duration, renewable, data, compiled, entropy,
+                             trace)
+
+    @classmethod
+    def _sign(cls, key: 'SigningKey', version: str, user_id: int, expires: bool, duration: int,
+              renewable: bool, data: Optional[dict], compiled: Optional[CompiledScope],
+              entropy: Optional[Entropy], trace: Optional['Trace']) -> 'DuckietownToken':
         # get supported fields for version
         fields = SUPPORTED_FIELDS[version]
         # compute expiration date
         exp = None
-        if (days + hours + minutes) > 0:
+        if expires:
             now = datetime.datetime.utcnow()
-            delta = datetime.timedelta(days=days, hours=hours, minutes=minutes)
-            exp = (now + delta).strftime(DATETIME_FORMAT[version])
+            delta = datetime.timedelta(minutes=duration)
+            fmt: Optional[str] = DATETIME_FORMAT[version]
+            expiration: datetime.datetime = now + delta
+            exp = expiration.strftime(fmt) if fmt is not None else calendar.timegm(expiration.utctimetuple())
         # initialize payload
         payload = {
             "uid": user_id,
@@ -335,22 +982,8 @@ class DuckietownToken(object):
         }
         # - scope
         if "scope" in fields:
-            # sanitize scope
-            if scope is None:
-                scope = []
-            # make sure the scope is valid
-            if not isinstance(scope, list):
-                raise ValueError("Argument 'scope' must be a list")
-            scope_parsed: List[Scope] = []
-            scope_encoded: List[Union[str, dict]] = []
-            for s in scope:
-                if not isinstance(s, Scope):
-                    s = Scope.parse(s)
-                scope_parsed.append(s)
-                scope_encoded.append(s.compact())
-            # ---
             # noinspection PyTypedDict
-            payload["scope"] = scope_encoded
+            payload["scope"] = list(compiled[1])
 
         # - data
         if "data" in fields:
@@ -358,25 +991,34 @@ class DuckietownToken(object):
             if data is not None:
                 if not isinstance(data, dict):
                     raise ValueError("Argument 'data' must be a dictionary")
-                try:
-                    json.dumps(data)
-                except TypeError:
-                    raise ValueError("The given 'data' is not JSON-serializable")
-                # ---
                 payload["data"] = data
 
         # - duration
         if "duration" in fields:
             # add duration (only if renewable)
             if renewable:
-                payload["duration"] = days * 1440 + hours * 60 + minutes
-
-        def entropy(numbytes):
-            e = b"duckietown is a place of relaxed introspection, and hub extends this place a lot"
-            return e[:numbytes]
+                payload["duration"] = duration
 
         # compile payload
-        payload_bytes = str.encode(json.dumps(payload, sort_keys=True))
-        signature = key.sign(payload_bytes, entropy=entropy)
+        if version in BINARY_VERSIONS:
+            try:
+                payload_bytes = _encode_binary_payload(payload, compiled[0])
+            except ValueError as e:
+                raise ValueError(f"The token payload is not serializable: {str(e)}")
+        else:
+            try:
+                payload_bytes = str.encode(json.dumps(payload, sort_keys=True))
+            except TypeError:
+                raise ValueError("The given 'data' is not JSON-serializable")
+        if trace is not None:
+            trace.lap("payload")
+        signature = get_backend().sign(key, _signed_message(version, payload_bytes), entropy=entropy)
+        if trace is not None:
+            trace.lap("sign")
 
-        return DuckietownToken(version, payload, signature)
+        token = DuckietownToken._build(version, payload, signature, _parse_expiration(version, exp),
+                                       payload_bytes)
+        if compiled is not None:
+            # the scope is already parsed
+            object.__setattr__(token, "_scopes", compiled[0])
+        return token
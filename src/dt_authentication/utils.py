@@ -1,10 +1,12 @@
 import os
-from typing import cast, Tuple
+from typing import cast, Tuple, TYPE_CHECKING
 
-# noinspection PyProtectedMember
-from ecdsa import SigningKey, VerifyingKey
+from dt_authentication.keys import get_verifying_key, load_signing_key, load_verifying_key
+from dt_authentication.token import DuckietownToken
 
-from dt_authentication.token import CURVE, DuckietownToken, PUBLIC_KEYS
+if TYPE_CHECKING:
+    # noinspection PyProtectedMember
+    from ecdsa import SigningKey, VerifyingKey
 
 __all__ = [
     "get_or_create_key_pair",
@@ -12,15 +14,18 @@ __all__ = [
 ]
 
 
-def get_verify_key(version: str) -> VerifyingKey:
-    return VerifyingKey.from_pem(PUBLIC_KEYS[version])
+def get_verify_key(version: str) -> 'VerifyingKey':
+    return get_verifying_key(version)
 
 
-def get_or_create_key_pair(version: str, path: str) -> Tuple[SigningKey, VerifyingKey]:
+def get_or_create_key_pair(version: str, path: str) -> Tuple['SigningKey', 'VerifyingKey']:
     """ Creates a key-pair """
     private: str = os.path.join(path, f"{version}-key-private.pem")
     public: str = os.path.join(path, f"{version}-key-public.pem")
     if not os.path.exists(private):
+        # noinspection PyProtectedMember
+        from ecdsa import SigningKey
+        from dt_authentication.token import CURVE
         sk0 = SigningKey.generate(curve=CURVE)
         with open(private, "wb") as f:
             p = cast(bytes, sk0.to_pem())  # docstring is wrong
@@ -30,12 +35,8 @@ def get_or_create_key_pair(version: str, path: str) -> Tuple[SigningKey, Verifyi
         with open(public, "wb") as f:
             q = cast(bytes, vk.to_pem())  # docstring is wrong
             f.write(q)
-    with open(private, "r") as _:
-        pem = _.read()
-    sk = SigningKey.from_pem(pem)
-    with open(public, "r") as _:
-        pem = _.read()
-    vk = VerifyingKey.from_pem(pem)
+    sk = load_signing_key(private)
+    vk = load_verifying_key(public)
     return sk, vk
 
 
@@ -0,0 +1,92 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional
+
+# noinspection PyProtectedMember
+from ecdsa.keys import SigningKey, VerifyingKey
+
+from dt_authentication import DuckietownToken, GenericException
+from dt_authentication.token import TOKEN_RENEW_ONLINE_PATH
+
+
+class RenewServer(object):
+    """
+    Local stand-in for the token renewal endpoint of the Duckietown hub.
+
+    Tokens are verified with ``vk`` and renewed with ``sk``. The first ``failures`` requests are
+    answered with a '503 Service Unavailable'.
+    """
+
+    def __init__(self, sk: SigningKey, vk: VerifyingKey, host: str = "127.0.0.1", port: int = 0,
+                 failures: int = 0):
+        self.sk: SigningKey = sk
+        self.vk: VerifyingKey = vk
+        self.failures: int = failures
+        self.requests: int = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately, do not let them wait for delayed ACKs
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                    fail: bool = server.requests <= server.failures
+                if fail:
+                    self._reply(503, {"success": False, "messages": ["Service Unavailable"]})
+                    return
+                if self.path != TOKEN_RENEW_ONLINE_PATH:
+                    self._reply(404, {"success": False, "messages": ["Not found"]})
+                    return
+                authorization: str = self.headers.get("Authorization", "")
+                try:
+                    token = DuckietownToken.from_string(authorization[len("Token "):], vk=server.vk)
+                    new = token.renew(server.sk)
+                except GenericException as e:
+                    self._reply(200, {"success": False, "messages": [type(e).__name__]})
+                    return
+                self._reply(200, {"success": True, "result": {"token": new.as_string()}})
+
+            def _reply(self, code: int, body: dict):
+                data: bytes = json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'RenewServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'RenewServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import unittest
+from typing import Set
+
+from dt_authentication import DuckietownToken, InvalidToken, ExpiredToken, VerifiedTokenCache, \
+    SharedVerifiedTokenCache
+from dt_authentication.utils import get_or_create_key_pair
+from dt_authentication_tests.renew_server import RenewServer
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+SAMPLE_TOKEN = "dt2-FifqUXc5FqUotojkAVpYG5JWebZRH6SUHM3DRgk1kRSKdq1uKcL9CFaNT9dRhCVKwFoEnMgm6Hu6v8-" \
+               "43dzqWFnWd8KBa1yev1g3UKnzVxZkkTbfaF8L9aHLLmc5bPTTmQhQzybqT8rKAADZa"
+SAMPLE_TOKEN_UID = -1
+
+
+def _aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise unittest.SkipTest("The 'aiohttp' package is not available")
+
+
+def test_afrom_string():
+    async def main():
+        token = await DuckietownToken.afrom_string(SAMPLE_TOKEN)
+        assert token.uid == SAMPLE_TOKEN_UID
+        try:
+            await DuckietownToken.afrom_string(SAMPLE_TOKEN, allow_expired=False)
+        except ExpiredToken:
+            pass
+        else:
+            raise AssertionError("An expired token was accepted")
+        try:
+            await DuckietownToken.afrom_string(SAMPLE_TOKEN.replace(SAMPLE_TOKEN[6:8], "XY"))
+        except InvalidToken:
+            pass
+        else:
+            raise AssertionError("An invalid token was accepted")
+
+    asyncio.run(main())
+
+
+def test_afrom_string_cache():
+    cache = VerifiedTokenCache()
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    s = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, days=1).as_string()
+
+    async def main():
+        await DuckietownToken.afrom_string(s, vk=vk, cache=cache)
+        await DuckietownToken.afrom_string(s, vk=vk, cache=cache)
+
+    asyncio.run(main())
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+
+
+class _RecordingCache(SharedVerifiedTokenCache):
+
+    def __init__(self, path: str):
+        super(_RecordingCache, self).__init__(path)
+        self.threads: Set[int] = set()
+
+    def get(self, s, vk=None):
+        self.threads.add(threading.get_ident())
+        return super(_RecordingCache, self).get(s, vk)
+
+    def put(self, s, vk, token):
+        self.threads.add(threading.get_ident())
+        super(_RecordingCache, self).put(s, vk, token)
+
+
+def test_afrom_string_shared_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+        cache = _RecordingCache(os.path.join(tmp, "tokens.db"))
+        s = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, days=1).as_string()
+
+        async def main():
+            await DuckietownToken.afrom_string(s, vk=vk, cache=cache)
+            await DuckietownToken.afrom_string(s, vk=vk, cache=cache)
+
+        asyncio.run(main())
+        assert cache.stats.hits == 1
+        assert cache.stats.misses == 1
+        # the database is never used from the event loop
+        assert threading.get_ident() not in cache.threads
+
+
+def test_arenew_with_key():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    token = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, minutes=5, renewable=True)
+
+    async def main():
+        return await token.arenew(sk)
+
+    new = asyncio.run(main())
+    assert new.payload_as_json() == token.payload_as_json()
+
+
+def test_arenew_online():
+    _aiohttp()
+    from dt_authentication.aio import AsyncRenewClient
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    tokens = [DuckietownToken.generate(sk, uid, minutes=5, renewable=True) for uid in range(16)]
+
+    async def main(base_url: str):
+        async with AsyncRenewClient(base_url, vk=vk) as client:
+            return await asyncio.gather(*[t.arenew(client=client, in_place=True) for t in tokens])
+
+    with RenewServer(sk, vk) as server:
+        renewed = asyncio.run(main(server.base_url))
+    assert [t.uid for t in renewed] == list(range(16))
+    assert all(t.renewable for t in tokens)
@@ -0,0 +1,139 @@
+import logging
+import os
+import tempfile
+import unittest
+from typing import List
+
+from base58 import b58decode
+from ecdsa import SigningKey, NIST256p
+
+from dt_authentication import DuckietownToken
+from dt_authentication.backends import available_backends, EcdsaBackend, get_backend, set_backend
+from dt_authentication.keys import get_verifying_key
+from dt_authentication.token import TokenSpec, _entropy
+from dt_authentication.utils import get_or_create_key_pair
+from dt_authentication_tests import tests_dt1, tests_dt2
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+def _backends():
+    backends = available_backends()
+    if "cryptography" not in backends:
+        raise unittest.SkipTest("The 'cryptography' package is not available")
+    return backends["ecdsa"], backends["cryptography"]
+
+
+def _mutations(s: str) -> List[str]:
+    version, payload, signature = s.split("-")
+    return [
+        s,
+        # tampered payload
+        s.replace(s[6:8], "XY"),
+        # tampered signature
+        f"{version}-{payload}-{signature[:-2]}{signature[-1]}{signature[-2]}",
+        # truncated and extended signature
+        f"{version}-{payload}-{signature[:-1]}",
+        f"{version}-{payload}-{signature}2",
+        # empty signature
+        f"{version}-{payload}-",
+    ]
+
+
+def _split(s: str):
+    version, payload, signature = s.split("-")
+    return version, b58decode(payload), b58decode(signature)
+
+
+def test_differential_samples():
+    ecdsa, openssl = _backends()
+    for sample in [tests_dt1.SAMPLE_TOKEN, tests_dt2.SAMPLE_TOKEN]:
+        for s in _mutations(sample):
+            version, payload, signature = _split(s)
+            vk = get_verifying_key(version)
+            assert ecdsa.verify(vk, signature, payload) == openssl.verify(vk, signature, payload), s
+    # the genuine samples are valid, everything else is not
+    version, payload, signature = _split(tests_dt2.SAMPLE_TOKEN)
+    assert openssl.verify(get_verifying_key(version), signature, payload)
+
+
+def test_differential_generated():
+    ecdsa, openssl = _backends()
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    for signer in [ecdsa, openssl]:
+        for uid in range(8):
+            payload = f'{{"exp": null, "uid": {uid}}}'.encode()
+            signature = signer.sign(sk, payload)
+            assert ecdsa.verify(vk, signature, payload)
+            assert openssl.verify(vk, signature, payload)
+            assert not ecdsa.verify(vk, signature, payload + b" ")
+            assert not openssl.verify(vk, signature, payload + b" ")
+    # random signatures
+    for _ in range(32):
+        signature = os.urandom(48)
+        assert ecdsa.verify(vk, signature, b"data") == openssl.verify(vk, signature, b"data")
+    # out of range integers
+    for signature in [b"\x00" * 48, b"\xff" * 48]:
+        assert ecdsa.verify(vk, signature, b"data") == openssl.verify(vk, signature, b"data")
+
+
+def test_unsupported_curve_falls_back():
+    _, openssl = _backends()
+    sk = SigningKey.generate(curve=NIST256p)
+    signature = openssl.sign(sk, b"data")
+    assert openssl.verify(sk.get_verifying_key(), signature, b"data")
+
+
+def test_entropy_is_honored():
+    ecdsa, openssl = _backends()
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    # signatures made with a given entropy are reproducible, whatever the backend
+    signature = ecdsa.sign(sk, b"data", entropy=_entropy)
+    assert openssl.sign(sk, b"data", entropy=_entropy) == signature
+    assert openssl.verify(vk, signature, b"data")
+    # and so are generated tokens
+    current = get_backend()
+    try:
+        set_backend(openssl)
+        tokens = [DuckietownToken.generate(sk, 42, days=-1).as_string() for _ in range(2)]
+        set_backend(ecdsa)
+        tokens.append(DuckietownToken.generate(sk, 42, days=-1).as_string())
+    finally:
+        set_backend(current)
+    assert len(set(tokens)) == 1
+
+
+def test_generate_many_uses_backend():
+    ecdsa, openssl = _backends()
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    specs = [TokenSpec(uid, duration=60) for uid in range(3)]
+    current = get_backend()
+    try:
+        set_backend(openssl)
+        openssl._private_keys.clear()
+        # without an entropy, tokens are signed by the backend itself
+        tokens = [t.as_string() for t in DuckietownToken.generate_many(sk, specs)]
+        assert len(openssl._private_keys) == 1
+        assert tokens != [t.as_string() for t in DuckietownToken.generate_many(sk, specs)]
+        assert [DuckietownToken.from_string(s, vk=vk).uid for s in tokens] == [0, 1, 2]
+        # with an entropy, tokens are reproducible
+        tokens = [t.as_string() for t in DuckietownToken.generate_many(sk, specs, entropy=_entropy)]
+        set_backend(ecdsa)
+        assert tokens == [t.as_string() for t in DuckietownToken.generate_many(sk, specs, entropy=_entropy)]
+    finally:
+        set_backend(current)
+
+
+def test_set_backend():
+    current = get_backend()
+    try:
+        set_backend("ecdsa")
+        assert isinstance(get_backend(), EcdsaBackend)
+        token = DuckietownToken.from_string(tests_dt2.SAMPLE_TOKEN)
+        assert token.uid == tests_dt2.SAMPLE_TOKEN_UID
+    finally:
+        set_backend(current)
@@ -0,0 +1,264 @@
+import logging
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import List
+
+from dt_authentication import DuckietownToken, InvalidToken, VerifiedTokenCache, InvalidTokenCache, \
+    SharedVerifiedTokenCache
+from dt_authentication.cache import _digest, _mac
+from dt_authentication.utils import get_or_create_key_pair
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+SAMPLE_TOKEN = "dt2-FifqUXc5FqUotojkAVpYG5JWebZRH6SUHM3DRgk1kRSKdq1uKcL9CFaNT9dRhCVKwFoEnMgm6Hu6v8-" \
+               "43dzqWFnWd8KBa1yev1g3UKnzVxZkkTbfaF8L9aHLLmc5bPTTmQhQzybqT8rKAADZa"
+SAMPLE_TOKEN_UID = -1
+
+
+def test_cache_hit():
+    cache = VerifiedTokenCache()
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+        s = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, days=1, scope=["auth"]).as_string()
+    token1 = DuckietownToken.from_string(s, vk=vk, cache=cache)
+    token2 = DuckietownToken.from_string(s, vk=vk, cache=cache)
+    assert token1 is not token2
+    assert token1.as_string() == token2.as_string()
+    assert token2.grants("auth")
+    stats = cache.stats
+    assert stats.hits == 1
+    assert stats.misses == 1
+    assert stats.entries == 1
+
+
+def test_cache_hits_are_isolated():
+    cache = VerifiedTokenCache()
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+        s = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, days=1, scope=["auth"],
+                                     data={"role": "user", "groups": ["a"]}).as_string()
+    # neither the token that filled the cache nor the hits can change what later hits see
+    token = DuckietownToken.from_string(s, vk=vk, cache=cache)
+    token.data["role"] = "admin"
+    for _ in range(2):
+        hit = DuckietownToken.from_string(s, vk=vk, cache=cache)
+        assert hit.data == {"role": "user", "groups": ["a"]}
+        hit.data["role"] = "admin"
+        hit.data["groups"].append("staff")
+        hit.scope.clear()
+        assert hit.grants("auth")
+    assert cache.stats.hits == 2
+
+
+def test_cache_keyed_by_vk():
+    cache = VerifiedTokenCache()
+    with tempfile.TemporaryDirectory() as tmp1, tempfile.TemporaryDirectory() as tmp2:
+        sk1, vk1 = get_or_create_key_pair("dt2", tmp1)
+        _, vk2 = get_or_create_key_pair("dt2", tmp2)
+    s = DuckietownToken.generate(sk1, SAMPLE_TOKEN_UID, days=1).as_string()
+    DuckietownToken.from_string(s, vk=vk1, cache=cache)
+    try:
+        DuckietownToken.from_string(s, vk=vk2, cache=cache)
+    except InvalidToken:
+        pass
+    else:
+        raise AssertionError("A token verified with one key was accepted with another key")
+
+
+def test_cache_expired_not_cached():
+    cache = VerifiedTokenCache()
+    # the sample token is long expired
+    DuckietownToken.from_string(SAMPLE_TOKEN, cache=cache)
+    assert len(cache) == 0
+
+
+def test_cache_lru_eviction():
+    cache = VerifiedTokenCache(max_entries=2, shards=1)
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    tokens: List[str] = [DuckietownToken.generate(sk, uid, days=1).as_string() for uid in range(3)]
+    DuckietownToken.from_string(tokens[0], vk=vk, cache=cache)
+    DuckietownToken.from_string(tokens[1], vk=vk, cache=cache)
+    # touch the first token, the second one becomes the least recently used
+    assert cache.get(tokens[0], vk) is not None
+    DuckietownToken.from_string(tokens[2], vk=vk, cache=cache)
+    assert cache.get(tokens[1], vk) is None
+    assert cache.get(tokens[0], vk) is not None
+    assert cache.stats.evictions == 1
+
+
+def test_cache_threads():
+    cache = VerifiedTokenCache(max_entries=8)
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    tokens: List[str] = [DuckietownToken.generate(sk, uid, days=1).as_string() for uid in range(16)]
+    errors: List[BaseException] = []
+
+    def worker():
+        try:
+            for s in tokens * 2:
+                DuckietownToken.from_string(s, vk=vk, cache=cache)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert len(cache) <= 8
+
+
+def test_negative_cache():
+    from dt_authentication.backends import get_backend, set_backend, EcdsaBackend
+
+    class CountingBackend(EcdsaBackend):
+        calls = 0
+
+        def verify(self, vk, signature, data):
+            CountingBackend.calls += 1
+            return super(CountingBackend, self).verify(vk, signature, data)
+
+    cache = InvalidTokenCache()
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    payload, signature = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, days=1).as_string()[4:].split("-")
+    tampered = f"dt2-{payload}-{signature[::-1]}"
+    current = get_backend()
+    set_backend(CountingBackend())
+    try:
+        messages = []
+        for _ in range(3):
+            try:
+                DuckietownToken.from_string(tampered, vk=vk, negative_cache=cache)
+            except InvalidToken as e:
+                messages.append(str(e))
+            else:
+                raise AssertionError("A tampered token was accepted")
+        # the signature was verified only once, the original message is preserved
+        assert CountingBackend.calls == 1
+        assert messages == ["Duckietown Token not valid"] * 3
+        # failures are recorded per verifying key
+        try:
+            DuckietownToken.from_string(tampered, negative_cache=cache)
+        except InvalidToken:
+            pass
+        assert CountingBackend.calls == 2
+    finally:
+        set_backend(current)
+    stats = cache.stats
+    assert stats.hits == 2
+    assert stats.misses == 2
+    assert len(cache) == 2
+
+
+def test_negative_cache_bounds():
+    cache = InvalidTokenCache(max_entries=4, ttl=0.05, shards=1)
+    for i in range(10):
+        cache.put(f"dt2-{i}-x" * 1000, None, "Duckietown Token not valid" * 100)
+    assert len(cache) == 4
+    assert cache.stats.evictions == 6
+    # entries do not depend on the size of the token, messages are truncated
+    assert cache.stats.bytes <= 4 * 512
+    assert cache.get("dt2-9-x" * 1000) is not None
+    assert cache.get("dt2-0-x" * 1000) is None
+    time.sleep(0.06)
+    assert cache.get("dt2-9-x" * 1000) is None
+    assert len(cache) == 3
+
+
+def _verify_in_child(path: str, s: str, vk):
+    cache = SharedVerifiedTokenCache(path)
+    DuckietownToken.from_string(s, vk=vk, cache=cache)
+    assert cache.stats.misses == 1
+
+
+def test_shared_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+        path: str = os.path.join(tmp, "tokens.db")
+        s = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, days=1, scope=["auth"]).as_string()
+        # a worker process verifies the token
+        process = multiprocessing.get_context("spawn").Process(target=_verify_in_child, args=(path, s, vk))
+        process.start()
+        process.join()
+        assert process.exitcode == 0
+        # another process finds it verified
+        cache = SharedVerifiedTokenCache(path)
+        token = DuckietownToken.from_string(s, vk=vk, cache=cache)
+        assert token.as_string() == s
+        assert token.grants("auth")
+        assert token.expiration_timestamp is not None
+        stats = cache.stats
+        assert stats.hits == 1
+        assert stats.misses == 0
+        assert stats.entries == 1
+        # entries are keyed by verifying key
+        os.makedirs(os.path.join(tmp, "other"))
+        _, vk2 = get_or_create_key_pair("dt2", os.path.join(tmp, "other"))
+        assert cache.get(s, vk2) is None
+        # expired tokens are not cached
+        DuckietownToken.from_string(SAMPLE_TOKEN, cache=cache)
+        assert len(cache) == 1
+
+
+def test_shared_cache_eviction():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+        cache = SharedVerifiedTokenCache(os.path.join(tmp, "tokens.db"), max_entries=2, sweep_every=1)
+        # tokens expiring sooner are evicted first
+        tokens: List[str] = [DuckietownToken.generate(sk, uid, days=days).as_string()
+                             for uid, days in enumerate([3, 1, 2])]
+        for s in tokens:
+            DuckietownToken.from_string(s, vk=vk, cache=cache)
+        assert len(cache) == 2
+        assert cache.get(tokens[1], vk) is None
+        assert cache.get(tokens[0], vk) is not None
+        assert cache.stats.evictions == 1
+        cache.clear()
+        assert len(cache) == 0
+
+
+def test_shared_cache_untrusted_entries():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+        path: str = os.path.join(tmp, "tokens.db")
+        cache = SharedVerifiedTokenCache(path)
+        assert os.stat(path).st_mode & 0o777 == 0o600
+        assert os.stat(path + ".key").st_mode & 0o777 == 0o600
+        tokens: List[str] = [DuckietownToken.generate(sk, uid, days=1, scope=["auth"]).as_string()
+                             for uid in range(2)]
+        for s in tokens:
+            DuckietownToken.from_string(s, vk=vk, cache=cache)
+        assert cache.get(tokens[0], vk) is not None
+        # entries written without the secret, e.g. forged tokens, and corrupted entries are misses
+        conn = sqlite3.connect(path)
+        conn.execute("UPDATE tokens SET payload = ? WHERE payload = ?",
+                     (b'{"exp": null, "uid": 1, "scope": ["admin"]}', cache._get(tokens[0], vk)._raw))
+        key: bytes = _digest(tokens[1], vk)
+        token = cache._get(tokens[1], vk)
+        mac: bytes = _mac(cache._secret, key, "dt2", b"{", token.signature, token.expiration_timestamp)
+        conn.execute("UPDATE tokens SET payload = ?, mac = ? WHERE key = ?", (b"{", mac, key))
+        conn.commit()
+        conn.close()
+        hits: int = cache.stats.hits
+        assert cache.get(tokens[0], vk) is None
+        assert cache.get(tokens[1], vk) is None
+        assert cache.stats.hits == hits
+        # the tokens are verified again
+        assert DuckietownToken.from_string(tokens[0], vk=vk, cache=cache).grants("auth")
+        # files other users can access are rejected
+        os.chmod(path, 0o666)
+        try:
+            SharedVerifiedTokenCache(path)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("A database accessible by other users was accepted")
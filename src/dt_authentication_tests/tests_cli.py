@@ -0,0 +1,135 @@
+import io
+import json
+import logging
+import os
+import tempfile
+from typing import List
+
+from dt_authentication import DuckietownToken
+from dt_authentication.cli import cli_verify, cli_generate, logger as cli_logger
+from dt_authentication.utils import get_or_create_key_pair
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+SAMPLE_TOKEN = "dt2-FifqUXc5FqUotojkAVpYG5JWebZRH6SUHM3DRgk1kRSKdq1uKcL9CFaNT9dRhCVKwFoEnMgm6Hu6v8-" \
+               "43dzqWFnWd8KBa1yev1g3UKnzVxZkkTbfaF8L9aHLLmc5bPTTmQhQzybqT8rKAADZa"
+
+
+def _run(fcn, args: List[str]) -> int:
+    try:
+        fcn(args)
+    except SystemExit as e:
+        return e.code
+    return 0
+
+
+def test_verify_batch():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+        tokens = [DuckietownToken.generate(sk, uid, days=1, scope=["auth"]).as_string() for uid in range(5)]
+        lines = tokens[:2] + ["", "dt2-aa-bb"] + tokens[2:]
+        vk_path = os.path.join(tmp, "dt2-key-public.pem")
+        in_path = os.path.join(tmp, "tokens.txt")
+        with open(in_path, "wt") as fout:
+            fout.write("\n".join(lines) + "\n")
+        for workers in [[], ["--workers", "2", "--chunk-size", "2"]]:
+            out_path = os.path.join(tmp, "out.jsonl")
+            code = _run(cli_verify, ["--vk", vk_path, "--input", in_path, "--output", out_path] + workers)
+            assert code == 1
+            with open(out_path, "rt") as fin:
+                records = [json.loads(line) for line in fin]
+            assert [r["line"] for r in records] == [1, 2, 4, 5, 6, 7]
+            assert [r["valid"] for r in records] == [True, True, False, True, True, True]
+            assert [r["uid"] for r in records if r["valid"]] == list(range(5))
+            assert records[0]["version"] == "dt2"
+            assert records[0]["scopes"] == ["auth"]
+            assert records[0]["expired"] is False
+            assert records[2]["error"]
+
+
+def test_verify_batch_all_valid():
+    with tempfile.TemporaryDirectory() as tmp:
+        in_path = os.path.join(tmp, "tokens.txt")
+        out_path = os.path.join(tmp, "out.jsonl")
+        with open(in_path, "wt") as fout:
+            fout.write(SAMPLE_TOKEN + "\n")
+        assert _run(cli_verify, ["--input", in_path, "--output", out_path]) == 0
+        with open(out_path, "rt") as fin:
+            record = json.loads(fin.read())
+        assert record["uid"] == -1
+        assert record["expired"] is True
+        assert record["exp"] == "2024-05-06T02:48:00"
+
+
+def test_generate_bulk():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+        sk_path = os.path.join(tmp, "dt2-key-private.pem")
+        csv_path = os.path.join(tmp, "specs.csv")
+        with open(csv_path, "wt") as fout:
+            fout.write("uid,scope,data,duration,renewable,version\n"
+                       "1,\"auth,read:data:1\",,60,true,\n"
+                       "2,,\"{\"\"a\"\": 1}\",0,false,dt2\n"
+                       "3,,,,,dt1\n")
+        jsonl_path = os.path.join(tmp, "specs.jsonl")
+        with open(jsonl_path, "wt") as fout:
+            for uid in range(1, 4):
+                fout.write(json.dumps({"uid": uid, "scope": ["auth"], "duration": 10}) + "\n")
+        results = []
+        for spec, workers in [(csv_path, []), (jsonl_path, ["--workers", "2"])]:
+            out_path = os.path.join(tmp, "out.jsonl")
+            code = _run(cli_generate, ["--key", sk_path, "--spec", spec, "--output", out_path] + workers)
+            assert code == 0
+            with open(out_path, "rt") as fin:
+                records = [json.loads(line) for line in fin]
+            assert [r["uid"] for r in records] == [1, 2, 3]
+            for record in records:
+                token = DuckietownToken.from_string(record["token"], vk=vk)
+                assert token.uid == record["uid"]
+                assert token.version == record["version"]
+            results.append(records)
+    csv_records, jsonl_records = results
+    # CSV
+    assert csv_records[0]["scopes"] == ["auth", "read:data:1"]
+    assert csv_records[0]["renewable"] is True
+    assert DuckietownToken.from_string(csv_records[1]["token"], vk=vk).data == {"a": 1}
+    assert csv_records[1]["exp"] is None
+    assert csv_records[2]["version"] == "dt1"
+    # JSONL
+    assert [r["scopes"] for r in jsonl_records] == [["auth"]] * 3
+    assert all(r["exp"] is not None for r in jsonl_records)
+
+
+def test_generate_bulk_invalid_specs():
+    with tempfile.TemporaryDirectory() as tmp:
+        get_or_create_key_pair("dt2", tmp)
+        sk_path = os.path.join(tmp, "dt2-key-private.pem")
+        jsonl_path = os.path.join(tmp, "specs.jsonl")
+        out_path = os.path.join(tmp, "out.jsonl")
+        # malformed lines and rows that are not objects are reported with their line number
+        for line in ["{\"uid\": ", "[1, 2]", "{\"scope\": [\"auth\"]}"]:
+            with open(jsonl_path, "wt") as fout:
+                fout.write(json.dumps({"uid": 1}) + "\n\n" + line + "\n")
+            logs = io.StringIO()
+            handler = logging.StreamHandler(logs)
+            cli_logger.addHandler(handler)
+            try:
+                code = _run(cli_generate, ["--key", sk_path, "--spec", jsonl_path, "--output", out_path])
+            finally:
+                cli_logger.removeHandler(handler)
+            assert code == 3
+            assert "on line 3:" in logs.getvalue()
+
+
+def test_generate_default_version():
+    import contextlib
+    import io
+    with tempfile.TemporaryDirectory() as tmp:
+        get_or_create_key_pair("dt2", tmp)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            code = _run(cli_generate, ["--key", os.path.join(tmp, "dt2-key-private.pem"), "--uid", "7"])
+    assert code == 0
+    assert "dt2-" in out.getvalue()
@@ -0,0 +1,114 @@
+import base64
+import logging
+import os
+import random
+
+import base58
+
+from dt_authentication import cbor, codec
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+def test_differential_random():
+    rng = random.Random(0)
+    for _ in range(5000):
+        data = os.urandom(rng.randint(0, 160))
+        if rng.random() < 0.3:
+            data = b"\0" * rng.randint(1, 4) + data
+        encoded = base58.b58encode(data)
+        assert codec.b58encode(data) == encoded
+        assert codec.b58encode(memoryview(data)) == encoded
+        assert codec.b58decode(encoded) == data
+        assert codec.b58decode(encoded.decode("ascii")) == data
+        assert codec.b58decode(memoryview(encoded)) == data
+
+
+def test_edge_cases():
+    for data in [b"", b"\0", b"\0\0\0", b"\0\1", b"\xff" * 64]:
+        encoded = base58.b58encode(data)
+        assert codec.b58encode(data) == encoded
+        assert codec.b58decode(encoded) == base58.b58decode(encoded)
+    for s in ["", "1", "111", "2", "z", "1z", "zzzzzzzzzzzzzzzzzzzzz", "abc \n"]:
+        assert codec.b58decode(s) == base58.b58decode(s)
+
+
+def test_invalid_characters():
+    for s in ["0", "O", "I", "l", "abc+", "ab c", "é"]:
+        try:
+            base58.b58decode(s)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"Reference accepted '{s}'")
+        try:
+            codec.b58decode(s)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"Invalid string '{s}' was decoded")
+
+
+def test_b64url():
+    rng = random.Random(0)
+    for _ in range(1000):
+        data = os.urandom(rng.randint(0, 80))
+        encoded = base64.urlsafe_b64encode(data).rstrip(b"=")
+        assert codec.b64url_encode(data) == encoded
+        assert codec.b64url_decode(encoded) == data
+        assert codec.b64url_decode(encoded.decode("ascii")) == data
+    # wrong length, padding, standard alphabet, non-zero trailing bits
+    for s in ["A", "AB=", "ab+c", "ab/c", "ab c", "AB", "é"]:
+        try:
+            codec.b64url_decode(s)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"Invalid string '{s}' was decoded")
+
+
+def test_cbor_vectors():
+    # examples from RFC 8949, Appendix A
+    vectors = [
+        (0, "00"), (23, "17"), (24, "1818"), (1000, "1903e8"), (1000000, "1a000f4240"),
+        (18446744073709551615, "1bffffffffffffffff"), (-1, "20"), (-1000, "3903e7"),
+        (1.1, "fb3ff199999999999a"), (False, "f4"), (True, "f5"), (None, "f6"), ("", "60"),
+        ("IETF", "6449455446"), ("\u00fc", "62c3bc"), ([], "80"), ([1, [2, 3], [4, 5]], "8301820203820405"),
+        ({}, "a0"), ({"a": 1, "b": [2, 3]}, "a26161016162820203"),
+    ]
+    for value, encoded in vectors:
+        assert cbor.dumps(value).hex() == encoded
+        assert cbor.loads(bytes.fromhex(encoded)) == value
+
+
+def test_cbor_invalid():
+    for encoded in [
+        "", "18", "1b00", "62c3", "8201", "a101",
+        # trailing data, byte strings, indefinite lengths, tags, undefined
+        "0000", "4161", "9fff", "c074", "f7",
+        # non-string keys, invalid UTF-8
+        "a1f600", "61ff",
+        # declared length larger than the data
+        "9bffffffffffffffff",
+    ]:
+        try:
+            cbor.loads(bytes.fromhex(encoded))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"Invalid data '{encoded}' was decoded")
+    # deeply nested data
+    try:
+        cbor.loads(b"\x81" * 100 + b"\x00")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Deeply nested data was decoded")
+    for value in [b"bytes", {1, 2}, 2 ** 64, {"a": 1, 2: 3}]:
+        try:
+            cbor.dumps(value)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"Unsupported value {value!r} was encoded")
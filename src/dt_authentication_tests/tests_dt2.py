@@ -4,7 +4,7 @@ import logging
 import tempfile
 from typing import List
 
-from dt_authentication import DuckietownToken, InvalidToken
+from dt_authentication import DuckietownToken, InvalidToken, ExpiredToken
 from dt_authentication.exceptions import NotARenewableToken
 from dt_authentication.token import Scope
 from dt_authentication.utils import get_id_from_token, get_or_create_key_pair
@@ -229,3 +229,292 @@ def test_renew_online():
         pass
     else:
         raise Exception("We managed to renew a token that was not supposed to be renewable")
+
+
+def test_verify_many():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+        valid = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, days=1).as_string()
+        never = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, minutes=-1).as_string()
+    tampered = valid.replace(valid[6:8], "XY")
+    tokens = [valid, "garbage", tampered, valid, "dt2-0OIl-0OIl"]
+    results = list(DuckietownToken.verify_many(tokens, vk=vk, allow_expired=False, chunk_size=2))
+    assert len(results) == len(tokens)
+    assert isinstance(results[0], DuckietownToken)
+    assert isinstance(results[1], InvalidToken)
+    assert isinstance(results[2], InvalidToken)
+    assert isinstance(results[3], DuckietownToken)
+    assert results[0] is not results[3]
+    assert results[0].as_string() == results[3].as_string()
+    assert isinstance(results[4], InvalidToken)
+    # never-expiring tokens are not reported as expired
+    assert isinstance(list(DuckietownToken.verify_many([never], vk=vk, allow_expired=False))[0],
+                      DuckietownToken)
+
+
+def test_verify_many_default_keys():
+    results = list(DuckietownToken.verify_many([SAMPLE_TOKEN, SAMPLE_TOKEN], allow_expired=False))
+    assert all(isinstance(r, ExpiredToken) for r in results)
+    results = list(DuckietownToken.verify_many(iter([SAMPLE_TOKEN])))
+    assert results[0].uid == SAMPLE_TOKEN_UID
+
+
+def test_grants_many():
+    s: List[Scope] = [Scope("auth"), Scope("read", "class"), Scope("write", "class", "55"),
+                      Scope("create", "class", "55", "hub.duckietown.com")]
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+        token = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, scope=s)
+        token = DuckietownToken.from_string(token.as_string(), vk=vk)
+    queries = [("auth",), ("read",), ("read", "class", "12"), ("write", "class", "55"),
+               ("write", "class", "56"), ("create", "class", "55"),
+               ("create", "class", "55", "hub.duckietown.com")]
+    assert token.grants_many(queries) == [True, False, True, True, False, False, True]
+
+
+def test_grants_index_matches_scan():
+    values = [None, "a", "b"]
+    scopes: List[Scope] = [Scope("x"), Scope("x", "a"), Scope("x", "a", "b"), Scope("x", None, None, "a"),
+                           Scope("x", "b", "a", "b"), Scope("y", "b")]
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    for n in range(len(scopes) + 1):
+        token = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, scope=scopes[n:])
+        for action in ["x", "y", "z"]:
+            for r in values:
+                for i in values:
+                    for srv in values:
+                        expected = any(s.grants(action, r, i, srv) for s in scopes[n:])
+                        assert token.grants(action, r, i, srv) == expected
+
+
+def test_grants_no_wildcards():
+    # a trailing '*' is an ordinary character in dt2 tokens, wildcards came with dt3
+    scopes: List[Scope] = [Scope.parse("read:duckiebot:db-*"), Scope("x", "*"), Scope("y", "a*", "b*", "c*")]
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+        token = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, scope=scopes)
+        token = DuckietownToken.from_string(token.as_string(), vk=vk)
+    assert token.grants("read", "duckiebot", "db-*")
+    assert not token.grants("read", "duckiebot", "db-01")
+    assert token.grants("x", "*")
+    assert not token.grants("x", "a")
+    values = [None, "a", "ab", "b", "c", "*", "a*", "b*", "c*"]
+    for action in ["x", "y"]:
+        for r in values:
+            for i in values:
+                for srv in values:
+                    expected = any(s.grants(action, r, i, srv) for s in scopes)
+                    assert token.grants(action, r, i, srv) == expected
+
+
+def test_grants_non_string_fields():
+    # dictionary scopes can carry values of other types, checking them must not fail
+    scope = {"action": "write", "resource": "class", "identifier": 3, "service": "hub"}
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+        token = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, scope=[scope])
+        token = DuckietownToken.from_string(token.as_string(), vk=vk)
+    assert token.scope[0].identifier == 3
+    assert token.grants("write", "class", 3, "hub") is True
+    assert token.grants("write", "class", "3", "hub") is False
+    assert token.scope[0].grants("write", "class", 3, "hub", wildcards=True)
+
+
+def test_scope_interned():
+    import copy
+    import dataclasses
+    import pickle
+    # identical scopes share one instance, whatever they were built from
+    s: Scope = Scope.parse("write:class:55")
+    assert s is Scope("write", "class", "55")
+    assert s is Scope.parse({"action": "write", "resource": "class", "identifier": "55"})
+    assert s is pickle.loads(pickle.dumps(s))
+    assert s is copy.deepcopy(s)
+    # scopes are hashable and immutable
+    assert len({s, Scope.parse("write:class:55"), Scope("write", "class")}) == 2
+    try:
+        s.action = "read"
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("Scopes should be immutable")
+    # the dictionary form can be changed by the caller
+    s = Scope("create", "class", "55", "hub.duckietown.com")
+    s.compact()["action"] = "delete"
+    assert s.compact()["action"] == "create"
+    assert str(s) == json.dumps(s.compact(), sort_keys=True)
+    # invalid scopes are still rejected
+    try:
+        Scope.parse("create::55:x")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Scopes with more than three parts should be rejected")
+    # the helpers of 'dataclasses' still work on scopes
+    s = Scope.parse("write:class:55")
+    assert dataclasses.asdict(s) == \
+        {"action": "write", "resource": "class", "identifier": "55", "service": None}
+    assert dataclasses.replace(s, identifier="56") is Scope("write", "class", "56")
+
+
+def test_precheck_rejections():
+    from base58 import b58encode
+    from dt_authentication.backends import EcdsaBackend, get_backend, set_backend
+
+    class CountingBackend(EcdsaBackend):
+        calls: int = 0
+
+        def verify(self, vk, signature, data) -> bool:
+            CountingBackend.calls += 1
+            return super(CountingBackend, self).verify(vk, signature, data)
+
+    signature = SAMPLE_TOKEN.split("-")[2]
+    expired_payload = b58encode(b'{"exp": "2020-01-01/00:00", "uid": 1}').decode()
+    rejected = [
+        # not base58
+        "dt2-0OIl-0OIl",
+        # oversized
+        "dt2-" + "a" * 10000 + "-" + signature,
+        "dt2-abc-" + "a" * 1000,
+        # not JSON
+        "dt2-" + b58encode(b"not json").decode() + "-" + signature,
+        "dt2-" + b58encode(b"\xff\xfe").decode() + "-" + signature,
+        # missing fields
+        "dt2-" + b58encode(b'{"uid": 1}').decode() + "-" + signature,
+        "dt2-" + b58encode(b'[1, 2]').decode() + "-" + signature,
+        # bad expiration
+        "dt2-" + b58encode(b'{"exp": "tomorrow", "uid": 1}').decode() + "-" + signature,
+    ]
+    current = get_backend()
+    set_backend(CountingBackend())
+    try:
+        for s in rejected:
+            try:
+                DuckietownToken.from_string(s, allow_expired=False)
+            except InvalidToken:
+                pass
+            else:
+                raise AssertionError(f"Token '{s}' was accepted")
+        try:
+            DuckietownToken.from_string(f"dt2-{expired_payload}-{signature}", allow_expired=False)
+        except ExpiredToken:
+            pass
+        else:
+            raise AssertionError("An expired token was accepted")
+        assert CountingBackend.calls == 0
+        # the expiration is not checked when expired tokens are allowed
+        try:
+            DuckietownToken.from_string(f"dt2-{expired_payload}-{signature}")
+        except InvalidToken:
+            pass
+        assert CountingBackend.calls == 1
+    finally:
+        set_backend(current)
+
+
+def test_max_length():
+    from dt_authentication.token import MAX_TOKEN_LENGTH
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    # tokens with large data can exceed the default limit
+    s: str = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, data={"blob": "x" * 8000}).as_string()
+    assert len(s) > MAX_TOKEN_LENGTH
+    for kwargs in [{}, {"max_length": len(s) - 1}]:
+        try:
+            DuckietownToken.from_string(s, vk=vk, **kwargs)
+        except InvalidToken:
+            pass
+        else:
+            raise AssertionError("A token longer than the limit was accepted")
+    assert DuckietownToken.from_string(s, vk=vk, max_length=len(s)).data == {"blob": "x" * 8000}
+    results = list(DuckietownToken.verify_many([s], vk=vk, max_length=len(s)))
+    assert results[0].uid == SAMPLE_TOKEN_UID
+    assert isinstance(list(DuckietownToken.verify_many([s], vk=vk))[0], InvalidToken)
+
+
+def test_deeply_nested_payload():
+    from base58 import b58encode
+    # payloads are parsed before the signature is checked, nesting must not break the parser
+    signature = SAMPLE_TOKEN.split("-")[2]
+    nested = "dt2-" + b58encode(b"[" * 1000 + b"]" * 1000).decode() + "-" + signature
+    try:
+        DuckietownToken.from_string(nested)
+    except InvalidToken:
+        pass
+    else:
+        raise AssertionError("A deeply nested payload was accepted")
+    # a batch reports the token as invalid and goes on
+    results = list(DuckietownToken.verify_many([nested, SAMPLE_TOKEN]))
+    assert isinstance(results[0], InvalidToken)
+    assert results[1].uid == SAMPLE_TOKEN_UID
+
+
+def test_immutable():
+    import pickle
+    token = DuckietownToken.from_string(SAMPLE_TOKEN)
+    for field in ["_payload", "uid", "other"]:
+        try:
+            setattr(token, field, None)
+        except AttributeError:
+            pass
+        else:
+            raise AssertionError(f"Field '{field}' of an immutable token was changed")
+    # the payload is a copy, a plain dictionary
+    payload = token.payload
+    payload["uid"] = 2
+    assert token.uid == SAMPLE_TOKEN_UID
+    payload.pop("scope", None)
+    assert json.loads(json.dumps(payload))["uid"] == 2
+    assert token.expiration_timestamp == 1714963680
+    # pickling
+    token2 = pickle.loads(pickle.dumps(token))
+    assert token2.as_string() == token.as_string()
+    assert token2.expiration == token.expiration
+
+
+def test_as_string_original():
+    # decoded tokens return the very string they were decoded from
+    token = DuckietownToken.from_string(SAMPLE_TOKEN)
+    assert token.as_string() is token.as_string()
+    assert token.as_string() == SAMPLE_TOKEN
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    token1 = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, minutes=5, renewable=True, scope=["auth"])
+    token2 = DuckietownToken(token1.version, dict(token1.payload), token1.signature)
+    assert token1.as_string() == token2.as_string()
+    # in-place renewals replace the string
+    token3 = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID + 1, minutes=5, renewable=True)
+    token1.copy_from(token3)
+    assert token1.as_string() == token3.as_string()
+
+
+def test_generate_many():
+    import pickle
+    from dt_authentication import TokenSpec
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    shared = ["auth", "read:data:1"]
+    specs = [
+        TokenSpec(1, scope=shared, duration=5),
+        (2, shared, {"a": 1}, 60, True),
+        {"uid": 3, "scope": shared},
+    ]
+    tokens = list(DuckietownToken.generate_many(sk, specs))
+    assert [t.uid for t in tokens] == [1, 2, 3]
+    assert [str(s) for s in tokens[0].scope] == [str(Scope.parse(s)) for s in shared]
+    assert tokens[1].payload["data"] == {"a": 1}
+    assert tokens[1].renewable and tokens[1].payload["duration"] == 60
+    assert tokens[2].expiration is None
+    for token in tokens:
+        token1 = DuckietownToken.from_string(token.as_string(), vk=vk)
+        assert token1.payload_as_json() == token.payload_as_json()
+        token2 = pickle.loads(pickle.dumps(token))
+        assert token2.as_string() == token.as_string()
+    # data must be JSON-serializable
+    try:
+        list(DuckietownToken.generate_many(sk, [TokenSpec(4, data={"a": object()})]))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Tokens with non-serializable data were generated")
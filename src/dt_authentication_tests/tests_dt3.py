@@ -0,0 +1,223 @@
+import json
+import logging
+import tempfile
+import time
+from typing import List
+
+from dt_authentication import DuckietownToken, InvalidToken, ExpiredToken
+from dt_authentication.codec import b64url_encode
+from dt_authentication.token import Scope, _entropy
+from dt_authentication.utils import get_or_create_key_pair
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+SAMPLE_TOKEN_UID = 42
+SAMPLE_SCOPE = [
+    "auth", "read:duckiebot:db-*", "write:class:55",
+    {"action": "create", "resource": "class", "identifier": "55", "service": "hub.duckietown.com"},
+]
+SAMPLE_DATA = {"a": 27, "b": 32.4, "c": None, "d": [12, -13.5, None, {}, [], True], "e": "é"}
+
+
+def _generate(**kwargs) -> DuckietownToken:
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt3", tmp)
+    token = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, version="dt3", **kwargs)
+    return DuckietownToken.from_string(token.as_string(), vk=vk, allow_expired=False)
+
+
+def test_create_simple():
+    token = _generate(days=1)
+    assert token.version == "dt3"
+    assert token.uid == SAMPLE_TOKEN_UID
+    assert isinstance(token.payload["exp"], int)
+    assert abs(token.expiration_timestamp - (time.time() + 86400)) < 60
+    assert not token.expired
+    assert not token.renewable
+    assert token.data is None
+    assert token.scope == []
+
+
+def test_create_never_expires():
+    token = _generate(days=-1)
+    assert token.expiration is None
+    assert not token.expired
+
+
+def test_already_expired():
+    payload = {"uid": SAMPLE_TOKEN_UID, "exp": int(time.time()) - 60, "scope": []}
+    # expired tokens are rejected before their signature is checked
+    s: str = DuckietownToken("dt3", payload, b"\0" * 48).as_string()
+    try:
+        DuckietownToken.from_string(s, allow_expired=False)
+    except ExpiredToken:
+        pass
+    else:
+        raise AssertionError("An expired token was accepted")
+
+
+def test_scope_and_data():
+    token = _generate(days=1, scope=SAMPLE_SCOPE, data=SAMPLE_DATA, renewable=True)
+    assert token.scope == [Scope.parse(s) for s in SAMPLE_SCOPE]
+    assert json.dumps(token.data, sort_keys=True) == json.dumps(SAMPLE_DATA, sort_keys=True)
+    assert token.renewable
+    assert token.duration == 1440
+    assert token.grants("auth")
+    assert token.grants("read", "duckiebot", "db-07")
+    assert token.grants("create", "class", "55", "hub.duckietown.com")
+    assert not token.grants("write", "class", "56")
+
+
+def test_grants_wildcards():
+    scopes: List[Scope] = [Scope.parse("read:duckiebot:db-*"), Scope.parse("write:duckiebot-*"),
+                           Scope("create", "class", None, "*.duckietown.com"), Scope("x", "a*", "b*", "c*"),
+                           Scope("x", "*"), Scope("y", "a", "*")]
+    token = _generate(days=1, scope=scopes)
+    assert token.grants("read", "duckiebot", "db-01")
+    assert token.grants("read", "duckiebot", "db-")
+    assert not token.grants("read", "duckiebot", "autobot01")
+    assert not token.grants("read", "duckiebot")
+    assert token.grants("write", "duckiebot-db01", "any")
+    assert not token.grants("write", "duckiebot")
+    assert token.grants("create", "class", "55", "*.duckietown.com")
+    assert not token.grants("create", "class", "55", "hub.duckietown.com")
+    # the index agrees with the scopes
+    values = [None, "", "a", "ab", "b", "bc", "c", "cd", "*"]
+    for action in ["x", "y"]:
+        for r in values:
+            for i in values:
+                for srv in values:
+                    expected = any(s.grants(action, r, i, srv, wildcards=True) for s in scopes)
+                    assert token.grants(action, r, i, srv) == expected
+    # values that are not strings have no prefix, they match exact values only
+    assert not token.grants("read", "duckiebot", 5)
+    assert not Scope.parse("read:duckiebot:db-*").grants("read", "duckiebot", 5, wildcards=True)
+    assert not token.grants("x", 5, 6, 7)
+
+
+def test_non_string_scope_fields():
+    # integers in binary scopes are codebook indices, other values cannot be encoded faithfully
+    scope = {"action": "write", "resource": "class", "identifier": 3, "service": "hub"}
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt3", tmp)
+    try:
+        DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, days=1, scope=[scope], version="dt3")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("A scope with a non-string field was encoded")
+    # the same scope as a string round-trips
+    scope["identifier"] = "3"
+    token = _generate(days=1, scope=[scope])
+    assert token.scope == [Scope.parse(scope)]
+    assert token.grants("write", "class", "3", "hub")
+    assert not token.grants("write", "class", "create", "hub")
+
+
+def test_signature_bound_to_version():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt3", tmp)
+    token = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, days=1, version="dt3")
+    raw: bytes = token._payload_bytes()
+    # a signature of the bare payload, e.g. made for another version with the same key, is rejected
+    signature: bytes = sk.sign(raw, entropy=_entropy)
+    forged = f"dt3-{b64url_encode(raw).decode()}.{b64url_encode(signature).decode()}"
+    try:
+        DuckietownToken.from_string(forged, vk=vk)
+    except InvalidToken:
+        pass
+    else:
+        raise AssertionError("A signature not bound to the token version was accepted")
+    assert DuckietownToken.from_string(token.as_string(), vk=vk).uid == SAMPLE_TOKEN_UID
+
+
+def test_same_content_as_dt2():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt3", tmp)
+    tokens: List[DuckietownToken] = [
+        DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, days=-1, scope=SAMPLE_SCOPE, data=SAMPLE_DATA,
+                                 renewable=True, version=version)
+        for version in ["dt2", "dt3"]
+    ]
+    dt2, dt3 = [DuckietownToken.from_string(t.as_string(), vk=vk) for t in tokens]
+    assert dt2.payload_as_json() == dt3.payload_as_json()
+    # the binary encoding is much more compact
+    assert len(dt3.as_string()) < len(dt2.as_string()) / 2
+
+
+def test_as_string():
+    token = _generate(days=1, scope=SAMPLE_SCOPE, data=SAMPLE_DATA)
+    s: str = token.as_string()
+    assert s.startswith("dt3-")
+    # tokens built from their parts encode to the same string
+    copy = DuckietownToken("dt3", dict(token.payload), b64url_encode(token.signature).decode("ascii"))
+    assert copy.as_string() == s
+
+
+def test_renew():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt3", tmp)
+    token1 = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, minutes=5, scope=SAMPLE_SCOPE, renewable=True,
+                                      version="dt3")
+    token2 = token1.renew(sk)
+    token2 = DuckietownToken.from_string(token2.as_string(), vk=vk)
+    assert token2.version == "dt3"
+    assert token2.scope == token1.scope
+    assert token2.expiration_timestamp >= token1.expiration_timestamp
+
+
+def test_invalid():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt3", tmp)
+    s: str = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, days=1, version="dt3").as_string()
+    payload, signature = s[4:].split(".")
+    invalid = [
+        # dt2-style separator
+        f"dt3-{payload}-{signature}",
+        # tampered signature
+        f"dt3-{payload}.{signature[::-1]}",
+        # non-canonical or invalid base64
+        f"dt3-{payload}.{signature}A",
+        f"dt3-{payload}=.{signature}",
+        f"dt3-{payload[:-1]}+.{signature}",
+        # payloads that are not a map, with trailing data, or with unknown fields
+        f"dt3-{b64url_encode(b'x0').decode()}.{signature}",
+        f"dt3-{payload}AAAA.{signature}",
+        f"dt3-{b64url_encode(bytes.fromhex('a3000101f6186301')).decode()}.{signature}",
+        # scope fields that are neither strings, codebook indices nor unset
+        f"dt3-{b64url_encode(bytes.fromhex('a300182a01f6028181f5')).decode()}.{signature}",
+        f"dt3-{b64url_encode(bytes.fromhex('a300182a01f602818181180f')).decode()}.{signature}",
+        f"dt3-{b64url_encode(bytes.fromhex('a300182a01f602818118ff')).decode()}.{signature}",
+    ]
+    for token in invalid:
+        try:
+            DuckietownToken.from_string(token, vk=vk)
+        except InvalidToken:
+            pass
+        else:
+            raise AssertionError(f"The invalid token '{token}' was accepted")
+
+
+def test_forged_scopes_not_cached():
+    from dt_authentication import cbor, scope, token as module
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt3", tmp)
+    signature: str = b64url_encode(b"\0" * 48).decode()
+    interned, binary = len(scope._interned), len(module._binary_scopes)
+    # scopes of tokens that fail verification are never parsed, nor remembered
+    for i in range(64):
+        raw: bytes = cbor.dumps({0: SAMPLE_TOKEN_UID, 1: None, 2: [[1, 9, f"forged-{i}"]]})
+        try:
+            DuckietownToken.from_string(f"dt3-{b64url_encode(raw).decode()}.{signature}", vk=vk)
+        except InvalidToken:
+            pass
+        else:
+            raise AssertionError("A forged token was accepted")
+    assert len(scope._interned) == interned
+    assert len(module._binary_scopes) == binary
+    # the scopes of valid tokens are
+    token = _generate(days=1, scope=["read:duckiebot:forged-0"])
+    assert token.scope == [Scope("read", "duckiebot", "forged-0")]
+    assert (1, 9, "forged-0") in module._binary_scopes
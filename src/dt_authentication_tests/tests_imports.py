@@ -0,0 +1,71 @@
+import logging
+import os
+import re
+import subprocess
+import sys
+import unittest
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# modules that must not be loaded by a plain import of the library
+HEAVY_MODULES = ["requests", "asyncio", "ecdsa", "cryptography", "aiohttp", "concurrent.futures",
+                 "multiprocessing", "future"]
+
+# cumulative import time budget in milliseconds, wall-clock timings are too noisy on shared machines
+# for the budget to be checked unless it is set explicitly (e.g., DT_TOKEN_IMPORT_BUDGET_MS=100)
+IMPORT_TIME_BUDGET_MS: Optional[float] = \
+    float(os.environ["DT_TOKEN_IMPORT_BUDGET_MS"]) if os.environ.get("DT_TOKEN_IMPORT_BUDGET_MS") else None
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _python(code: str, *flags: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC_DIR, env.get("PYTHONPATH")]))
+    return subprocess.run([sys.executable, *flags, "-c", code], env=env, capture_output=True,
+                          text=True, check=True)
+
+
+def _import_times(module: str) -> Dict[str, int]:
+    # module -> cumulative import time in microseconds
+    stderr = _python(f"import {module}", "-X", "importtime").stderr
+    times = {}
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s+(\S+)", line)
+        if match:
+            times[match.group(2)] = int(match.group(1))
+    return times
+
+
+def test_no_heavy_imports():
+    for module in ["dt_authentication", "dt_authentication.cli"]:
+        code = f"import sys, {module}; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+        loaded = _python(code).stdout.split()
+        assert not loaded, f"Importing '{module}' loads {loaded}"
+    # submodules load what they need, but keys are parsed lazily wherever they are used
+    for module in ["dt_authentication.aio", "dt_authentication.renew", "dt_authentication.parallel",
+                   "dt_authentication.manager"]:
+        code = f"import sys, {module}; print('ecdsa' in sys.modules)"
+        assert _python(code).stdout.strip() == "False", f"Importing '{module}' loads 'ecdsa'"
+
+
+def test_lazy_loading_works():
+    code = "from dt_authentication import DuckietownToken, VerifiedTokenCache\n" \
+           "from dt_authentication.token import CURVE\n" \
+           "DuckietownToken.from_string('dt2-FifqUXc5FqUotojkAVpYG5JWebZRH6SUHM3DRgk1kRSKdq1uKcL9CFaNT9dR" \
+           "hCVKwFoEnMgm6Hu6v8-43dzqWFnWd8KBa1yev1g3UKnzVxZkkTbfaF8L9aHLLmc5bPTTmQhQzybqT8rKAADZa', " \
+           "cache=VerifiedTokenCache())\n" \
+           "print(CURVE.name)"
+    assert _python(code).stdout.strip() == "NIST192p"
+
+
+def test_import_time_budget():
+    if IMPORT_TIME_BUDGET_MS is None:
+        raise unittest.SkipTest("Set DT_TOKEN_IMPORT_BUDGET_MS to check the import time budget")
+    # best of a few runs, the first one might be compiling bytecode
+    best: int = min(_import_times("dt_authentication")["dt_authentication"] for _ in range(3))
+    logger.info(f"'import dt_authentication' took {best / 1000:.1f} ms")
+    assert best / 1000 <= IMPORT_TIME_BUDGET_MS, \
+        f"'import dt_authentication' took {best / 1000:.1f} ms, budget is {IMPORT_TIME_BUDGET_MS} ms"
@@ -0,0 +1,47 @@
+import logging
+import os
+import tempfile
+
+from ecdsa import SigningKey
+
+from dt_authentication.keys import KeyRegistry, get_verifying_key
+from dt_authentication.token import CURVE
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+def test_default_keys_parsed_once():
+    for version in ["dt1", "dt2"]:
+        assert get_verifying_key(version) is get_verifying_key(version)
+
+
+def test_file_key_reloaded_on_change():
+    registry = KeyRegistry()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "key-public.pem")
+        sk1 = SigningKey.generate(curve=CURVE)
+        with open(path, "wb") as f:
+            f.write(b"# a comment\n" + sk1.get_verifying_key().to_pem())
+        vk1 = registry.load_verifying_key(path)
+        assert vk1.to_string() == sk1.get_verifying_key().to_string()
+        assert registry.load_verifying_key(path) is vk1
+        # replace the key on disk
+        sk2 = SigningKey.generate(curve=CURVE)
+        with open(path, "wb") as f:
+            f.write(sk2.get_verifying_key().to_pem())
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+        vk2 = registry.load_verifying_key(path)
+    assert vk2.to_string() == sk2.get_verifying_key().to_string()
+
+
+def test_signing_key_from_file():
+    registry = KeyRegistry()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "key-private.pem")
+        sk = SigningKey.generate(curve=CURVE)
+        with open(path, "wb") as f:
+            f.write(sk.to_pem())
+        assert registry.load_signing_key(path).to_string() == sk.to_string()
+        assert registry.load_signing_key(path) is registry.load_signing_key(path)
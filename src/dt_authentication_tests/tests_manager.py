@@ -0,0 +1,74 @@
+import logging
+import tempfile
+import threading
+from typing import List
+
+from dt_authentication import DuckietownToken, NotARenewableToken
+from dt_authentication.manager import RenewalManager
+from dt_authentication.renew import RenewClient
+from dt_authentication.utils import get_or_create_key_pair
+from dt_authentication_tests.renew_server import RenewServer
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+def test_manager_renews_due_tokens():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    tokens = [DuckietownToken.generate(sk, uid, minutes=5, renewable=True) for uid in range(8)]
+    renewed: List[DuckietownToken] = []
+    done = threading.Event()
+
+    def on_renewal(_, new: DuckietownToken):
+        renewed.append(new)
+        if len(renewed) == len(tokens):
+            done.set()
+
+    # all the tokens expire within the margin, they are all due right away
+    with RenewalManager(margin=600, key=sk, retry_delay=3600) as manager:
+        manager.subscribe(on_renewal)
+        handles = [manager.track(token) for token in tokens]
+        assert done.wait(10)
+    assert sorted(t.uid for t in renewed) == list(range(8))
+    assert all(h.renewals == 1 for h in handles)
+    assert all(h.error is None for h in handles)
+
+
+def test_manager_online():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    token = DuckietownToken.generate(sk, 1, minutes=5, renewable=True)
+    done = threading.Event()
+    with RenewServer(sk, vk) as server, RenewClient(server.base_url, vk=vk) as client:
+        with RenewalManager(margin=600, client=client, retry_delay=3600) as manager:
+            manager.subscribe(lambda *_: done.set())
+            handle = manager.track(token)
+            assert done.wait(10)
+    assert handle.renewals == 1
+    assert handle.token is not token
+
+
+def test_manager_not_due():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    token = DuckietownToken.generate(sk, 1, days=1, renewable=True)
+    with RenewalManager(margin=60, key=sk) as manager:
+        handle = manager.track(token)
+        assert len(manager) == 1
+        manager.untrack(handle)
+        assert len(manager) == 0
+    assert handle.token is token
+    assert handle.renewals == 0
+
+
+def test_manager_not_renewable():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    token = DuckietownToken.generate(sk, 1, days=1)
+    try:
+        RenewalManager(key=sk).track(token)
+    except NotARenewableToken:
+        pass
+    else:
+        raise AssertionError("A non-renewable token was tracked")
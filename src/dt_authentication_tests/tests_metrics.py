@@ -0,0 +1,87 @@
+import logging
+import tempfile
+
+from dt_authentication import DuckietownToken, InvalidToken, ExpiredToken, NotARenewableToken
+from dt_authentication import metrics
+from dt_authentication.metrics import MetricsRegistry, Event
+from dt_authentication.utils import get_or_create_key_pair
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+SAMPLE_TOKEN = "dt2-FifqUXc5FqUotojkAVpYG5JWebZRH6SUHM3DRgk1kRSKdq1uKcL9CFaNT9dRhCVKwFoEnMgm6Hu6v8-" \
+               "43dzqWFnWd8KBa1yev1g3UKnzVxZkkTbfaF8L9aHLLmc5bPTTmQhQzybqT8rKAADZa"
+
+
+def test_disabled_records_nothing():
+    registry = MetricsRegistry()
+    metrics.enable(registry)
+    metrics.disable()
+    DuckietownToken.from_string(SAMPLE_TOKEN)
+    assert registry.count("from_string") == 0
+
+
+def test_operations_and_stages():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    registry = MetricsRegistry()
+    events = []
+    metrics.add_listener(events.append)
+    metrics.enable(registry)
+    try:
+        token = DuckietownToken.generate(sk, 1, days=1, renewable=True, scope=["auth"])
+        DuckietownToken.from_string(token.as_string(), vk=vk)
+        for s, exc in [(SAMPLE_TOKEN, ExpiredToken), ("dt2-aa-bb", InvalidToken), ("nope", InvalidToken)]:
+            try:
+                DuckietownToken.from_string(s, allow_expired=False)
+            except exc:
+                pass
+        token.grants("auth")
+        token.grants("write")
+        token.renew(sk)
+        try:
+            DuckietownToken.generate(sk, 1).renew(sk)
+        except NotARenewableToken:
+            pass
+    finally:
+        metrics.disable()
+        metrics.remove_listener(events.append)
+    # counters
+    assert registry.count("from_string", "dt2", "ok") == 1
+    assert registry.count("from_string", "dt2", "expired") == 1
+    assert registry.count("from_string", "dt2", "invalid") == 1
+    assert registry.count("from_string", metrics.UNKNOWN_VERSION, "invalid") == 1
+    assert registry.count("grants", "dt2", "granted") == 1
+    assert registry.count("grants", "dt2", "denied") == 1
+    assert registry.count("renew", "dt2", "ok") == 1
+    assert registry.count("renew", "dt2", "not_renewable") == 1
+    # generate, renew and the non-renewable token
+    assert registry.count("generate") == 3
+    # stages
+    for operation, stage in [("from_string", "decode"), ("from_string", "verify"),
+                             ("from_string", "scope"), ("generate", "sign"), ("renew", "sign")]:
+        assert registry.stage_time(operation, stage) > 0, (operation, stage)
+    # listener
+    assert len(events) == 11
+    assert all(isinstance(e, Event) for e in events)
+    assert events[0].operation == "generate" and events[0].outcome == "ok"
+
+
+def test_prometheus_export():
+    registry = MetricsRegistry(buckets=(0.001, 1.0))
+    registry.record(Event("from_string", "dt2", "ok", 0.01, {"verify": 0.008}))
+    registry.record(Event("from_string", "dt2", "invalid", 0.0005, {}))
+    text = registry.export_prometheus()
+    lines = text.splitlines()
+    assert "# TYPE dt_token_operations_total counter" in lines
+    assert 'dt_token_operations_total{operation="from_string",version="dt2",outcome="ok"} 1' in lines
+    assert 'dt_token_operation_duration_seconds_bucket{operation="from_string",version="dt2",le="0.001"} 1' \
+           in lines
+    assert 'dt_token_operation_duration_seconds_bucket{operation="from_string",version="dt2",le="+Inf"} 2' \
+           in lines
+    assert 'dt_token_operation_duration_seconds_count{operation="from_string",version="dt2"} 2' in lines
+    assert 'dt_token_stage_duration_seconds_count{operation="from_string",version="dt2",stage="verify"} 1' \
+           in lines
+    registry.clear()
+    assert registry.count("from_string") == 0
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import logging
+import tempfile
+from typing import List, Dict, Any
+
+from dt_authentication import DuckietownToken
+from dt_authentication.middleware import TOKEN_KEY, WSGIAuthMiddleware, ASGIAuthMiddleware
+from dt_authentication.utils import get_or_create_key_pair
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+SAMPLE_TOKEN = "dt2-FifqUXc5FqUotojkAVpYG5JWebZRH6SUHM3DRgk1kRSKdq1uKcL9CFaNT9dRhCVKwFoEnMgm6Hu6v8-" \
+               "43dzqWFnWd8KBa1yev1g3UKnzVxZkkTbfaF8L9aHLLmc5bPTTmQhQzybqT8rKAADZa"
+
+ROUTES = {"/data": "read:data", "/data/private": "write:data:1", "/me": None}
+
+
+def _keys():
+    with tempfile.TemporaryDirectory() as tmp:
+        return get_or_create_key_pair("dt2", tmp)
+
+
+def _wsgi_app(environ, start_response):
+    token = environ[TOKEN_KEY]
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [str(token.uid if token is not None else None).encode()]
+
+
+def _wsgi_call(app, path: str, token: str = None):
+    environ = {"PATH_INFO": path}
+    if token is not None:
+        environ["HTTP_AUTHORIZATION"] = f"Token {token}"
+    response = {}
+
+    def start_response(status, headers):
+        response["status"] = int(status.split(" ")[0])
+        response["headers"] = dict(headers)
+
+    body = b"".join(app(environ, start_response))
+    return response["status"], body
+
+
+def test_wsgi():
+    sk, vk = _keys()
+    reader = DuckietownToken.generate(sk, 1, days=1, scope=["read:data"]).as_string()
+    writer = DuckietownToken.generate(sk, 2, days=1, scope=["read:data", "write:data:1"]).as_string()
+    app = WSGIAuthMiddleware(_wsgi_app, routes=ROUTES, vk=vk)
+    # missing, invalid and expired tokens
+    assert _wsgi_call(app, "/")[0] == 401
+    assert _wsgi_call(app, "/", "dt2-aa-bb")[0] == 401
+    status, body = _wsgi_call(app, "/", SAMPLE_TOKEN)
+    assert status == 401
+    assert "expired" in json.loads(body)["messages"][0]
+    # scopes
+    assert _wsgi_call(app, "/", reader) == (200, b"1")
+    assert _wsgi_call(app, "/data/1", reader) == (200, b"1")
+    assert _wsgi_call(app, "/data/private", reader)[0] == 403
+    assert _wsgi_call(app, "/data/private", writer) == (200, b"2")
+    # prefixes match whole path segments only
+    assert _wsgi_call(app, "/database", writer) == (200, b"2")
+    assert _wsgi_call(app, "/data/privateer", reader) == (200, b"1")
+    assert _wsgi_call(app, "/database")[0] == 401
+    # the second time the token comes from the cache
+    assert _wsgi_call(app, "/data/private", writer) == (200, b"2")
+    assert app._auth._cache.stats.hits >= 1
+
+
+def test_wsgi_optional():
+    sk, vk = _keys()
+    token = DuckietownToken.generate(sk, 1, days=1).as_string()
+    app = WSGIAuthMiddleware(_wsgi_app, routes=ROUTES, vk=vk, optional=True)
+    assert _wsgi_call(app, "/") == (200, b"None")
+    assert _wsgi_call(app, "/", "dt2-aa-bb")[0] == 401
+    assert _wsgi_call(app, "/me")[0] == 401
+    assert _wsgi_call(app, "/me", token) == (200, b"1")
+
+
+async def _asgi_app(scope, receive, send):
+    token = scope[TOKEN_KEY]
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": str(token.uid).encode()})
+
+
+async def _asgi_call(app, path: str, token: str = None, kind: str = "http"):
+    headers = [(b"host", b"localhost")]
+    if token is not None:
+        headers.append((b"authorization", f"Token {token}".encode()))
+    scope = {"type": kind, "path": path, "headers": headers}
+    messages: List[Dict[str, Any]] = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    assert TOKEN_KEY not in scope
+    return messages
+
+
+def test_asgi():
+    sk, vk = _keys()
+    reader = DuckietownToken.generate(sk, 1, days=1, scope=["read:data"]).as_string()
+    app = ASGIAuthMiddleware(_asgi_app, routes=ROUTES, vk=vk)
+
+    async def main():
+        ok = await asyncio.gather(*[_asgi_call(app, "/data", reader) for _ in range(10)])
+        forbidden = await _asgi_call(app, "/data/private", reader)
+        missing = await _asgi_call(app, "/data")
+        ws = await _asgi_call(app, "/data", kind="websocket")
+        return ok, forbidden, missing, ws
+
+    ok, forbidden, missing, ws = asyncio.run(main())
+    for messages in ok:
+        assert messages[0]["status"] == 200
+        assert messages[1]["body"] == b"1"
+    assert forbidden[0]["status"] == 403
+    assert missing[0]["status"] == 401
+    assert (b"www-authenticate", b"Token") in missing[0]["headers"]
+    assert ws == [{"type": "websocket.close", "code": 1008}]
@@ -0,0 +1,49 @@
+import logging
+import pickle
+import tempfile
+
+from dt_authentication import DuckietownToken, InvalidToken, ExpiredToken
+from dt_authentication.parallel import TokenProcessPool
+from dt_authentication.utils import get_or_create_key_pair
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+SAMPLE_TOKEN = "dt2-FifqUXc5FqUotojkAVpYG5JWebZRH6SUHM3DRgk1kRSKdq1uKcL9CFaNT9dRhCVKwFoEnMgm6Hu6v8-" \
+               "43dzqWFnWd8KBa1yev1g3UKnzVxZkkTbfaF8L9aHLLmc5bPTTmQhQzybqT8rKAADZa"
+
+
+def test_expired_token_pickle():
+    e = ExpiredToken("2024-05-06", "This token is expired")
+    e1 = pickle.loads(pickle.dumps(e))
+    assert e1.expiration == e.expiration
+    assert e1.args == e.args
+
+
+def test_pool_default_keys():
+    tokens = [SAMPLE_TOKEN, "dt2-aa-bb"] * 5
+    with TokenProcessPool(workers=2, chunk_size=3) as pool:
+        results = list(pool.verify_many(tokens, allow_expired=False))
+    assert len(results) == len(tokens)
+    for i, result in enumerate(results):
+        assert isinstance(result, ExpiredToken if i % 2 == 0 else InvalidToken)
+
+
+def test_pool_custom_key_in_order():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    tokens = [DuckietownToken.generate(sk, uid, days=1).as_string() for uid in range(20)]
+    with TokenProcessPool(workers=2, chunk_size=4, vk=vk) as pool:
+        results = list(pool.verify_many(iter(tokens)))
+    assert [r.uid for r in results] == list(range(20))
+
+
+def test_pool_generate_many():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    specs = [(uid, ["auth"], None, 10) for uid in range(20)]
+    tokens = list(DuckietownToken.generate_many(sk, specs, workers=2, chunk_size=3))
+    assert [t.uid for t in tokens] == list(range(20))
+    for token in tokens:
+        DuckietownToken.from_string(token.as_string(), vk=vk, allow_expired=False)
@@ -0,0 +1,83 @@
+import logging
+import socket
+import tempfile
+
+import requests
+
+from dt_authentication import DuckietownToken, GenericException
+from dt_authentication.renew import RenewClient
+from dt_authentication.utils import get_or_create_key_pair
+from dt_authentication_tests.renew_server import RenewServer
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+SAMPLE_TOKEN_UID = -1
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_renew_client():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    tokens = [DuckietownToken.generate(sk, uid, minutes=5, renewable=True) for uid in range(8)]
+    with RenewServer(sk, vk) as server, RenewClient(server.base_url, vk=vk) as client:
+        for token in tokens:
+            new = token.renew(client=client)
+            assert new.uid == token.uid
+            assert new.renewable
+    assert server.requests == len(tokens)
+
+
+def test_renew_client_retries():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    token = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, minutes=5, renewable=True)
+    with RenewServer(sk, vk, failures=2) as server, \
+            RenewClient(server.base_url, vk=vk, retries=2, backoff=0.01) as client:
+        token.renew(client=client, in_place=True)
+    assert server.requests == 3
+    # too many failures
+    with RenewServer(sk, vk, failures=2) as server, \
+            RenewClient(server.base_url, vk=vk, retries=1, backoff=0.01) as client:
+        try:
+            token.renew(client=client)
+        except GenericException:
+            pass
+        else:
+            raise AssertionError("A token was renewed by a failing server")
+    assert server.requests == 2
+
+
+def test_renew_client_connection_error():
+    with tempfile.TemporaryDirectory() as tmp:
+        sk, vk = get_or_create_key_pair("dt2", tmp)
+    token = DuckietownToken.generate(sk, SAMPLE_TOKEN_UID, minutes=5, renewable=True)
+    base_url: str = f"http://127.0.0.1:{_free_port()}"
+    with RenewClient(base_url, retries=1, backoff=0.01, connect_timeout=1) as client:
+        try:
+            token.renew(client=client)
+        except requests.ConnectionError:
+            pass
+        else:
+            raise AssertionError("A token was renewed without a server")
+
+
+def test_renew_rejected():
+    with tempfile.TemporaryDirectory() as tmp1, tempfile.TemporaryDirectory() as tmp2:
+        sk1, vk1 = get_or_create_key_pair("dt2", tmp1)
+        sk2, vk2 = get_or_create_key_pair("dt2", tmp2)
+    # the server does not recognize tokens signed with another key
+    token = DuckietownToken.generate(sk2, SAMPLE_TOKEN_UID, minutes=5, renewable=True)
+    with RenewServer(sk1, vk1) as server, RenewClient(server.base_url, vk=vk1) as client:
+        try:
+            token.renew(client=client)
+        except GenericException as e:
+            assert e.args[0] == ["InvalidToken"]
+        else:
+            raise AssertionError("An invalid token was renewed")